@@ -0,0 +1,46 @@
+from typing import Any, Dict, Optional
+
+from fastapi import Response
+
+try:
+    import msgpack
+except ImportError:  # msgpack необязателен: без него все ответы отдаются в JSON
+    msgpack = None
+
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+
+class MsgPackResponse(Response):
+    """Ответ в MessagePack с теми же данными, что и JSON-ответ"""
+
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, use_bin_type=True)
+
+
+def _accept_quality(accept: str) -> Dict[str, float]:
+    qualities = {}
+    for media_range in accept.split(","):
+        media_type, *params = (part.strip() for part in media_range.split(";"))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[media_type.lower()] = quality
+    return qualities
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    """MessagePack, если он явно указан в Accept с q > 0 и не ниже application/json"""
+    if not accept or msgpack is None:
+        return False
+    qualities = _accept_quality(accept)
+    msgpack_quality = max((qualities.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES), default=0.0)
+    return msgpack_quality > 0 and msgpack_quality >= qualities.get("application/json", 0.0)
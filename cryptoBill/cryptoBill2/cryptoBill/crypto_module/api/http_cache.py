@@ -0,0 +1,22 @@
+import hashlib
+from typing import Optional
+
+
+def make_etag(*parts: object) -> str:
+    """
+    Слабый ETag из версий данных ответа: хэшируется строка версий, а не тело ответа.
+    Слабый — ответ отдаётся и сжатым gzip, и без сжатия, с одинаковым ETag
+    """
+    key = "|".join(str(part) for part in parts)
+    return 'W/"' + hashlib.blake2b(key.encode("utf-8"), digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Совпадает ли ETag с заголовком If-None-Match (слабое сравнение, RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    opaque = etag.removeprefix("W/")
+    return any(candidate.removeprefix("W/") == opaque for candidate in candidates)
@@ -1,6 +1,12 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse
+from typing import List, Optional
+from ..services.loop_monitor import loop_monitor
+from ..services.profiler import profiler, collapse, ProfilerBusy
 from ..services.trading import CryptoTradingService
+from .encoding import MsgPackResponse, MSGPACK_MEDIA_TYPE, wants_msgpack
+from .http_cache import etag_matches, make_etag
 from ..models.transaction import Transaction
 
 router = APIRouter(prefix="/api/crypto", tags=["crypto"])
@@ -54,19 +60,30 @@ async def withdraw_funds(
 
 
 @router.get("/portfolio/{user_id}")
-async def get_portfolio(user_id: str):
-    """Получение портфеля пользователя"""
-    portfolio = trading_service.get_portfolio(user_id)
-    if not portfolio:
+async def get_portfolio(user_id: str, response: Response, if_none_match: Optional[str] = Header(None),
+                        accept: Optional[str] = Header(None)):
+    """Получение портфеля пользователя (с ETag; 304, если портфель не менялся; JSON или MessagePack)"""
+    version = trading_service.get_portfolio_version(user_id)
+    if not version:
         raise HTTPException(status_code=404, detail="User not found")
+    portfolio_version, current_prices = version
+    binary = wants_msgpack(accept)
+    headers = {"ETag": make_etag("portfolio", portfolio_version, MSGPACK_MEDIA_TYPE if binary else "json"),
+               "Vary": "Accept"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    portfolio = trading_service.get_portfolio(user_id, current_prices)
+    if binary:
+        return MsgPackResponse(portfolio, headers=headers)
     return portfolio
 
 
 @router.get("/transactions/{user_id}")
-async def get_transactions(user_id: str, limit: int = 50):
-    """История транзакций пользователя"""
+async def get_transactions(user_id: str, limit: int = 50, accept: Optional[str] = Header(None)):
+    """История транзакций пользователя (JSON или MessagePack)"""
     transactions = trading_service.get_transaction_history(user_id, limit)
-    return {
+    history = {
         'user_id': user_id,
         'transactions': [
             {
@@ -81,22 +98,37 @@ async def get_transactions(user_id: str, limit: int = 50):
             for tx in transactions
         ]
     }
+    if wants_msgpack(accept):
+        return MsgPackResponse(history, headers={"Vary": "Accept"})
+    return history
 
 
 @router.get("/balance/{user_id}")
-async def get_balance(user_id: str):
-    """Полный баланс пользователя (фиат + крипто)"""
-    portfolio = trading_service.get_portfolio(user_id)
-    if not portfolio:
+async def get_balance(user_id: str, response: Response, if_none_match: Optional[str] = Header(None),
+                      accept: Optional[str] = Header(None)):
+    """Полный баланс пользователя (фиат + крипто), с ETag как у портфеля; JSON или MessagePack"""
+    version = trading_service.get_portfolio_version(user_id)
+    if not version:
         raise HTTPException(status_code=404, detail="User not found")
-
-    return {
+    portfolio_version, current_prices = version
+    binary = wants_msgpack(accept)
+    headers = {"ETag": make_etag("balance", portfolio_version, MSGPACK_MEDIA_TYPE if binary else "json"),
+               "Vary": "Accept"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    portfolio = trading_service.get_portfolio(user_id, current_prices)
+
+    balance = {
         'user_id': user_id,
         'fiat_balance': portfolio.get('fiat_balance', 0),
         'total_crypto_value': portfolio.get('total_crypto_value', 0),
         'total_balance': portfolio.get('fiat_balance', 0) + portfolio.get('total_crypto_value', 0),
         'crypto_allocations': portfolio.get('crypto_allocations', {})
     }
+    if binary:
+        return MsgPackResponse(balance, headers=headers)
+    return balance
 
 
 @router.post("/close-position/{user_id}/{crypto}")
@@ -128,6 +160,34 @@ async def get_system_status():
     """Получение статуса системы (для админов)"""
     return trading_service.get_system_report()
 
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not profiler.is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Требуется действующий X-Admin-Token")
+
+
+@router.get("/event-loop", dependencies=[Depends(require_admin)])
+async def get_event_loop_lag():
+    """Задержка event loop по последним замерам, мс (для админов)"""
+    return loop_monitor.as_dict()
+
+
+@router.post("/admin/profile", dependencies=[Depends(require_admin)])
+async def run_profile(seconds: float = Query(10.0, gt=0), all_threads: bool = False, save: bool = False):
+    """
+    Статистическое профилирование на seconds секунд (для админов).
+    Ответ — collapsed-стеки для flamegraph.pl/speedscope, с save=true — имя файла в PROFILE_DIR.
+    Профиль одного запроса: заголовки X-Profile: 1 и X-Admin-Token на любом запросе.
+    """
+    try:
+        samples = await profiler.profile_for(seconds, all_threads)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="Профилирование уже выполняется")
+    if save:
+        path = profiler.new_file("profile")
+        await asyncio.to_thread(profiler.save, path, samples)
+        return {"file": str(path), "stacks": len(samples), "samples": sum(samples.values())}
+    return PlainTextResponse(collapse(samples))
+
 @router.get("/price-info/{crypto}")
 async def get_price_info(crypto: str):
     """Подробная информация о цене криптовалюты"""
@@ -19,6 +19,23 @@ class CryptoConfig:
     MAX_DEPOSIT_AMOUNT: float = 50000.0
     MAX_WITHDRAWAL_AMOUNT: float = 25000.0
 
+    # Сжатие ответов API: ответы короче порога (байт) не сжимаются
+    GZIP_MIN_SIZE: int = 1000
+    GZIP_LEVEL: int = 6
+
+    # Мониторинг задержки event loop: период замера (0 — выключен) и порог блокировки (сек).
+    # В режиме DEBUG при блокировке в лог пишется стек потока event loop.
+    LOOP_MONITOR_INTERVAL: float = 0.1
+    LOOP_STALL_THRESHOLD: float = 0.1
+    DEBUG: bool = os.getenv('CRYPTO_DEBUG', '').lower() in ('1', 'true', 'yes')
+
+    # Токен админских эндпоинтов (заголовок X-Admin-Token); пустой — они отключены
+    ADMIN_TOKEN: str = os.getenv('CRYPTO_ADMIN_TOKEN', '')
+    # Профилирование по запросу: каталог профилей, период замера стеков и максимальная длительность (сек)
+    PROFILE_DIR: str = "profiles"
+    PROFILE_INTERVAL: float = 0.005
+    PROFILE_MAX_SECONDS: float = 120.0
+
     # API ключи (в проде хранить в vault)
     EXCHANGE_APIS: Dict = None
 
@@ -24,6 +24,8 @@ class SyntheticCryptoAccount:
     total_crypto_value: float = 0.0
     created_at: datetime = field(default_factory=datetime.now)
     last_updated: datetime = field(default_factory=datetime.now)
+    # Счётчик изменений счёта (операций), из него строится ETag портфеля
+    version: int = 0
 
     def __post_init__(self):
         for crypto in ['BTC', 'ETH']:
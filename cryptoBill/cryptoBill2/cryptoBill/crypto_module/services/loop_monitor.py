@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import statistics
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from ..config.settings import config
+
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """
+    Измеряет задержку event loop: задача-зонд засыпает на interval секунд и замеряет,
+    насколько позже она проснулась. Задержка растёт, когда обработчик выполняет
+    блокирующую работу (синхронный HTTP, sqlite3, файлы) внутри async def.
+    Статистика по последним window замерам отдаётся в /api/crypto/event-loop.
+
+    С dump_stacks (DEBUG в конфиге) поток-сторож замечает, что зонд не просыпается дольше
+    stall_threshold сверх interval, и пишет в лог стек потока event loop в этот момент —
+    то есть место блокирующего вызова, — по одному разу на каждую остановку.
+    """
+
+    def __init__(self, interval: float, stall_threshold: float, dump_stacks: bool, window: int = 600):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.dump_stacks = dump_stacks
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._max_lag = 0.0
+        self._stalls = 0
+        self._blocked_seconds = 0.0
+        self._heartbeat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self._task is not None or self.interval <= 0:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._probe())
+        if self.dump_stacks:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join, 1.0)
+            self._watchdog = None
+
+    async def _probe(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - started - self.interval)
+            self._samples.append(lag)
+            self._max_lag = max(self._max_lag, lag)
+            if lag >= self.stall_threshold:
+                self._stalls += 1
+                self._blocked_seconds += lag
+                logger.warning(f"Event loop заблокирован на {lag * 1000:.0f} ms")
+
+    def _watch(self):
+        reported_heartbeat = None
+        while not self._stopped.wait(self.stall_threshold / 2):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat - self.interval
+            if blocked_for < self.stall_threshold or heartbeat == reported_heartbeat:
+                continue
+            reported_heartbeat = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            task = asyncio.current_task(self._loop)
+            stack = "".join(traceback.format_stack(frame))
+            logger.warning(f"Event loop заблокирован уже {blocked_for * 1000:.0f} ms, "
+                           f"задача {task.get_name() if task else '-'}:\n{stack}")
+
+    def as_dict(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+        if not samples:
+            return {"samples": 0}
+        return {
+            "samples": len(samples),
+            "interval_ms": self.interval * 1000,
+            "lag_ms": {
+                "last": round(self._samples[-1] * 1000, 3),
+                "mean": round(statistics.fmean(samples) * 1000, 3),
+                "p50": round(samples[len(samples) // 2] * 1000, 3),
+                "p99": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 3),
+                "max_window": round(samples[-1] * 1000, 3),
+                "max": round(self._max_lag * 1000, 3),
+            },
+            "stalls": self._stalls,
+            "blocked_seconds": round(self._blocked_seconds, 3),
+        }
+
+
+loop_monitor = LoopMonitor(config.LOOP_MONITOR_INTERVAL, config.LOOP_STALL_THRESHOLD, config.DEBUG)
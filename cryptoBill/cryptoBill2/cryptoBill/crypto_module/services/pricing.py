@@ -17,6 +17,9 @@ class RealTimePriceOracle:
         self.price_history: Dict[str, list] = {}
         self.last_update: Dict[str, float] = {}
         self.cache_ttl = 30  # Увеличим кеш до 30 секунд
+        # Версия цены растёт при каждом изменении отдаваемой цены (для ETag портфелей)
+        self.price_versions: Dict[str, int] = {}
+        self._served_prices: Dict[str, float] = {}
 
         # Приоритетные API (сначала бесплатные и надежные)
         self.exchanges = [
@@ -154,6 +157,13 @@ class RealTimePriceOracle:
 
     # Остальные методы остаются без изменений
     def get_market_price(self, symbol: str) -> float:
+        price = self._get_market_price(symbol)
+        if self._served_prices.get(symbol) != price:
+            self._served_prices[symbol] = price
+            self.price_versions[symbol] = self.price_versions.get(symbol, 0) + 1
+        return price
+
+    def _get_market_price(self, symbol: str) -> float:
         cache_key = symbol
 
         if (cache_key not in self.last_update or
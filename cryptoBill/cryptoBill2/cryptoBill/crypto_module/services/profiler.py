@@ -0,0 +1,219 @@
+import asyncio
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional
+
+from ..config.settings import config
+
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilerBusy(Exception):
+    """Профилирование уже идёт: одновременно допускается одна сессия."""
+
+
+# Сессия профилирования запроса. ContextVar наследуется задачами, созданными в запросе,
+# поэтому по нему видно, что задача создана в контексте профилируемого запроса.
+_request_session: ContextVar[Optional["ProfileSession"]] = ContextVar("profile_session", default=None)
+
+# Префикс потоков исполнителя по умолчанию, в которых работает asyncio.to_thread.
+EXECUTOR_THREAD_PREFIX = "asyncio_"
+
+
+def _tracking_task_factory(previous):
+    """Фабрика задач event loop: задачи, созданные в контексте профилируемого запроса, попадают в его сессию."""
+    def factory(loop, coro, **kwargs):
+        task = previous(loop, coro, **kwargs) if previous is not None else asyncio.Task(coro, loop=loop, **kwargs)
+        session = _request_session.get()
+        if session is not None:
+            session.tasks.add(task)
+        return task
+    factory.tracks_profile_sessions = True
+    return factory
+
+
+def track_request_tasks(loop: asyncio.AbstractEventLoop):
+    """Ставит на loop фабрику задач, отслеживающую задачи профилируемых запросов (один раз)."""
+    current = loop.get_task_factory()
+    if not getattr(current, "tracks_profile_sessions", False):
+        loop.set_task_factory(_tracking_task_factory(current))
+
+
+def _is_idle_worker(frame) -> bool:
+    """Поток пула ждёт работу: верхний кадр — цикл _worker из concurrent.futures.thread."""
+    return frame.f_code.co_name == "_worker" and frame.f_code.co_filename.endswith(os.path.join("futures", "thread.py"))
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def collapse(samples: Counter) -> str:
+    """Стеки в формате collapsed (flamegraph.pl, speedscope): "корень;...;лист число_замеров" по строке."""
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+class ProfileSession:
+    """
+    Статистический профилировщик: поток раз в interval секунд снимает стеки
+    sys._current_frames() и считает одинаковые стеки. Интерпретатор не инструментируется,
+    поэтому вне сессии профилирование ничего не стоит, а во время сессии стоит один
+    короткий захват GIL на замер.
+    thread_id — снимать только этот поток (обычно поток event loop); task — считать замер
+    потока event loop, только когда выполняется эта задача или задача, созданная в её
+    контексте (профиль одного запроса, см. track_request_tasks). worker_threads — снимать
+    также занятые потоки asyncio.to_thread; их стеки начинаются с [thread имя].
+    """
+
+    def __init__(self, interval: float, thread_id: Optional[int] = None,
+                 loop: Optional[asyncio.AbstractEventLoop] = None, task: Optional[asyncio.Task] = None,
+                 worker_threads: bool = False):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.loop = loop
+        self.task = task
+        self.worker_threads = worker_threads
+        self.tasks: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet([task] if task is not None else [])
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stopped.set()
+        self._thread.join()
+        return self.samples
+
+    def _targets(self, frames) -> list:
+        """Потоки этого замера: [(thread_id, метка корня стека или None)]."""
+        if self.thread_id is None:
+            return [(thread_id, None) for thread_id in frames]
+        targets = []
+        if self.task is None or asyncio.current_task(self.loop) in self.tasks:
+            targets.append((self.thread_id, None))
+        if self.worker_threads:
+            targets += [(thread.ident, thread.name) for thread in threading.enumerate()
+                        if thread.name.startswith(EXECUTOR_THREAD_PREFIX) and thread.ident in frames
+                        and not _is_idle_worker(frames[thread.ident])]
+        return targets
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            sampled = False
+            for thread_id, label in self._targets(frames):
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if label is not None:
+                    stack.append(f"[thread {label}]")
+                self.samples[";".join(reversed(stack))] += 1
+                sampled = True
+            self.sample_count += sampled
+
+
+class Profiler:
+    """
+    Профилирование по запросу администратора: на N секунд (profile_for) или одного
+    запроса с заголовком X-Profile (ProfileRequestMiddleware). Результат — collapsed-стеки
+    в ответе или файл в profile_dir.
+    """
+
+    def __init__(self, admin_token: str, profile_dir: str, interval: float, max_seconds: float):
+        self.admin_token = admin_token
+        self.profile_dir = profile_dir
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._lock = asyncio.Lock()
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        """Пустой ADMIN_TOKEN отключает административные эндпоинты."""
+        return bool(self.admin_token) and token is not None and hmac.compare_digest(token, self.admin_token)
+
+    async def profile_for(self, seconds: float, all_threads: bool = False) -> Counter:
+        if self._lock.locked():
+            raise ProfilerBusy()
+        async with self._lock:
+            session = ProfileSession(self.interval, None if all_threads else threading.get_ident())
+            session.start()
+            started = time.perf_counter()
+            try:
+                await asyncio.sleep(min(seconds, self.max_seconds))
+            finally:
+                samples = await asyncio.to_thread(session.stop)
+            logger.info(f"Профилирование завершено: {session.sample_count} замеров за "
+                        f"{time.perf_counter() - started:.1f}s, уникальных стеков {len(samples)}")
+            return samples
+
+    def new_file(self, prefix: str) -> Path:
+        directory = Path(self.profile_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.collapsed"
+
+    def save(self, path: Path, samples: Counter):
+        path.write_text(collapse(samples), encoding="utf-8")
+        logger.info(f"Профиль записан в {path}")
+
+
+class ProfileRequestMiddleware:
+    """
+    Профилирует один запрос с заголовками X-Profile: 1 и X-Admin-Token. Замеры потока
+    event loop считаются, только пока выполняется задача этого запроса или созданные
+    в ней задачи (gather, create_task); занятые потоки asyncio.to_thread снимаются всё
+    время запроса — в них могут попасть и параллельные запросы. Профиль пишется в файл,
+    имя которого возвращается в заголовке X-Profile-File. Без заголовка — прямой вызов приложения.
+    """
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        if headers.get(b"x-profile") not in (b"1", b"true") or \
+                not self.profiler.is_admin(headers.get(b"x-admin-token", b"").decode("latin-1") or None):
+            return await self.app(scope, receive, send)
+
+        path = self.profiler.new_file("request")
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-file", path.name.encode())]
+            await send(message)
+
+        loop = asyncio.get_running_loop()
+        track_request_tasks(loop)
+        session = ProfileSession(self.profiler.interval, threading.get_ident(), loop, asyncio.current_task(),
+                                 worker_threads=True)
+        token = _request_session.set(session)
+        session.start()
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            _request_session.reset(token)
+            samples = await asyncio.to_thread(session.stop)
+            await asyncio.to_thread(self.profiler.save, path, samples)
+
+
+profiler = Profiler(config.ADMIN_TOKEN, config.PROFILE_DIR, config.PROFILE_INTERVAL, config.PROFILE_MAX_SECONDS)
@@ -1,5 +1,6 @@
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 import logging
+import uuid
 from ..models.user_account import SyntheticCryptoAccount
 from ..models.transaction import Transaction
 from .pricing import RealTimePriceOracle
@@ -20,6 +21,8 @@ class CryptoTradingService:
         self.storage = AccountStorage()
         self.payment_service = PaymentService(self)
         self.user_accounts: Dict[str, SyntheticCryptoAccount] = {}
+        # Версии счетов живут в памяти процесса, поэтому ETag включает идентификатор экземпляра
+        self.instance_id = uuid.uuid4().hex
 
     def deposit(self, user_id: str, amount: float, payment_method: str = "bank_transfer") -> Dict:
         return self.payment_service.deposit_funds(user_id, amount, payment_method)
@@ -119,21 +122,39 @@ class CryptoTradingService:
             logger.error(f"Sell operation failed for {user_id}: {e}")
             return {'success': False, 'error': str(e)}
 
-    def get_portfolio(self, user_id: str) -> Optional[Dict]:
+    def get_portfolio(self, user_id: str, current_prices: Optional[Dict[str, float]] = None) -> Optional[Dict]:
         account = self.user_accounts.get(user_id)
         if account:
-            current_prices = {}
-            for crypto in account.crypto_balances.keys():
-                try:
-                    current_prices[crypto] = self.price_oracle.get_market_price(crypto)
-                except Exception as e:
-                    logger.warning(f"Could not get price for {crypto}: {e}")
-                    current_prices[crypto] = account.crypto_balances[crypto].avg_purchase_price
-
+            if current_prices is None:
+                current_prices = self._get_current_prices(account)
             account.update_portfolio_value(current_prices)
             return account.get_portfolio_overview()
         return None
 
+    def get_portfolio_version(self, user_id: str) -> Optional[Tuple[str, Dict[str, float]]]:
+        """
+        Версия портфеля без его построения: (версия, текущие цены).
+        Версия меняется при операциях по счету и при изменении цен его валют;
+        цены возвращаются, чтобы get_portfolio не запрашивал их повторно.
+        """
+        account = self.user_accounts.get(user_id)
+        if not account:
+            return None
+        current_prices = self._get_current_prices(account)
+        price_versions = ",".join(f"{crypto}:{self.price_oracle.price_versions.get(crypto, 0)}"
+                                  for crypto in sorted(current_prices))
+        return f"{self.instance_id}:{user_id}:{account.version}:{price_versions}", current_prices
+
+    def _get_current_prices(self, account: SyntheticCryptoAccount) -> Dict[str, float]:
+        current_prices = {}
+        for crypto in account.crypto_balances.keys():
+            try:
+                current_prices[crypto] = self.price_oracle.get_market_price(crypto)
+            except Exception as e:
+                logger.warning(f"Could not get price for {crypto}: {e}")
+                current_prices[crypto] = account.crypto_balances[crypto].avg_purchase_price
+        return current_prices
+
     def _get_user_account(self, user_id: str) -> SyntheticCryptoAccount:
         if user_id not in self.user_accounts:
             account = self.storage.load_account(user_id)
@@ -147,6 +168,7 @@ class CryptoTradingService:
 
     def _save_account(self, user_id: str):
         if user_id in self.user_accounts:
+            self.user_accounts[user_id].version += 1
             try:
                 self.storage.save_account(self.user_accounts[user_id])
             except Exception as e:
@@ -0,0 +1,30 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from crypto_module.api.routes import router
+from crypto_module.services.profiler import profiler
+
+
+class TestAdminRoutes:
+    @pytest.fixture(autouse=True)
+    def client(self, monkeypatch):
+        monkeypatch.setattr(profiler, "admin_token", "secret")
+        app = FastAPI()
+        app.include_router(router)
+        self.client = TestClient(app)
+
+    def test_event_loop_requires_admin(self):
+        """Задержку event loop без X-Admin-Token или с чужим токеном не отдаём"""
+        assert self.client.get("/api/crypto/event-loop").status_code == 403
+        assert self.client.get("/api/crypto/event-loop", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+    def test_event_loop_for_admin(self):
+        """Администратор получает задержку event loop"""
+        response = self.client.get("/api/crypto/event-loop", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == 200
+
+    def test_disabled_without_token(self, monkeypatch):
+        """Пустой ADMIN_TOKEN отключает административные эндпоинты"""
+        monkeypatch.setattr(profiler, "admin_token", "")
+        assert self.client.get("/api/crypto/event-loop", headers={"X-Admin-Token": ""}).status_code == 403
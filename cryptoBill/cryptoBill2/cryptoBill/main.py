@@ -1,7 +1,11 @@
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 import uvicorn
 from contextlib import asynccontextmanager
 from crypto_module.api.routes import router as crypto_router
+from crypto_module.config.settings import config
+from crypto_module.services.loop_monitor import loop_monitor
+from crypto_module.services.profiler import profiler, ProfileRequestMiddleware
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -13,7 +17,9 @@ async def lifespan(app: FastAPI):
     print("   - /api/crypto/deposit - Ввод средств")
     print("   - /api/crypto/withdraw - Вывод средств")
     print("   - /docs - Документация API")
+    loop_monitor.start()
     yield
+    await loop_monitor.stop()
 
 app = FastAPI(
     title="Мультибанк Крипто Модуль",
@@ -22,6 +28,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+app.add_middleware(GZipMiddleware, minimum_size=config.GZIP_MIN_SIZE, compresslevel=config.GZIP_LEVEL)
+app.add_middleware(ProfileRequestMiddleware, profiler=profiler)
+
 # Подключаем крипто-роуты
 app.include_router(crypto_router)
 
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from services.profiler import profiler, collapse, ProfilerBusy
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not profiler.is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Требуется действующий X-Admin-Token.")
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.post("/profile")
+async def run_profile(
+    seconds: float = Query(10.0, gt=0),
+    all_threads: bool = Query(False),
+    save: bool = Query(False),
+):
+    """
+    Статистическое профилирование процесса на seconds секунд (не больше settings.profile_max_seconds).
+    По умолчанию снимается поток event loop, с all_threads — все потоки.
+    Ответ — collapsed-стеки для flamegraph.pl/speedscope; с save=true профиль пишется
+    в settings.profile_dir, а в ответе возвращается имя файла.
+    Профиль одного запроса: заголовки X-Profile: 1 и X-Admin-Token на любом запросе.
+    """
+    try:
+        samples = await profiler.profile_for(seconds, all_threads)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="Профилирование уже выполняется.")
+    if save:
+        path = profiler.new_file("profile")
+        await asyncio.to_thread(profiler.save, path, samples)
+        return {"file": str(path), "stacks": len(samples), "samples": sum(samples.values())}
+    return PlainTextResponse(collapse(samples))
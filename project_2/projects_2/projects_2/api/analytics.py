@@ -0,0 +1,52 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Query
+
+from models.analytics import BreakdownReport, CashflowReport
+from services.analytics import spending_analytics
+from services.multi_bank_service import multi_bank_service
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+
+@router.get("/{client_id}/cashflow", response_model=CashflowReport)
+async def client_cashflow(client_id: str,
+                          date_from: Optional[date] = Query(None, description="Начало периода включительно"),
+                          date_to: Optional[date] = Query(None, description="Конец периода включительно"),
+                          window: int = Query(3, ge=1, le=120, description="Окно скользящей суммы, месяцев")):
+    """
+    Помесячные доходы, расходы и чистый поток клиента по всем подключённым банкам в разрезе валют,
+    со скользящей суммой за window месяцев и перцентилями месячных расходов.
+    Считается по транзакциям из локального хранилища, без запросов к банкам.
+    """
+    transactions, currencies = await spending_analytics.cashflow(
+        client_id, multi_bank_service.list_connected_banks(), date_from, date_to, window)
+    return CashflowReport(client_id=client_id, window=window, transactions=transactions, currencies=currencies)
+
+
+@router.get("/{client_id}/categories", response_model=BreakdownReport)
+async def client_categories(client_id: str,
+                            direction: str = Query("expense", pattern="^(expense|income)$"),
+                            limit: int = Query(20, ge=1, le=500),
+                            date_from: Optional[date] = None, date_to: Optional[date] = None):
+    """
+    Расходы (или доходы) клиента по категориям: сумма, доля, медиана и p90 операции.
+    """
+    transactions, items = await spending_analytics.breakdown(
+        client_id, multi_bank_service.list_connected_banks(), "category", direction, limit, date_from, date_to)
+    return BreakdownReport(client_id=client_id, by="category", direction=direction, transactions=transactions, items=items)
+
+
+@router.get("/{client_id}/counterparties", response_model=BreakdownReport)
+async def client_counterparties(client_id: str,
+                                direction: str = Query("expense", pattern="^(expense|income)$"),
+                                limit: int = Query(20, ge=1, le=500),
+                                date_from: Optional[date] = None, date_to: Optional[date] = None):
+    """
+    Расходы (или доходы) клиента по контрагентам: сумма, доля, медиана и p90 операции.
+    """
+    transactions, items = await spending_analytics.breakdown(
+        client_id, multi_bank_service.list_connected_banks(), "counterparty", direction, limit, date_from, date_to)
+    return BreakdownReport(client_id=client_id, by="counterparty", direction=direction, transactions=transactions,
+                           items=items)
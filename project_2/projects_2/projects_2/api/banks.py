@@ -1,15 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from typing import List, Dict, Optional, Union
+from pydantic import TypeAdapter
 from services.multi_bank_service import multi_bank_service
+from services.deadline import deadline_from_ms
+from services.sync_engine import sync_engine, InvalidCursor
 from models.account import Account
+from models.bulk_request import BankAccountRequest, PartialBulkAccountsResponse
 from models.consent import ConsentRequest, ConsentResponse
 from models.payment_consent import PaymentConsentRequest, PaymentConsentResponse
+from models.sync import ChangesPage
+from utils.encoding import MsgPackResponse, MSGPACK_MEDIA_TYPE, wants_msgpack
+from utils.http_cache import etag_matches, make_etag
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/banks", tags=["banks"])
 
+# Те же схемы, что и для JSON: MessagePack получает результат model_dump(mode="json").
+ACCOUNTS_ADAPTER = TypeAdapter(Dict[str, List[Account]])
+BULK_ACCOUNTS_ADAPTER = TypeAdapter(Dict[str, Optional[Dict[str, List[Account]]]])
+
 
 
 @router.post("/{bank_name}/request-payment-consent", response_model=PaymentConsentResponse)
@@ -64,20 +75,49 @@ async def request_account_consent_for_client(request: ConsentRequest):
 
 
 
+def _accounts_etag(results: Dict[str, Optional[Dict[str, List[Dict]]]], media_type: str) -> str:
+    """
+    ETag ответа со счетами по версиям данных клиентов, без сериализации тела.
+    Все записи клиента получены одной синхронизацией, поэтому её момент (as_of)
+    и источник (live/cache) однозначно определяют содержимое ответа; media_type
+    различает представления JSON и MessagePack.
+    """
+    versions = [media_type]
+    for bank_name, clients_data in results.items():
+        if clients_data is None:
+            versions.append(f"{bank_name}:-")
+            continue
+        for client_id, raw_details_list in clients_data.items():
+            first = raw_details_list[0] if raw_details_list else {}
+            versions.append(f"{bank_name}:{client_id}:{len(raw_details_list)}:{first.get('as_of')}:{first.get('source')}")
+    return make_etag(*versions)
+
+
 @router.get("/{bank_name}/accounts", response_model=Dict[str, List[Account]])
 async def get_accounts_for_bank(
         bank_name: str,
-        client_ids: List[str] = Query(..., alias="client_id")
+        response: Response,
+        client_ids: List[str] = Query(..., alias="client_id"),
+        if_none_match: Optional[str] = Header(None),
+        accept: Optional[str] = Header(None)
 ):
     """
     Получает все счета, детали, балансы и транзакции для указанных клиентов в конкретном банке.
     ИСПОЛЬЗУЕТ СУЩЕСТВУЮЩЕЕ consent_id из файла для каждого клиента.
+    Ответ содержит ETag; при совпадении If-None-Match возвращается 304 без тела.
+    С Accept: application/msgpack ответ кодируется в MessagePack по той же схеме.
     """
 
     accounts_data = await multi_bank_service.get_accounts_for_single_bank(bank_name, client_ids)
     if accounts_data is None:
         raise HTTPException(status_code=404, detail=f"Банк '{bank_name}' не найден или ошибка при сборе данных.")
 
+    binary = wants_msgpack(accept)
+    headers = {"ETag": _accounts_etag({bank_name: accounts_data}, MSGPACK_MEDIA_TYPE if binary else "json"),
+               "Vary": "Accept"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
 
     transformed_accounts = {}
     for client_id, raw_details_list in accounts_data.items():
@@ -85,22 +125,7 @@ async def get_accounts_for_bank(
         for raw_detail in raw_details_list:
             logger.info(f"Обрабатываем raw_detail: {raw_detail}")
             try:
-                account_obj = Account(
-                    id=raw_detail.get("id", raw_detail.get("accountId", "unknown_id")),
-                    identification=raw_detail.get("identification"),
-                    balance=raw_detail.get("balance"),
-                    currency=raw_detail.get("currency", "RUB"),
-                    client_id=client_id,
-                    bank_name=bank_name,
-                    status=raw_detail.get("status"),
-                    account_type=raw_detail.get("accountType"),
-                    account_sub_type=raw_detail.get("accountSubType"),
-                    description=raw_detail.get("description"),
-                    nickname=raw_detail.get("nickname"),
-                    opening_date=raw_detail.get("openingDate"),
-                    balances=raw_detail.get("balances"),
-                    transactions=raw_detail.get("transactions")
-                )
+                account_obj = Account.from_raw_detail(raw_detail, client_id, bank_name)
                 logger.info(f"Создан объект Account: {account_obj}")
                 account_objects.append(account_obj)
             except Exception as e:
@@ -109,28 +134,13 @@ async def get_accounts_for_bank(
         transformed_accounts[client_id] = account_objects
 
     logger.info(f"Преобразованные данные для банка {bank_name} перед сериализацией: {transformed_accounts}")
+    if binary:
+        return MsgPackResponse(ACCOUNTS_ADAPTER.dump_python(transformed_accounts, mode="json"), headers=headers)
     return transformed_accounts
 
 
-@router.post("/accounts_bulk", response_model=Dict[str, Optional[Dict[str, List[Account]]]])
-async def get_accounts_for_banks(bank_requests: List[Dict[str, List[str]]]):
-    """
-    Получает данные для списка банков и их клиентов параллельно.
-    Тело запроса: [{"bank_name": "vbank", "client_ids": ["team020-1"]}, ...]
-    """
-
-    connected_banks = multi_bank_service.list_connected_banks()
-    requested_banks = [req["bank_name"] for req in bank_requests]
-    missing_banks = set(requested_banks) - set(connected_banks)
-    if missing_banks:
-        raise HTTPException(status_code=404, detail=f"Банки не найдены: {list(missing_banks)}")
-
-    prepared_requests = [{"bank_name": req["bank_name"], "client_ids": req["client_ids"]} for req in bank_requests]
-
-    logger.info(f"Подготовленные запросы для сервиса: {prepared_requests}")
-    results = await multi_bank_service.get_accounts_for_multiple_banks(prepared_requests)
-    logger.info(f"Получены результаты из сервиса: {results}")
-
+def _transform_bank_results(results: Dict[str, Optional[Dict[str, List[Dict]]]]) -> Dict[str, Optional[Dict[str, List[Account]]]]:
+    """Преобразует сырые данные сервиса по банкам и клиентам в объекты Account."""
     transformed_results = {}
     for bank_name, clients_data in results.items():
         if clients_data is None:
@@ -142,35 +152,117 @@ async def get_accounts_for_banks(bank_requests: List[Dict[str, List[str]]]):
             account_objects = []
             for raw_detail in raw_details_list:
                 try:
-                    account_obj = Account(
-                        id=raw_detail.get("id", raw_detail.get("accountId", "unknown_id")),
-                        identification=raw_detail.get("identification"),
-                        balance=raw_detail.get("balance"),
-                        currency=raw_detail.get("currency", "RUB"),
-                        client_id=client_id,
-                        bank_name=bank_name,
-                        status=raw_detail.get("status"),
-                        account_type=raw_detail.get("accountType"),
-                        account_sub_type=raw_detail.get("accountSubType"),
-                        description=raw_detail.get("description"),
-                        nickname=raw_detail.get("nickname"),
-                        opening_date=raw_detail.get("openingDate"),
-                        balances=raw_detail.get("balances"),
-                        transactions=raw_detail.get("transactions")
-                    )
-                    account_objects.append(account_obj)
+                    account_objects.append(Account.from_raw_detail(raw_detail, client_id, bank_name))
                 except Exception as e:
                     logger.error(
                         f"[{bank_name}] Ошибка при создании объекта Account из {raw_detail} для клиента {client_id}: {e}")
                     continue
             transformed_clients[client_id] = account_objects
         transformed_results[bank_name] = transformed_clients
+    return transformed_results
+
+
+@router.post("/accounts_bulk",
+             response_model=Union[Dict[str, Optional[Dict[str, List[Account]]]], PartialBulkAccountsResponse])
+async def get_accounts_for_banks(
+        bank_requests: List[BankAccountRequest],
+        response: Response,
+        deadline_ms: Optional[int] = Query(None, gt=0),
+        x_deadline_ms: Optional[int] = Header(None, gt=0),
+        if_none_match: Optional[str] = Header(None),
+        accept: Optional[str] = Header(None)
+):
+    """
+    Получает данные для списка банков и их клиентов параллельно.
+    Тело запроса: [{"bank_name": "vbank", "client_ids": ["team020-1"]}, ...]
+
+    Если передан бюджет времени (параметр deadline_ms или заголовок X-Deadline-Ms),
+    ответ приходит не позже дедлайна и содержит то, что успело собраться,
+    с признаками полноты по банкам и клиентам:
+    {"complete": false, "results": {...}, "completeness": {"vbank": {"complete": false, "clients": {...}}}}.
+    Недособранные клиенты дообрабатываются в фоне и попадают в кэш.
+    В том же формате, с complete=false, приходит и ответ без дедлайна, если часть
+    банков или клиентов получить не удалось: пустой список счетов не выдаётся за успех.
+
+    Полный ответ (без дедлайна) содержит ETag: тело запроса — это запрос на чтение,
+    поэтому при совпадении If-None-Match, как и для GET, возвращается 304 без тела.
+    С Accept: application/msgpack ответ кодируется в MessagePack по той же схеме.
+    """
+
+    connected_banks = multi_bank_service.list_connected_banks()
+    requested_banks = [req.bank_name for req in bank_requests]
+    missing_banks = set(requested_banks) - set(connected_banks)
+    if missing_banks:
+        raise HTTPException(status_code=404, detail=f"Банки не найдены: {list(missing_banks)}")
+
+    prepared_requests = [{"bank_name": req.bank_name, "client_ids": req.client_ids} for req in bank_requests]
+
+    logger.info(f"Подготовленные запросы для сервиса: {prepared_requests}")
+
+    try:
+        deadline = deadline_from_ms(deadline_ms or x_deadline_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    binary = wants_msgpack(accept)
+    results, completeness = await multi_bank_service.get_accounts_for_multiple_banks_within_deadline(
+        prepared_requests, deadline)
+    complete = all(bank["complete"] for bank in completeness.values())
+    if deadline is not None or not complete:
+        logger.info(f"Получены результаты из сервиса, полнота: {completeness}")
+        partial_response = PartialBulkAccountsResponse(
+            complete=complete,
+            results=_transform_bank_results(results),
+            completeness=completeness,
+        )
+        if binary:
+            return MsgPackResponse(partial_response.model_dump(mode="json"), headers={"Vary": "Accept"})
+        return partial_response
+
+    headers = {"ETag": _accounts_etag(results, MSGPACK_MEDIA_TYPE if binary else "json"), "Vary": "Accept"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    logger.info(f"Получены результаты из сервиса: {results}")
+
+    transformed_results = _transform_bank_results(results)
 
 
     logger.info(f"Преобразованные данные для bulk перед сериализацией: {transformed_results}")
+    if binary:
+        return MsgPackResponse(BULK_ACCOUNTS_ADAPTER.dump_python(transformed_results, mode="json"), headers=headers)
     return transformed_results
 
 
+@router.get("/changes", response_model=ChangesPage)
+async def get_changes(
+        cursor: Optional[str] = Query(None),
+        client_ids: Optional[List[str]] = Query(None, alias="client_id"),
+        bank_names: Optional[List[str]] = Query(None, alias="bank_name"),
+        limit: int = Query(500, ge=1, le=5000),
+        accept: Optional[str] = Header(None)
+):
+    """
+    Дельта-синхронизация: счета, балансы и транзакции, созданные или изменённые после cursor.
+    Без cursor возвращается всё с начала журнала. В ответе — новый непрозрачный cursor
+    для следующего запроса; has_more=true означает, что за ним есть ещё изменения.
+    Если переданы client_id, их счета предварительно обновляются из банков (bank_name — из каких).
+    Удалённые счета и балансы приходят с op="delete".
+    С Accept: application/msgpack ответ кодируется в MessagePack по той же схеме.
+    """
+    if bank_names:
+        missing_banks = set(bank_names) - set(multi_bank_service.list_connected_banks())
+        if missing_banks:
+            raise HTTPException(status_code=404, detail=f"Банки не найдены: {list(missing_banks)}")
+    try:
+        page = await sync_engine.changes(cursor, limit, bank_names, client_ids)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if wants_msgpack(accept):
+        return MsgPackResponse(ChangesPage.model_validate(page).model_dump(mode="json"), headers={"Vary": "Accept"})
+    return page
+
+
 @router.post("/connect")
 async def connect_bank(bank_config: Dict[str, str]):
     """
@@ -181,7 +273,7 @@ async def connect_bank(bank_config: Dict[str, str]):
         raise HTTPException(status_code=400,
                             detail=f"Отсутствуют обязательные поля в конфигурации банка. Требуется: {required_keys}")
 
-    multi_bank_service.add_bank_connection(bank_config)
+    await multi_bank_service.add_bank_connection(bank_config)
     return {"message": f"Подключение к банку {bank_config['name']} добавлено."}
 
 
@@ -190,7 +282,7 @@ async def disconnect_bank(bank_name: str):
     """
     Удаляет подключение к банку.
     """
-    multi_bank_service.remove_bank_connection(bank_name)
+    await multi_bank_service.remove_bank_connection(bank_name)
     return {"message": f"Подключение к банку {bank_name} удалено."}
 
 
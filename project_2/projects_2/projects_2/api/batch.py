@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Header, HTTPException, Request
+from typing import Optional
+from config import settings
+from models.batch import BatchRequest, BatchResponse
+from services.batch import BatchExecutor, BatchError
+from utils.encoding import MsgPackResponse, wants_msgpack
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["batch"])
+
+batch_executor = BatchExecutor(settings.batch_max_requests)
+
+
+@router.post("/batch", response_model=BatchResponse)
+async def execute_batch(batch: BatchRequest, request: Request, accept: Optional[str] = Header(None)):
+    """
+    Выполняет несколько запросов к API за один сетевой запрос.
+    Тело: {"requests": [{"id": "conn", "method": "GET", "path": "/banks/connections"},
+                        {"id": "acc", "path": "/banks/{{conn.body.connected_banks.0}}/accounts",
+                         "params": {"client_id": ["team020-1"]}}]}
+    Подзапросы выполняются параллельно внутри процесса; ссылка {{id.путь}} на результат
+    более раннего подзапроса делает подзапрос зависимым от него. Результаты возвращаются
+    в порядке подзапросов: [{"id", "status", "body", "duration_ms"}, ...].
+    """
+    try:
+        results = await batch_executor.execute(request.app, batch.requests)
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response = {"results": results}
+    if wants_msgpack(accept):
+        return MsgPackResponse(BatchResponse.model_validate(response).model_dump(mode="json"),
+                               headers={"Vary": "Accept"})
+    return response
@@ -0,0 +1,101 @@
+import asyncio
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query
+
+from models.summary import BankSummary, ClientSummary, ConvertedTotal, CurrencyTotal
+from models.transaction import TransactionSearchPage
+from services.fx import fx_rates
+from services.local_store import local_store
+from services.multi_bank_service import multi_bank_service
+from services.transaction_search import transaction_search, InvalidSearch
+from utils.money import format_minor, to_minor
+
+router = APIRouter(prefix="/clients", tags=["clients"])
+
+
+def _currency_total(currency: str, minor: int, accounts: int) -> CurrencyTotal:
+    return CurrencyTotal(currency=currency, minor=minor, amount=format_minor(minor, currency), accounts=accounts)
+
+
+@router.get("/{client_id}/summary", response_model=ClientSummary)
+async def client_summary(client_id: str,
+                         currency: Optional[str] = Query(None, description="Валюта общего итога; по умолчанию fx_base_currency")):
+    """
+    Сводка денег клиента по всем подключённым банкам: итоги по банкам и валютам и общий итог,
+    пересчитанный в одну валюту по кэшированным курсам. Считается по итогам, которые
+    локальное хранилище обновляет при каждой синхронизации счетов, без запросов к банкам.
+    """
+    rows = await asyncio.to_thread(local_store.client_balances, client_id, multi_bank_service.list_connected_banks())
+
+    banks: Dict[str, BankSummary] = {}
+    totals: Dict[str, Tuple[int, int]] = {}
+    for row in rows:
+        bank = banks.setdefault(row["bank_name"], BankSummary(bank_name=row["bank_name"], totals=[], synced_at=row["as_of"]))
+        bank.totals.append(_currency_total(row["currency"], row["total_minor"], row["accounts"]))
+        minor, accounts = totals.get(row["currency"], (0, 0))
+        totals[row["currency"]] = (minor + row["total_minor"], accounts + row["accounts"])
+
+    target = (currency or fx_rates.base_currency).upper()
+    converted = None
+    if totals:
+        converted_minor, missing_rates = 0, []
+        for total_currency, (minor, _) in totals.items():
+            value = fx_rates.convert(minor, total_currency, target)
+            if value is None:
+                missing_rates.append(total_currency)
+            else:
+                converted_minor += value
+        if missing_rates:
+            # Частичная сумма выглядела бы как полный итог: без всех курсов итога нет.
+            converted = ConvertedTotal(currency=target, missing_rates=sorted(missing_rates))
+        else:
+            converted = ConvertedTotal(currency=target, minor=converted_minor, amount=format_minor(converted_minor, target))
+
+    return ClientSummary(
+        client_id=client_id,
+        banks=list(banks.values()),
+        totals=[_currency_total(total_currency, minor, accounts)
+                for total_currency, (minor, accounts) in sorted(totals.items())],
+        converted=converted,
+        fx=fx_rates.as_dict(),
+    )
+
+
+@router.get("/{client_id}/transactions/search", response_model=TransactionSearchPage)
+async def search_transactions(
+        client_id: str,
+        q: str = Query(..., min_length=1, max_length=200, description="Слова из описания или контрагента; слово* — по началу"),
+        bank_names: Optional[List[str]] = Query(None, alias="bank_name"),
+        account_id: Optional[str] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        amount_min: Optional[str] = Query(None, description="Минимальная сумма операции по модулю, например 150.00"),
+        amount_max: Optional[str] = Query(None, description="Максимальная сумма операции по модулю"),
+        currency: Optional[str] = None,
+        sort: str = Query("date", pattern="^(date|relevance)$"),
+        limit: int = Query(20, ge=1, le=200),
+        cursor: Optional[str] = None
+):
+    """
+    Поиск транзакций клиента по всем подключённым банкам: «где я платил X».
+    Ищет по описанию и контрагенту в полнотекстовом индексе локального хранилища,
+    без запросов к банкам. sort=date — от новых к старым, sort=relevance — по релевантности.
+    Следующая страница — с cursor из ответа и теми же параметрами.
+    """
+    connected = multi_bank_service.list_connected_banks()
+    if bank_names:
+        missing_banks = set(bank_names) - set(connected)
+        if missing_banks:
+            raise HTTPException(status_code=404, detail=f"Банки не найдены: {list(missing_banks)}")
+    try:
+        amounts = [to_minor(amount, currency or "RUB") for amount in (amount_min, amount_max)]
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        return await transaction_search.search(
+            client_id, q, sort, limit, cursor, bank_names or connected, account_id, date_from, date_to,
+            *amounts, currency.upper() if currency else None)
+    except InvalidSearch as e:
+        raise HTTPException(status_code=400, detail=str(e))
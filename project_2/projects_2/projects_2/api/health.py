@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from services.loop_monitor import loop_monitor
+from services.readiness import readiness
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get("/live")
+async def liveness():
+    """
+    Процесс запущен и обслуживает запросы.
+    """
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def readiness_check():
+    """
+    Готовность принимать трафик: 200 после завершения (или таймаута) прогрева, до этого 503.
+    """
+    return JSONResponse(status_code=200 if readiness.ready else 503, content=readiness.as_dict())
+
+
+@router.get("/loop")
+async def event_loop_lag():
+    """
+    Задержка event loop по последним замерам (мс): last, mean, p50, p99, max; stalls — число
+    замеров дольше порога блокировки, blocked_seconds — суммарное время таких блокировок.
+    """
+    return loop_monitor.as_dict()
@@ -0,0 +1,104 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Any, Dict, List, Optional
+from services.job_manager import job_manager, JobNotFound, JobManagerStopped
+from services.multi_bank_service import multi_bank_service
+from models.account import Account
+from models.job import AggregateJobRequest, JobResponse, JobResultsPage, JobResultItem, JobProgress
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def _results_page(job_id: str, items: List[Dict[str, Any]], next_cursor: Optional[int]) -> JobResultsPage:
+    result_items = []
+    for item in items:
+        accounts = None
+        if item["result"] is not None:
+            accounts = []
+            for raw_detail in item["result"]:
+                try:
+                    accounts.append(Account.from_raw_detail(raw_detail, item["client_id"], item["bank_name"]))
+                except Exception as e:
+                    logger.error(f"[{item['bank_name']}] Ошибка при создании объекта Account из {raw_detail}: {e}")
+        result_items.append(JobResultItem(
+            seq=item["seq"],
+            bank_name=item["bank_name"],
+            client_id=item["client_id"],
+            status=item["status"],
+            accounts=accounts,
+            error=item["error"],
+        ))
+    return JobResultsPage(job_id=job_id, items=result_items, next_cursor=next_cursor)
+
+
+def _job_response(job: Dict[str, Any], results: Optional[JobResultsPage] = None) -> JobResponse:
+    return JobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        progress=JobProgress(total=job["total"], done=job["done"], failed=job["failed"]),
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+        error=job["error"],
+        results=results,
+    )
+
+
+@router.post("/aggregate", response_model=JobResponse, status_code=202)
+async def create_aggregate_job(request: AggregateJobRequest):
+    """
+    Ставит в очередь задачу агрегации счетов и сразу возвращает её идентификатор.
+    Тело запроса: {"bank_requests": [{"bank_name": "vbank", "client_ids": ["team020-1"]}, ...]}
+    """
+    connected_banks = multi_bank_service.list_connected_banks()
+    missing_banks = {req.bank_name for req in request.bank_requests} - set(connected_banks)
+    if missing_banks:
+        raise HTTPException(status_code=404, detail=f"Банки не найдены: {list(missing_banks)}")
+
+    try:
+        job = await job_manager.submit([req.model_dump() for req in request.bank_requests])
+    except JobManagerStopped:
+        raise HTTPException(status_code=503, detail="Сервис останавливается и не принимает новые задачи.")
+    return _job_response(job)
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, results_limit: int = Query(20, ge=0, le=500)):
+    """
+    Возвращает статус и прогресс задачи, а также первую страницу уже готовых результатов.
+    """
+    try:
+        job = await job_manager.get(job_id)
+        results = None
+        if results_limit:
+            items, next_cursor = await job_manager.results(job_id, limit=results_limit)
+            results = _results_page(job_id, items, next_cursor)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"Задача '{job_id}' не найдена.")
+    return _job_response(job, results)
+
+
+@router.get("/{job_id}/results", response_model=JobResultsPage)
+async def get_job_results(job_id: str, cursor: int = Query(-1), limit: int = Query(50, ge=1, le=500)):
+    """
+    Постраничная выдача готовых результатов задачи.
+    cursor — значение next_cursor из предыдущей страницы.
+    """
+    try:
+        items, next_cursor = await job_manager.results(job_id, cursor, limit)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"Задача '{job_id}' не найдена.")
+    return _results_page(job_id, items, next_cursor)
+
+
+@router.post("/{job_id}/cancel", response_model=JobResponse)
+async def cancel_job(job_id: str):
+    """
+    Отменяет задачу: невыполненные единицы работы пропускаются, выполняющиеся прерываются.
+    """
+    try:
+        job = await job_manager.cancel(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"Задача '{job_id}' не найдена.")
+    return _job_response(job)
@@ -1,7 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Union # <-- Добавлено
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional, Union # <-- Добавлено
+import asyncio
+import json
+import uuid
+from models.bulk_payment import BulkPaymentRequest
 from services.bank_service import BankService
+from services.bulk_payments import bulk_payment_executor, payment_outcome, BulkPaymentError
+from services.idempotency import (
+    idempotency_store,
+    request_fingerprint,
+    IdempotencyKeyReused,
+    IdempotencyInProgress,
+)
 from services.multi_bank_service import multi_bank_service
+from services.payment_consent_pool import ConsentLimitExceeded
+from services.payment_store import payment_store
 from models.consent import ConsentRequest, ConsentResponse
 from models.payment_consent import (
     SingleUseConsentWithCreditorRequest,
@@ -43,37 +57,100 @@ async def execute_payment_endpoint(
     consent_id: str,
     bank_name: str,
     payment_data: dict,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
 ):
     """
     Выполняет платёж на основе предоставленного consent_id в указанном банке.
+    С заголовком Idempotency-Key повтор запроса (например, после таймаута у клиента)
+    возвращает результат первой попытки с заголовком Idempotent-Replayed: true,
+    а не проводит платёж ещё раз. Тот же ключ с другими параметрами — 422.
     """
-    try:
-        logger.info(f"Получен запрос на выполнение платежа для клиента {client_id} с consent_id {consent_id} в банке {bank_name}")
-        logger.info(f"Тело запроса на выполнение платежа: {payment_data}")
+    logger.info(f"Получен запрос на выполнение платежа для клиента {client_id} с consent_id {consent_id} в банке {bank_name}")
+    logger.info(f"Тело запроса на выполнение платежа: {payment_data}")
 
+    service = multi_bank_service.get_service(bank_name)
+    if not service:
+        raise HTTPException(status_code=404, detail=f"Банк '{bank_name}' не найден или не подключен.")
 
-        service = multi_bank_service.bank_services.get(bank_name)
-        if not service:
-            raise HTTPException(status_code=404, detail=f"Банк '{bank_name}' не найден или не подключен.")
-
-        payment_response = await service.execute_payment(client_id, consent_id, payment_data)
-        return payment_response
+    if idempotency_key is None:
+        try:
+            return await service.execute_payment(client_id, consent_id, payment_data)
+        except ConsentLimitExceeded as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except Exception as e:
+            logger.error(f"Ошибка при выполнении платежа: {e}")
+            raise HTTPException(status_code=500, detail=f"Ошибка при выполнении платежа: {str(e)}")
 
+    fingerprint = request_fingerprint(bank_name, client_id, consent_id, payment_data)
+    try:
+        status, body, replayed = await idempotency_store.execute(
+            bank_name, client_id, idempotency_key, fingerprint, lambda: payment_outcome(service, client_id, consent_id, payment_data))
+    except IdempotencyKeyReused:
+        raise HTTPException(status_code=422, detail="Idempotency-Key уже использован для платежа с другими параметрами.")
+    except IdempotencyInProgress:
+        raise HTTPException(status_code=409, detail="Платёж с этим Idempotency-Key ещё выполняется, повторите запрос позже.")
+    except ConsentLimitExceeded as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка при выполнении платежа: {e}")
         raise HTTPException(status_code=500, detail=f"Ошибка при выполнении платежа: {str(e)}")
 
+    headers = {"Idempotent-Replayed": "true"} if replayed else None
+    return JSONResponse(status_code=status, content=body, headers=headers)
+
+
+@router.post("/bulk")
+async def execute_bulk_payments_endpoint(request: BulkPaymentRequest):
+    """
+    Выполняет пакет платежей по разным банкам и клиентам за один запрос.
+    Тело: {"batch_id": "payroll-2024-05", "payments": [{"bank_name": "vbank", "client_id": "team020-1",
+           "consent_id": "...", "payment_data": {...}, "idempotency_key": "необязательно"}, ...]}
+    Пакет проверяется целиком до первого платежа (400 при ошибке). Ответ — NDJSON, по строке
+    на платёж в порядке готовности: {"index", "bank_name", "client_id", "idempotency_key",
+    "status", "body", "replayed"}. Прерванный пакет продолжается повторной отправкой с тем же
+    batch_id (возвращается в заголовке X-Batch-Id): проведённые платежи не повторяются.
+    """
+    batch_id = request.batch_id or uuid.uuid4().hex
+    services = {}
+    for bank_name in {payment.bank_name for payment in request.payments}:
+        service = multi_bank_service.get_service(bank_name)
+        if service:
+            services[bank_name] = service
+    try:
+        keys = bulk_payment_executor.prepare(batch_id, request.payments, services)
+    except BulkPaymentError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Пакет платежей {batch_id}: {len(request.payments)} платежей в {len(services)} банках")
+
+    async def stream():
+        async for result in bulk_payment_executor.execute(batch_id, request.payments, keys, services):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers={"X-Batch-Id": batch_id})
+
 
 @router.get("/status/{payment_id}", response_model=PaymentStatusResponse)
 async def get_payment_status(
     payment_id: str,
-    client_id: str,
-    bank_service: BankService = Depends()
+    client_id: Optional[str] = None,
 ):
     """
-    Получает статус выполненного платежа.
+    Возвращает последний известный статус платежа из локального хранилища, без запроса к банку.
+    Статус обновляет фоновый опрос банка: часто сразу после создания платежа, затем всё реже,
+    до конечного статуса. В meta: polls — число опросов, final — опрос завершён,
+    next_poll_at — время следующего опроса (unix time).
     """
-    try:
-        raise HTTPException(status_code=501, detail="Получение статуса платежа пока не реализовано.")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка при получении статуса платежа: {str(e)}")
+    payment = await asyncio.to_thread(payment_store.get, payment_id)
+    if payment is None or (client_id is not None and payment["client_id"] != client_id):
+        raise HTTPException(status_code=404, detail=f"Платёж '{payment_id}' не найден.")
+    return PaymentStatusResponse(
+        data=payment["data"],
+        links={},
+        meta={
+            "bank_name": payment["bank_name"],
+            "polls": payment["polls"],
+            "final": payment["next_poll_at"] is None,
+            "updated_at": payment["updated_at"],
+            "next_poll_at": payment["next_poll_at"],
+        },
+    )
@@ -1,6 +1,7 @@
 import httpx
 from typing import Optional
 from pydantic import BaseModel
+from services.http_client import create_bank_client
 
 class AuthResponse(BaseModel):
     access_token: str
@@ -8,23 +9,33 @@ class AuthResponse(BaseModel):
     expires_in: int
 
 class BankAuthClient:
-    def __init__(self, base_url: str, client_id: str, client_secret: str):
+    def __init__(self, base_url: str, client_id: str, client_secret: str, bank_name: Optional[str] = None):
         self.base_url = base_url
         self.client_id = client_id
         self.client_secret = client_secret
+        self.bank_name = bank_name or client_id
 
-    async def get_token(self) -> str:
+    async def get_token(self, client: Optional[httpx.AsyncClient] = None) -> str:
         """
         Получает токен доступа к API банка
         """
+        return (await self.get_token_response(client)).access_token
+
+    async def get_token_response(self, client: Optional[httpx.AsyncClient] = None) -> AuthResponse:
+        """
+        Получает токен доступа к API банка вместе со сроком его действия.
+        client — пул соединений вызывающего; без него создаётся отдельный клиент.
+        """
         url = f"{self.base_url}/auth/bank-token"
         params = {
             "client_id": self.client_id,
             "client_secret": self.client_secret
         }
 
-        async with httpx.AsyncClient() as client:
+        if client is not None:
             response = await client.post(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            return data["access_token"]
\ No newline at end of file
+        else:
+            async with create_bank_client(self.bank_name) as own_client:
+                response = await own_client.post(url, params=params)
+        response.raise_for_status()
+        return AuthResponse(**response.json())
\ No newline at end of file
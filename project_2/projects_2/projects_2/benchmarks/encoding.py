@@ -0,0 +1,120 @@
+"""
+Сравнение JSON и MessagePack для ответов со счетами.
+
+Получает через приложение (mock-банк, in-process ASGI) ответ
+GET /banks/{bank}/accounts в обоих представлениях, проверяет, что после
+декодирования они совпадают, и замеряет на тех же данных:
+  - размер тела без сжатия и после gzip,
+  - время кодирования так, как это делает эндпоинт
+    (model_dump(mode="json") + json.dumps / msgpack.packb),
+  - время декодирования на стороне клиента (json.loads / msgpack.unpackb).
+
+Запуск (из каталога projects_2):
+    python -m benchmarks.encoding
+    python -m benchmarks.encoding --clients 50 --repeat 50
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict
+
+import httpx
+import msgpack
+
+from benchmarks.run import BANKS, PROJECT_DIR, MockBankProcess
+
+
+logger = logging.getLogger("benchmarks")
+
+
+def best_time_ms(func: Callable[[], Any], repeat: int) -> float:
+    """Лучшее время из repeat запусков: минимум меньше всего зависит от шума планировщика."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return round(best * 1000, 3)
+
+
+async def fetch_payloads(client_ids) -> Dict[str, bytes]:
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=120) as client:
+            payloads = {}
+            for name, accept in (("json", "application/json"), ("msgpack", "application/msgpack")):
+                response = await client.get(f"/banks/{BANKS[0]}/accounts", params={"client_id": client_ids},
+                                            headers={"Accept": accept, "Accept-Encoding": "identity"})
+                response.raise_for_status()
+                payloads[name] = response.content
+            return payloads
+
+
+def measure(payloads: Dict[str, bytes], repeat: int) -> Dict[str, Any]:
+    from api.banks import ACCOUNTS_ADAPTER
+
+    decoded_json = json.loads(payloads["json"])
+    if msgpack.unpackb(payloads["msgpack"]) != decoded_json:
+        raise RuntimeError("Ответы JSON и MessagePack после декодирования различаются")
+    accounts = ACCOUNTS_ADAPTER.validate_python(decoded_json)
+
+    def encode_json():
+        return json.dumps(ACCOUNTS_ADAPTER.dump_python(accounts, mode="json"), ensure_ascii=False,
+                          allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    def encode_msgpack():
+        return msgpack.packb(ACCOUNTS_ADAPTER.dump_python(accounts, mode="json"), use_bin_type=True)
+
+    return {
+        "json": {
+            "bytes": len(payloads["json"]),
+            "gzip_bytes": len(gzip.compress(payloads["json"], compresslevel=6)),
+            "encode_ms": best_time_ms(encode_json, repeat),
+            "decode_ms": best_time_ms(lambda: json.loads(payloads["json"]), repeat),
+        },
+        "msgpack": {
+            "bytes": len(payloads["msgpack"]),
+            "gzip_bytes": len(gzip.compress(payloads["msgpack"], compresslevel=6)),
+            "encode_ms": best_time_ms(encode_msgpack, repeat),
+            "decode_ms": best_time_ms(lambda: msgpack.unpackb(payloads["msgpack"]), repeat),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение JSON и MessagePack для ответов со счетами")
+    parser.add_argument("--clients", type=int, default=20, help="Клиентов в запросе")
+    parser.add_argument("--repeat", type=int, default=20, help="Повторов каждого замера")
+    args = parser.parse_args()
+
+    with MockBankProcess([]) as mock:
+        os.environ.update({
+            "BANK_CONFIGS": json.dumps([mock.bank_config(bank_name) for bank_name in BANKS]),
+            "CONSENT_PROPAGATION_DELAY": "0",
+            "ACCOUNTS_CACHE_TTL": "3600",
+        })
+        sys.path.insert(0, str(PROJECT_DIR))
+        os.chdir(tempfile.mkdtemp(prefix="projects2-encoding-"))
+        import main as app_main  # noqa: F401
+        logging.getLogger().setLevel(logging.CRITICAL)
+        logger.setLevel(logging.WARNING)
+        payloads = asyncio.run(fetch_payloads([f"enc-{i}" for i in range(1, args.clients + 1)]))
+
+    results = measure(payloads, args.repeat)
+    for name, result in results.items():
+        logger.warning(f"{name:8} {result['bytes']} байт (gzip {result['gzip_bytes']}), "
+                       f"кодирование {result['encode_ms']} ms, декодирование {result['decode_ms']} ms")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    main()
@@ -0,0 +1,111 @@
+"""
+Замер экономии трафика от ETag и gzip на эндпоинтах чтения счетов.
+
+Поднимает mock-банк, прогревает кэш счетов и сравнивает для
+GET /banks/{bank}/accounts и POST /banks/accounts_bulk:
+  - размер тела без сжатия (Accept-Encoding: identity),
+  - размер тела с gzip,
+  - повторный запрос с If-None-Match (304 без тела),
+а также среднее время ответа в каждом режиме.
+
+Запуск (из каталога projects_2):
+    python -m benchmarks.http_caching
+    python -m benchmarks.http_caching --clients 50 --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict
+
+import httpx
+
+from benchmarks.run import BANKS, PROJECT_DIR, MockBankProcess
+
+
+logger = logging.getLogger("benchmarks")
+
+
+async def measure_mode(client: httpx.AsyncClient, method: str, url: str, repeat: int,
+                       headers: Dict[str, str], **kwargs) -> Dict[str, Any]:
+    elapsed = 0.0
+    response = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = await client.request(method, url, headers=headers, **kwargs)
+        elapsed += time.perf_counter() - started
+    return {
+        "status": response.status_code,
+        "bytes": response.num_bytes_downloaded,
+        "avg_ms": round(elapsed / repeat * 1000, 2),
+    }
+
+
+async def measure_endpoint(client: httpx.AsyncClient, method: str, url: str, repeat: int, **kwargs) -> Dict[str, Any]:
+    first = await client.request(method, url, headers={"Accept-Encoding": "identity"}, **kwargs)
+    first.raise_for_status()
+    etag = first.headers["ETag"]
+    result = {
+        "identity": await measure_mode(client, method, url, repeat, {"Accept-Encoding": "identity"}, **kwargs),
+        "gzip": await measure_mode(client, method, url, repeat, {"Accept-Encoding": "gzip"}, **kwargs),
+        "not_modified": await measure_mode(client, method, url, repeat,
+                                           {"Accept-Encoding": "gzip", "If-None-Match": etag}, **kwargs),
+    }
+    identity_bytes = result["identity"]["bytes"]
+    for mode in ("gzip", "not_modified"):
+        result[mode]["saved_percent"] = round(100 * (1 - result[mode]["bytes"] / identity_bytes), 1) if identity_bytes else 0.0
+    return result
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from main import app
+
+    client_ids = [f"cache-{i}" for i in range(1, args.clients + 1)]
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=120) as client:
+            bulk_body = [{"bank_name": bank_name, "client_ids": client_ids} for bank_name in BANKS]
+            # Прогрев кэша счетов, чтобы замер не включал обращения к банку.
+            (await client.post("/banks/accounts_bulk", json=bulk_body)).raise_for_status()
+            return {
+                "single_bank": await measure_endpoint(client, "GET", f"/banks/{BANKS[0]}/accounts", args.repeat,
+                                                      params={"client_id": client_ids}),
+                "bulk": await measure_endpoint(client, "POST", "/banks/accounts_bulk", args.repeat, json=bulk_body),
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экономия трафика от ETag и gzip на эндпоинтах счетов")
+    parser.add_argument("--clients", type=int, default=20, help="Клиентов на банк")
+    parser.add_argument("--repeat", type=int, default=10, help="Повторов на режим")
+    args = parser.parse_args()
+
+    with MockBankProcess([]) as mock:
+        os.environ.update({
+            "BANK_CONFIGS": json.dumps([mock.bank_config(bank_name) for bank_name in BANKS]),
+            "CONSENT_PROPAGATION_DELAY": "0",
+            "ACCOUNTS_CACHE_TTL": "3600",
+        })
+        sys.path.insert(0, str(PROJECT_DIR))
+        # Согласия, кэши и журналы пишутся в текущий каталог — изолируем прогон.
+        os.chdir(tempfile.mkdtemp(prefix="projects2-http-caching-"))
+        import main as app_main  # noqa: F401
+        logging.getLogger().setLevel(logging.CRITICAL)
+        logger.setLevel(logging.WARNING)
+        results = asyncio.run(run(args))
+
+    for endpoint, modes in results.items():
+        for mode, result in modes.items():
+            saved = f", экономия {result['saved_percent']}%" if "saved_percent" in result else ""
+            logger.warning(f"{endpoint:12} {mode:13} HTTP {result['status']}: {result['bytes']} байт, "
+                           f"{result['avg_ms']} ms{saved}")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    main()
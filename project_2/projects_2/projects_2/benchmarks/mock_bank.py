@@ -0,0 +1,196 @@
+"""
+Локальный mock-банк для бенчмарков.
+
+Эмулирует подмножество Open Banking API песочницы (токен, согласия, счета,
+балансы, транзакции, платежи). Несколько "банков" обслуживаются одним
+процессом и различаются префиксом пути: http://127.0.0.1:PORT/<bank_name>.
+
+Запуск:
+    python -m benchmarks.mock_bank --port 8765 --degraded dbank
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import uuid
+import zlib
+from collections import Counter
+from typing import Dict, Set
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+ACCOUNTS_PER_CLIENT = 2
+TRANSACTION_PAGES = 2
+TRANSACTIONS_PER_PAGE = 25
+
+
+def create_app(degraded_banks: Set[str], degraded_latency: float = 0.2, degraded_error_every: int = 3,
+               seed: int = 42) -> FastAPI:
+    """
+    Создаёт приложение mock-банка.
+    Для банков из degraded_banks каждый ответ задерживается на degraded_latency,
+    а каждый degraded_error_every-й запрос завершается 503.
+    """
+    app = FastAPI(title="Mock Bank")
+    stats: Counter = Counter()
+    degraded_counter = itertools.count(1)
+    rng = random.Random(seed)
+    payments: Dict[str, Dict] = {}
+
+    @app.middleware("http")
+    async def count_and_degrade(request: Request, call_next):
+        parts = request.url.path.strip("/").split("/")
+        bank_name = parts[0] if parts else ""
+        if bank_name != "__stats":
+            stats[f"{bank_name} {request.method} {_route_key(parts[1:])}"] += 1
+            if bank_name in degraded_banks:
+                await asyncio.sleep(degraded_latency)
+                if next(degraded_counter) % degraded_error_every == 0:
+                    return JSONResponse(status_code=503, content={"detail": "degraded"})
+        return await call_next(request)
+
+    @app.get("/__stats")
+    async def get_stats():
+        return {"requests": dict(stats), "total": sum(stats.values())}
+
+    @app.post("/__stats/reset")
+    async def reset_stats():
+        stats.clear()
+        return {"ok": True}
+
+    @app.post("/{bank_name}/auth/bank-token")
+    async def bank_token(bank_name: str):
+        return {"access_token": f"token-{bank_name}-{uuid.uuid4().hex[:8]}", "token_type": "Bearer",
+                "expires_in": 86400}
+
+    @app.post("/{bank_name}/account-consents/request")
+    async def account_consent(bank_name: str, request: Request):
+        body = await request.json()
+        consent_id = f"consent-{uuid.uuid4().hex[:12]}"
+        return JSONResponse(
+            content={"consent_id": consent_id, "status": "approved", "auto_approved": True,
+                     "client_id": body.get("client_id")},
+            headers={"X-Consent-Id": consent_id},
+        )
+
+    @app.get("/{bank_name}/accounts")
+    async def accounts(bank_name: str, client_id: str):
+        account_list = [
+            {
+                "accountId": _account_id(bank_name, client_id, i),
+                "account": [{"identification": f"40817810{zlib.crc32(_account_id(bank_name, client_id, i).encode()):012d}"}],
+            }
+            for i in range(ACCOUNTS_PER_CLIENT)
+        ]
+        return {"data": {"account": account_list}}
+
+    @app.get("/{bank_name}/accounts/{account_id}")
+    async def account_detail(bank_name: str, account_id: str):
+        return {"data": {"account": [{
+            "accountId": account_id,
+            "status": "Enabled",
+            "currency": "RUB",
+            "accountType": "Personal",
+            "accountSubType": "CurrentAccount",
+            "description": "Текущий счёт",
+            "nickname": f"Счёт {account_id[-4:]}",
+            "openingDate": "2023-01-15",
+        }]}}
+
+    @app.get("/{bank_name}/accounts/{account_id}/balances")
+    async def balances(bank_name: str, account_id: str):
+        return {"data": {"balance": [
+            {
+                "accountId": account_id,
+                "type": balance_type,
+                "dateTime": "2025-01-01T00:00:00Z",
+                "amount": {"amount": f"{rng.randint(0, 10_000_000) / 100:.2f}", "currency": "RUB"},
+                "creditDebitIndicator": "Credit",
+            }
+            for balance_type in ("InterimAvailable", "InterimBooked")
+        ]}}
+
+    @app.get("/{bank_name}/accounts/{account_id}/transactions")
+    async def transactions(bank_name: str, account_id: str, page: int = 1, limit: int = 100):
+        if page > TRANSACTION_PAGES:
+            return {"data": {"transaction": []}}
+        items = []
+        for i in range(min(limit, TRANSACTIONS_PER_PAGE)):
+            n = (page - 1) * TRANSACTIONS_PER_PAGE + i
+            items.append({
+                "transactionId": f"tx-{account_id}-{n}",
+                "accountId": account_id,
+                "amount": {"amount": f"{(n * 7919) % 500000 / 100:.2f}", "currency": "RUB"},
+                "creditDebitIndicator": "Debit" if n % 3 else "Credit",
+                "status": "Booked",
+                "bookingDateTime": f"2025-{(n % 12) + 1:02d}-{(n % 28) + 1:02d}T12:00:00Z",
+                "valueDateTime": f"2025-{(n % 12) + 1:02d}-{(n % 28) + 1:02d}T12:00:00Z",
+                "transactionInformation": f"Оплата в магазине #{n % 17}",
+            })
+        return {"data": {"transaction": items}}
+
+    @app.post("/{bank_name}/payment-consents/request")
+    async def payment_consent(bank_name: str, request: Request):
+        body = await request.json()
+        return {
+            "request_id": f"req-{uuid.uuid4().hex[:12]}",
+            "consent_id": f"pcon-{uuid.uuid4().hex[:12]}",
+            "status": "approved",
+            "consent_type": body.get("consent_type", "single_use"),
+            "auto_approved": True,
+        }
+
+    @app.post("/{bank_name}/payments")
+    async def create_payment(bank_name: str, client_id: str, request: Request):
+        await request.json()
+        payment_id = f"pay-{uuid.uuid4().hex[:12]}"
+        payments[payment_id] = {"paymentId": payment_id, "status": "AcceptedSettlementInProcess"}
+        return {"data": payments[payment_id], "links": {}, "meta": {}}
+
+    @app.get("/{bank_name}/payments/{payment_id}")
+    async def get_payment(bank_name: str, payment_id: str, client_id: str):
+        payment = payments.get(payment_id)
+        if payment is None:
+            return JSONResponse(status_code=404, content={"detail": "payment not found"})
+        # Платёж исполняется со второго запроса статуса.
+        payment["polls"] = payment.get("polls", 0) + 1
+        if payment["polls"] >= 2:
+            payment["status"] = "AcceptedSettlementCompleted"
+        return {"data": {"paymentId": payment_id, "status": payment["status"]}, "links": {}, "meta": {}}
+
+    return app
+
+
+def _account_id(bank_name: str, client_id: str, index: int) -> str:
+    return f"acc-{bank_name}-{client_id}-{index}"
+
+
+def _route_key(path_parts) -> str:
+    """Сворачивает идентификаторы в пути, чтобы счётчики группировались по эндпоинту."""
+    normalized = []
+    for part in path_parts:
+        if part.startswith(("acc-", "pay-")):
+            normalized.append("{id}")
+        else:
+            normalized.append(part)
+    return "/" + "/".join(normalized)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock-банк для бенчмарков projects_2")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--degraded", action="append", default=[], help="Имя банка в деградированном режиме")
+    parser.add_argument("--degraded-latency", type=float, default=0.2)
+    parser.add_argument("--degraded-error-every", type=int, default=3)
+    args = parser.parse_args()
+
+    app = create_app(set(args.degraded), args.degraded_latency, args.degraded_error_every)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
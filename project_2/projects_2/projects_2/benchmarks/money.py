@@ -0,0 +1,132 @@
+"""
+Сравнение представлений сумм: float, Decimal и целые минимальные единицы (utils.money).
+
+На синтетических транзакциях в формате ответа банка ({"amount": "1234.56",
+"currency": "RUB"}, creditDebitIndicator) замеряет типичные операции агрегации:
+  - итог по валютам со знаком (Credit/Debit),
+  - сортировку по сумме,
+  - фильтр "сумма не меньше порога".
+Пути float и Decimal разбирают строки при каждой операции, как делал бы код без
+нормализации; путь minor разбирает их один раз при получении (normalize_account,
+время показано отдельно как ingest_ms), а затем работает с целыми числами.
+Итоги сверяются с точным значением: расхождение float показано в drift.
+
+Запуск (из каталога projects_2):
+    python -m benchmarks.money
+    python -m benchmarks.money --transactions 1000000 --repeat 5
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+from decimal import Decimal
+from typing import Any, Callable, Dict, List
+
+from benchmarks.run import PROJECT_DIR
+
+
+logger = logging.getLogger("benchmarks")
+
+
+def best_time_ms(func: Callable[[], Any], repeat: int) -> float:
+    """Лучшее время из repeat запусков: минимум меньше всего зависит от шума планировщика."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return round(best * 1000, 3)
+
+
+def make_transactions(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    currencies = ["RUB"] * 8 + ["USD", "EUR"]
+    return [{
+        "amount": {"amount": f"{rng.randint(1, 5_000_000) / 100:.2f}", "currency": rng.choice(currencies)},
+        "creditDebitIndicator": rng.choice(("Credit", "Debit")),
+    } for _ in range(count)]
+
+
+def measure(transactions: List[Dict[str, Any]], repeat: int) -> Dict[str, Dict[str, Any]]:
+    from utils.money import normalize_account, signed_minor, to_minor
+
+    threshold = "10000.00"
+
+    def sign(transaction):
+        return -1 if transaction["creditDebitIndicator"] == "Debit" else 1
+
+    def totals_float():
+        totals: Dict[str, float] = {}
+        for t in transactions:
+            currency = t["amount"]["currency"]
+            totals[currency] = totals.get(currency, 0.0) + sign(t) * float(t["amount"]["amount"])
+        return totals
+
+    def totals_decimal():
+        totals: Dict[str, Decimal] = {}
+        for t in transactions:
+            currency = t["amount"]["currency"]
+            totals[currency] = totals.get(currency, Decimal(0)) + sign(t) * Decimal(t["amount"]["amount"])
+        return totals
+
+    def totals_minor():
+        totals: Dict[str, int] = {}
+        for t in transactions:
+            currency = t["amount"]["currency"]
+            totals[currency] = totals.get(currency, 0) + signed_minor(t["amount"]["minor"], t["creditDebitIndicator"])
+        return totals
+
+    def ingest():
+        for t in transactions:
+            t["amount"].pop("minor", None)
+        normalize_account({"transactions": transactions})
+
+    ingest_ms = best_time_ms(ingest, 1)
+    exact = totals_minor()
+    float_totals = totals_float()
+
+    minor_threshold = to_minor(threshold)
+    decimal_threshold = Decimal(threshold)
+    float_threshold = float(threshold)
+    return {
+        "float": {
+            "total_ms": best_time_ms(totals_float, repeat),
+            "sort_ms": best_time_ms(lambda: sorted(transactions, key=lambda t: float(t["amount"]["amount"])), repeat),
+            "filter_ms": best_time_ms(lambda: [t for t in transactions if float(t["amount"]["amount"]) >= float_threshold], repeat),
+            # Отклонение итога float от точного (в единицах валюты).
+            "drift": {currency: str(Decimal(float_totals[currency]) - Decimal(exact[currency]).scaleb(-2))
+                      for currency in exact},
+        },
+        "decimal": {
+            "total_ms": best_time_ms(totals_decimal, repeat),
+            "sort_ms": best_time_ms(lambda: sorted(transactions, key=lambda t: Decimal(t["amount"]["amount"])), repeat),
+            "filter_ms": best_time_ms(lambda: [t for t in transactions if Decimal(t["amount"]["amount"]) >= decimal_threshold], repeat),
+        },
+        "minor": {
+            "ingest_ms": ingest_ms,
+            "total_ms": best_time_ms(totals_minor, repeat),
+            "sort_ms": best_time_ms(lambda: sorted(transactions, key=lambda t: t["amount"]["minor"]), repeat),
+            "filter_ms": best_time_ms(lambda: [t for t in transactions if t["amount"]["minor"] >= minor_threshold], repeat),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение float, Decimal и целых минимальных единиц для сумм")
+    parser.add_argument("--transactions", type=int, default=200_000, help="Число транзакций")
+    parser.add_argument("--repeat", type=int, default=5, help="Повторов каждого замера")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(PROJECT_DIR))
+    results = measure(make_transactions(args.transactions), args.repeat)
+    for name, result in results.items():
+        logger.warning(f"{name:8} итог {result['total_ms']} ms, сортировка {result['sort_ms']} ms, "
+                       f"фильтр {result['filter_ms']} ms")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    main()
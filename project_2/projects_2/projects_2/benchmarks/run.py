@@ -0,0 +1,424 @@
+"""
+Сквозной бенчмарк агрегации projects_2 против локального mock-банка.
+
+Поднимает benchmarks.mock_bank в отдельном процессе, направляет на него
+конфигурацию банков и прогоняет сценарии через MultiBankService и через
+HTTP-эндпоинты приложения (in-process, через ASGI-транспорт httpx).
+
+Для каждого сценария считаются throughput, p50/p95/p99 латентности,
+число запросов к upstream (по счётчикам mock-банка) и пиковый RSS процесса.
+Результаты пишутся в JSON и сравниваются с сохранённым baseline:
+при регрессии сверх допуска скрипт завершается с кодом 1.
+
+Запуск (из каталога projects_2):
+    python -m benchmarks.run
+    python -m benchmarks.run --scenario warm_refresh --scenario payment_burst
+    python -m benchmarks.run --update-baseline
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = BENCHMARKS_DIR.parent
+DEFAULT_BASELINE = BENCHMARKS_DIR / "baseline.json"
+DEFAULT_OUTPUT = BENCHMARKS_DIR / "results.json"
+
+BANKS = ["vbank", "abank", "sbank"]
+DEGRADED_BANK = "dbank"
+
+# Метрики, для которых "больше" — это хуже.
+LOWER_IS_BETTER = ("errors", "p50_ms", "p95_ms", "p99_ms", "upstream_requests", "peak_rss_mb")
+HIGHER_IS_BETTER = ("throughput_ops",)
+# Разница латентностей меньше этого порога считается шумом.
+LATENCY_NOISE_FLOOR_MS = 5.0
+
+logger = logging.getLogger("benchmarks")
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Перцентиль с линейной интерполяцией (q в диапазоне 0..100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def peak_rss_mb() -> float:
+    """Пиковый RSS текущего процесса в МБ (ru_maxrss: КБ на Linux, байты на macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class MockBankProcess:
+    """Запускает mock-банк в отдельном процессе, чтобы его CPU и память не смешивались с замерами."""
+
+    def __init__(self, degraded_banks: List[str]):
+        self.degraded_banks = degraded_banks
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.process: Optional[subprocess.Popen] = None
+
+    def __enter__(self):
+        cmd = [sys.executable, "-m", "benchmarks.mock_bank", "--port", str(self.port)]
+        for bank_name in self.degraded_banks:
+            cmd += ["--degraded", bank_name]
+        self.process = subprocess.Popen(cmd, cwd=PROJECT_DIR)
+        deadline = time.monotonic() + 15
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.2):
+                    return self
+            except OSError:
+                time.sleep(0.1)
+        self.__exit__(None, None, None)
+        raise RuntimeError("Mock-банк не запустился за 15 секунд")
+
+    def __exit__(self, *exc):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+
+    def bank_config(self, bank_name: str) -> Dict[str, str]:
+        return {
+            "name": bank_name,
+            "api_base_url": f"{self.base_url}/{bank_name}",
+            "client_id": "team020",
+            "client_secret": "benchmark",
+        }
+
+    async def upstream_stats(self) -> Dict[str, Any]:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(f"{self.base_url}/__stats")
+            return response.json()
+
+    async def reset_stats(self):
+        async with httpx.AsyncClient() as client:
+            await client.post(f"{self.base_url}/__stats/reset")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class BenchmarkContext:
+    """Общее состояние сценариев: mock-банк, сервисы и ASGI-клиент приложения."""
+
+    def __init__(self, mock: MockBankProcess, clients_per_bank: int, bulk_clients: int, payments: int):
+        from services.multi_bank_service import MultiBankService
+        from main import app
+
+        self.mock = mock
+        self.clients_per_bank = clients_per_bank
+        self.bulk_clients = bulk_clients
+        self.payments = payments
+        self.service = MultiBankService()
+        self.http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app",
+                                      timeout=None)
+
+    async def connect(self):
+        from services.multi_bank_service import multi_bank_service
+
+        for bank_name in BANKS:
+            await self.service.add_bank_connection(self.mock.bank_config(bank_name))
+        # HTTP-эндпоинты работают с глобальным multi_bank_service.
+        for bank_name in BANKS + [DEGRADED_BANK]:
+            await multi_bank_service.add_bank_connection(self.mock.bank_config(bank_name))
+
+    def client_ids(self, count: int, prefix: str = "bench") -> List[str]:
+        return [f"{prefix}-{i}" for i in range(1, count + 1)]
+
+
+class Samples:
+    """Латентности операций сценария и число завершившихся ошибкой."""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+
+
+def missing_clients(results: Optional[Dict[str, Any]], client_ids: List[str]) -> int:
+    """
+    Сколько клиентов не получили счетов. Mock-банк выдаёт счета каждому клиенту, поэтому
+    отсутствующий или пустой список — это неполученный клиент, а не успешный ответ.
+    """
+    if results is None:
+        return len(client_ids)
+    return sum(1 for client_id in client_ids if not results.get(client_id))
+
+
+class IncompleteResult(Exception):
+    """Ответ получен, но часть клиентов в нём без счетов."""
+
+
+async def _timed(operation: Callable, samples: Samples):
+    started = time.perf_counter()
+    try:
+        await operation()
+    except Exception as e:
+        samples.errors += 1
+        logger.debug(f"Операция завершилась ошибкой: {e}")
+    samples.latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def scenario_cold_first_sync(ctx: BenchmarkContext) -> Samples:
+    """Первая синхронизация: без токена и согласий, по одному запросу на клиента в каждом банке."""
+    samples = Samples()
+
+    async def sync(bank_name: str, client_id: str):
+        accounts = await ctx.service.get_accounts_for_single_bank(bank_name, [client_id])
+        if missing_clients(accounts, [client_id]):
+            raise IncompleteResult(f"{bank_name}: клиент {client_id} без счетов")
+
+    tasks = [
+        _timed(lambda b=bank_name, c=client_id: sync(b, c), samples)
+        for bank_name in BANKS
+        for client_id in ctx.client_ids(ctx.clients_per_bank)
+    ]
+    await asyncio.gather(*tasks)
+    return samples
+
+
+async def scenario_warm_refresh(ctx: BenchmarkContext) -> Samples:
+    """Повторное обновление тех же клиентов тем же сервисом: токены и согласия уже получены."""
+    return await scenario_cold_first_sync(ctx)
+
+
+async def scenario_bulk_request(ctx: BenchmarkContext) -> Samples:
+    """
+    Один POST /banks/accounts_bulk на bulk_clients клиентов в каждом из трёх банков.
+    Каждый неполученный клиент считается отдельной ошибкой.
+    """
+    client_ids = ctx.client_ids(ctx.bulk_clients, prefix="bulk")
+    body = [{"bank_name": bank_name, "client_ids": client_ids} for bank_name in BANKS]
+    samples = Samples()
+
+    async def request():
+        response = await ctx.http.post("/banks/accounts_bulk", json=body)
+        response.raise_for_status()
+        payload = response.json()
+        # Неполный ответ приходит в формате {"complete": false, "results": {...}, "completeness": {...}}.
+        results = payload["results"] if "completeness" in payload else payload
+        samples.errors += sum(missing_clients(results.get(bank_name), client_ids) for bank_name in BANKS)
+
+    await _timed(request, samples)
+    return samples
+
+
+async def scenario_payment_burst(ctx: BenchmarkContext) -> Samples:
+    """Пачка одновременных POST /payments/execute, распределённых по банкам."""
+    samples = Samples()
+    payment_body = {
+        "data": {"initiation": {
+            "instructedAmount": {"amount": "100.00", "currency": "RUB"},
+            "debtorAccount": {"schemeName": "RU.CBR.PAN", "identification": "40817810099910004312"},
+            "creditorAccount": {"schemeName": "RU.CBR.PAN", "identification": "40817810099910005423",
+                                "bank_code": "abank"},
+        }}
+    }
+
+    async def pay(index: int):
+        params = {"client_id": f"pay-client-{index % 10}", "consent_id": f"pcon-bench-{index}",
+                  "bank_name": BANKS[index % len(BANKS)]}
+        response = await ctx.http.post("/payments/execute", params=params, json=payment_body)
+        response.raise_for_status()
+
+    await asyncio.gather(*[_timed(lambda i=i: pay(i), samples) for i in range(ctx.payments)])
+    return samples
+
+
+async def scenario_degraded_bank(ctx: BenchmarkContext) -> Samples:
+    """GET /banks/{bank}/accounts к банку, который отвечает медленно и периодически 503."""
+    samples = Samples()
+
+    async def fetch(client_id: str):
+        response = await ctx.http.get(f"/banks/{DEGRADED_BANK}/accounts", params={"client_id": client_id})
+        response.raise_for_status()
+        if missing_clients(response.json(), [client_id]):
+            raise IncompleteResult(f"{DEGRADED_BANK}: клиент {client_id} без счетов")
+
+    await asyncio.gather(*[_timed(lambda c=c: fetch(c), samples)
+                           for c in ctx.client_ids(ctx.clients_per_bank, prefix="degraded")])
+    return samples
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "cold_first_sync": scenario_cold_first_sync,
+    "warm_refresh": scenario_warm_refresh,
+    "bulk_500x3": scenario_bulk_request,
+    "payment_burst": scenario_payment_burst,
+    "degraded_bank": scenario_degraded_bank,
+}
+
+
+async def run_scenario(name: str, ctx: BenchmarkContext) -> Dict[str, Any]:
+    await ctx.mock.reset_stats()
+    started = time.perf_counter()
+    samples = await SCENARIOS[name](ctx)
+    latencies = samples.latencies
+    elapsed = time.perf_counter() - started
+    upstream = await ctx.mock.upstream_stats()
+    result = {
+        "operations": len(latencies),
+        "errors": samples.errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_ops": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "upstream_requests": upstream["total"],
+        "upstream_by_endpoint": upstream["requests"],
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    logger.warning(
+        f"{name}: {result['operations']} оп. ({result['errors']} ошибок) за {result['elapsed_s']}s, {result['throughput_ops']} оп/с, "
+        f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms, "
+        f"upstream={result['upstream_requests']}, rss={result['peak_rss_mb']}MB")
+    return result
+
+
+# Параметры нагрузки из meta: результаты с разными значениями несравнимы.
+WORKLOAD_PARAMS = ("clients_per_bank", "bulk_clients", "payments", "consent_delay")
+
+
+def workload_mismatch(meta: Dict[str, Any], baseline_meta: Dict[str, Any]) -> List[str]:
+    """Параметры нагрузки, которыми прогон отличается от baseline (отсутствующие в baseline не сравниваются)."""
+    return [f"{param}: baseline {baseline_meta[param]}, прогон {meta.get(param)}"
+            for param in WORKLOAD_PARAMS if param in baseline_meta and baseline_meta[param] != meta.get(param)]
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                          tolerance: float) -> List[str]:
+    """Возвращает список регрессий относительно baseline (пустой — регрессий нет)."""
+    regressions = []
+    for scenario, metrics in results.items():
+        reference = baseline.get(scenario)
+        if not reference:
+            continue
+        for metric in LOWER_IS_BETTER:
+            current, previous = metrics.get(metric), reference.get(metric)
+            if current is None or previous is None:
+                continue
+            if metric.endswith("_ms") and current - previous < LATENCY_NOISE_FLOOR_MS:
+                continue
+            if current > previous * (1 + tolerance):
+                regressions.append(f"{scenario}.{metric}: {previous} -> {current}")
+        for metric in HIGHER_IS_BETTER:
+            current, previous = metrics.get(metric), reference.get(metric)
+            if current is None or previous is None:
+                continue
+            if current < previous * (1 - tolerance):
+                regressions.append(f"{scenario}.{metric}: {previous} -> {current}")
+    return regressions
+
+
+async def run(args) -> Dict[str, Dict[str, Any]]:
+    from config import settings
+
+    settings.consent_propagation_delay = args.consent_delay
+    results: Dict[str, Dict[str, Any]] = {}
+    with MockBankProcess([DEGRADED_BANK]) as mock:
+        ctx = BenchmarkContext(mock, args.clients, args.bulk_clients, args.payments)
+        try:
+            await ctx.connect()
+            for name in args.scenario or list(SCENARIOS):
+                results[name] = await run_scenario(name, ctx)
+        finally:
+            await ctx.http.aclose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк агрегации projects_2")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="Сценарий для запуска (можно несколько раз); по умолчанию — все")
+    parser.add_argument("--clients", type=int, default=20, help="Клиентов на банк в sync-сценариях")
+    parser.add_argument("--bulk-clients", type=int, default=500, help="Клиентов на банк в bulk-сценарии")
+    parser.add_argument("--payments", type=int, default=100, help="Платежей в payment_burst")
+    parser.add_argument("--consent-delay", type=float, default=0.0,
+                        help="settings.consent_propagation_delay на время прогона")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Допустимое относительное ухудшение метрики (0.25 = 25%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Записать результаты как новый baseline")
+    parser.add_argument("--log-level", default="CRITICAL")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(PROJECT_DIR))
+    # BankService хранит согласия в файлах текущего каталога — изолируем прогон.
+    workdir = tempfile.mkdtemp(prefix="projects2-bench-")
+    os.chdir(workdir)
+
+    # Импорт main настраивает логирование на INFO, поэтому уровень выставляется после него.
+    import main  # noqa: F401
+    logging.getLogger().setLevel(args.log_level)
+    logger.setLevel(logging.WARNING)
+
+    results = asyncio.run(run(args))
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "clients_per_bank": args.clients,
+            "bulk_clients": args.bulk_clients,
+            "payments": args.payments,
+            "consent_delay": args.consent_delay,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "scenarios": results,
+    }
+    args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Результаты записаны в {args.output}")
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Baseline обновлён: {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"Baseline {args.baseline} не найден, сравнение пропущено.")
+        return
+
+    baseline_report = json.loads(args.baseline.read_text(encoding="utf-8"))
+    mismatch = workload_mismatch(report["meta"], baseline_report.get("meta", {}))
+    if mismatch:
+        print(f"Параметры прогона не совпадают с baseline {args.baseline}, сравнение пропущено:")
+        for line in mismatch:
+            print(f"  {line}")
+        return
+    regressions = compare_with_baseline(results, baseline_report["scenarios"], args.tolerance)
+    if regressions:
+        print("\n!!! РЕГРЕССИЯ ПРОИЗВОДИТЕЛЬНОСТИ !!!", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        sys.exit(1)
+    print("Регрессий относительно baseline не обнаружено.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Бенчмарк масштабирования projects_2 по числу процессов uvicorn.
+
+Для каждого значения --workers поднимает `uvicorn main:app --workers N`
+против локального mock-банка, прогревает общий кэш счетов одним запросом
+и затем нагружает CPU-bound эндпоинт POST /banks/accounts_bulk, который
+отвечает из кэша (валидация и сериализация pydantic без обращений к банку).
+
+Печатает throughput для каждого N и эффективность масштабирования
+throughput(N) / (N * throughput(1)). Близкая к 1.0 эффективность означает
+почти линейный рост; на машине с числом ядер меньше N роста не будет.
+
+Запуск (из каталога projects_2):
+    python -m benchmarks.scaling
+    python -m benchmarks.scaling --workers 1 --workers 2 --workers 4 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.run import BANKS, PROJECT_DIR, MockBankProcess, _free_port, percentile
+
+
+logger = logging.getLogger("benchmarks")
+
+
+class AppProcess:
+    """Приложение под `uvicorn --workers N` с изолированным рабочим каталогом и общим state.db."""
+
+    def __init__(self, workers: int, mock: MockBankProcess):
+        self.workers = workers
+        self.mock = mock
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.workdir = tempfile.mkdtemp(prefix=f"projects2-scaling-{workers}-")
+        self.process = None
+
+    def __enter__(self):
+        env = dict(os.environ)
+        env.update({
+            "PYTHONPATH": str(PROJECT_DIR),
+            "BANK_CONFIGS": json.dumps([self.mock.bank_config(bank_name) for bank_name in BANKS]),
+            "CONSENT_PROPAGATION_DELAY": "0",
+            "ACCOUNTS_CACHE_TTL": "3600",
+            "STATE_DB_PATH": str(Path(self.workdir) / "state.db"),
+            "JOBS_DB_PATH": str(Path(self.workdir) / "jobs.db"),
+            "DEBUG": "false",
+        })
+        cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(self.port),
+               "--workers", str(self.workers), "--log-level", "warning", "--no-access-log"]
+        self.process = subprocess.Popen(cmd, cwd=self.workdir, env=env,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.2):
+                    return self
+            except OSError:
+                time.sleep(0.1)
+        self.__exit__(None, None, None)
+        raise RuntimeError(f"Приложение с {self.workers} воркерами не запустилось за 30 секунд")
+
+    def __exit__(self, *exc):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+
+
+async def measure(app: AppProcess, clients: int, concurrency: int, duration: float) -> Dict[str, Any]:
+    body = [{"bank_name": bank_name, "client_ids": [f"scale-{i}" for i in range(1, clients + 1)]}
+            for bank_name in BANKS]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=app.base_url, timeout=60, limits=limits) as client:
+        # Прогрев: один процесс заполняет общий кэш, остальные читают его из state.db.
+        response = await client.post("/banks/accounts_bulk", json=body)
+        response.raise_for_status()
+
+        latencies: List[float] = []
+        errors = 0
+        stop_at = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/banks/accounts_bulk", json=body)
+                    response.raise_for_status()
+                except Exception as e:
+                    errors += 1
+                    logger.debug(f"Запрос завершился ошибкой: {e}")
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк масштабирования projects_2 по числу процессов")
+    parser.add_argument("--workers", type=int, action="append", help="Число процессов (можно несколько раз)")
+    parser.add_argument("--clients", type=int, default=20, help="Клиентов на банк в теле запроса")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность замера, сек")
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+    worker_counts = args.workers or [1, 2, 4]
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    cpu_count = os.cpu_count() or 1
+    if max(worker_counts) > cpu_count:
+        logger.warning(f"Доступно ядер: {cpu_count}; для N > {cpu_count} линейного роста не будет")
+
+    results: Dict[int, Dict[str, Any]] = {}
+    with MockBankProcess([]) as mock:
+        for workers in worker_counts:
+            with AppProcess(workers, mock) as app:
+                results[workers] = asyncio.run(measure(app, args.clients, args.concurrency, args.duration))
+
+    base = results.get(1) or results[worker_counts[0]]
+    base_workers = 1 if 1 in results else worker_counts[0]
+    for workers, result in results.items():
+        result["efficiency"] = round(
+            result["throughput_rps"] / (base["throughput_rps"] * workers / base_workers), 2) if base["throughput_rps"] else 0.0
+        logger.warning(
+            f"workers={workers}: {result['throughput_rps']} rps ({result['errors']} ошибок), "
+            f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms, эффективность={result['efficiency']}")
+
+    if args.output:
+        args.output.write_text(json.dumps({"cpu_count": cpu_count, "results": results}, ensure_ascii=False, indent=2),
+                               encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Скорость полнотекстового поиска транзакций (LocalStore.search_transactions, индекс FTS5).
+
+Заполняет временную базу LocalStore синтетическими транзакциями clients клиентов
+(описания и контрагенты из небольшого словаря, поэтому слова встречаются часто —
+неблагоприятный для индекса случай) и замеряет первую и пятую страницы выдачи
+одного клиента для нескольких запросов: по дате, по релевантности, с фильтрами
+и по началу слова. Заполнение идёт через UPSERT_TRANSACTION, как при синхронизации,
+так что индекс строится триггерами.
+
+Запуск (из каталога projects_2):
+    python -m benchmarks.search
+    python -m benchmarks.search --transactions 1000000 --clients 1000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.money import best_time_ms
+from benchmarks.run import PROJECT_DIR
+
+
+logger = logging.getLogger("benchmarks")
+
+
+WORDS = ["Оплата", "в", "магазине", "Пятерочка", "Перекресток", "такси", "Яндекс", "перевод", "кафе", "аптека",
+         "ozon", "wildberries", "ЖКХ", "мобильная", "связь", "заправка", "Лукойл", "кинотеатр", "подписка", "музыка"]
+
+QUERIES = [
+    {"text": "такси"},
+    {"text": "такси яндекс"},
+    {"text": "такси", "order": "relevance"},
+    {"text": "ozon", "amount_min": 10_000, "amount_max": 50_000},
+    {"text": "кафе", "bank_names": ["vbank"]},
+    {"text": "магаз*"},
+]
+
+
+def fill(store, count: int, clients: int, seed: int = 42):
+    rng = random.Random(seed)
+    conn = store._connect()
+    with conn:
+        conn.executemany(store.UPSERT_TRANSACTION, (
+            (rng.choice(("vbank", "abank", "sbank")), f"client-{client}", f"acc-{client}-{account}:tx-{i}",
+             f"acc-{client}-{account}", store.search_owner(f"client-{client}"),
+             1_600_000_000 + rng.randint(0, 100_000_000), rng.randint(-1_000_000, 1_000_000), "RUB", None,
+             f"{rng.choice(WORDS)} #{rng.randint(0, 50)}", " ".join(rng.choices(WORDS, k=4)))
+            for i, client, account in ((i, rng.randrange(clients), rng.randrange(4)) for i in range(count))))
+    conn.close()
+
+
+def measure(store, repeat: int) -> List[Dict[str, Any]]:
+    from services.transaction_search import TransactionSearch
+
+    search = TransactionSearch(store)
+    results = []
+    for query in QUERIES:
+        params = {key: value for key, value in query.items() if key != "text"}
+        cursors = [None]
+        for _ in range(4):
+            page = asyncio.run(search.search("client-7", query["text"], cursor=cursors[-1], **params))
+            cursors.append(page["cursor"] or cursors[-1])
+        results.append({
+            "query": query,
+            "first_page_ms": best_time_ms(lambda: asyncio.run(search.search("client-7", query["text"], **params)), repeat),
+            "fifth_page_ms": best_time_ms(
+                lambda: asyncio.run(search.search("client-7", query["text"], cursor=cursors[-1], **params)), repeat),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость поиска транзакций по индексу FTS5")
+    parser.add_argument("--transactions", type=int, default=200_000, help="Число транзакций в базе")
+    parser.add_argument("--clients", type=int, default=200, help="Число клиентов")
+    parser.add_argument("--repeat", type=int, default=5, help="Повторов каждого замера")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="projects2-search-") as data_dir:
+        os.environ["DATA_DIR"] = data_dir
+        sys.path.insert(0, str(PROJECT_DIR))
+        from services.local_store import LocalStore
+
+        store = LocalStore(os.path.join(data_dir, "search.db"))
+        started = time.perf_counter()
+        fill(store, args.transactions, args.clients)
+        logger.warning(f"{args.transactions} транзакций записано за {time.perf_counter() - started:.1f}s")
+        results = measure(store, args.repeat)
+    for result in results:
+        logger.warning(f"{json.dumps(result['query'], ensure_ascii=False):60} первая страница {result['first_page_ms']} ms, "
+                       f"пятая {result['fifth_page_ms']} ms")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    main()
@@ -5,6 +5,115 @@ class Settings(BaseSettings):
     app_name: str = "MultiBank Aggregator"
     debug: bool = True
 
+    # Задержка (сек) между выдачей согласия и первым запросом по нему:
+    # песочница банков применяет согласия не мгновенно.
+    consent_propagation_delay: float = 10.0
+
+    # Время жизни (сек) кэша счетов клиента в BankService; 0 — кэш отключён.
+    accounts_cache_ttl: float = 60.0
+
+    # Каталог файлов состояния (согласия, базы SQLite, снапшот); относительные пути ниже — от него.
+    data_dir: str = "."
+
+    # Фоновые задачи агрегации (/jobs): файл состояния и число параллельных воркеров.
+    jobs_db_path: str = "jobs.db"
+    job_workers: int = 8
+    # Через сколько секунд единица работы, взятая упавшим процессом, снова становится доступной.
+    job_claim_ttl: float = 120.0
+
+    # Число процессов uvicorn. Общее состояние процессов хранится в state_db_path (SQLite WAL).
+    workers: int = 1
+    state_db_path: str = "state.db"
+    # Как часто (сек) процесс перечитывает список подключений к банкам из общего хранилища.
+    connections_sync_interval: float = 1.0
+    # Лимит запросов в секунду к API одного банка, общий для всех процессов; 0 — без лимита.
+    bank_rate_limit: int = 0
+    # Пул соединений с API одного банка: максимум соединений и простаивающих keep-alive соединений,
+    # таймаут запроса и ожидания свободного соединения в пуле (сек).
+    bank_max_connections: int = 100
+    bank_max_keepalive_connections: int = 20
+    bank_request_timeout: float = 5.0
+    bank_pool_timeout: float = 30.0
+    # Сколько клиентов одного банка обрабатывается одновременно; остальные ждут очереди,
+    # а не соединения из пула.
+    bank_client_concurrency: int = 32
+
+    # Задержка (сек) фоновой записи изменённых согласий в файлы (write-behind).
+    consent_flush_delay: float = 1.0
+
+    # Сколько секунд при остановке ждать завершения задач и фоновых запросов к банкам.
+    shutdown_drain_timeout: float = 20.0
+
+    # Снапшот токенов и кэшей для быстрого прогретого перезапуска; интервал записи 0 — только при остановке.
+    snapshot_path: str = "cache_snapshot.json.gz"
+    snapshot_interval: float = 60.0
+
+    # Максимальное время (сек) прогрева банков при старте; /health/ready отвечает 503 до его окончания.
+    warmup_timeout: float = 10.0
+
+    # Последние успешно полученные счета для ответа при недоступном банке (source=cache).
+    local_store_path: str = "local_store.db"
+    # Отказов подряд до размыкания цепи банка и пауза (сек) до пробного запроса.
+    circuit_failure_threshold: int = 5
+    circuit_reset_timeout: float = 30.0
+
+    # Сжатие ответов gzip: ответы короче gzip_min_size байт не сжимаются.
+    gzip_min_size: int = 1000
+    gzip_level: int = 6
+
+    # Максимальное число подзапросов в POST /batch.
+    batch_max_requests: int = 20
+
+    # Idempotency-Key для /payments/execute: сколько хранить результат, на сколько
+    # блокировать ключ на время выполнения и сколько дубликат ждёт первую попытку.
+    idempotency_ttl: float = 86400.0
+    idempotency_lock_ttl: float = 120.0
+    idempotency_wait_timeout: float = 30.0
+
+    # POST /payments/bulk: максимум платежей в пакете и одновременных платежей на один банк.
+    bulk_payments_max: int = 1000
+    bulk_payments_per_bank: int = 4
+
+    # Отслеживание статусов платежей: файл состояния, первый и максимальный интервал опроса (сек),
+    # размер пачки за проход, одновременных опросов на банк и через сколько секунд бросить опрос.
+    payments_db_path: str = "payments.db"
+    payment_poll_initial: float = 1.0
+    payment_poll_max: float = 60.0
+    payment_poll_batch: int = 100
+    payment_poll_per_bank: int = 8
+    payment_poll_give_up: float = 86400.0
+
+    # Мониторинг задержки event loop (/health/loop): период замера (0 — выключен) и порог (сек),
+    # после которого шаг считается блокирующим. В режиме debug при блокировке в лог пишется стек.
+    loop_monitor_interval: float = 0.1
+    loop_stall_threshold: float = 0.1
+    loop_stack_dumps: bool = True
+
+    # Курсы валют для сводки по клиенту (/clients/{id}/summary): источник cbr (сеть, fx_url) или
+    # file (локальный JSON fx_rates_file), период обновления (сек) и валюта итога по умолчанию.
+    fx_source: str = "cbr"
+    fx_url: str = "https://www.cbr-xml-daily.ru/daily_json.js"
+    fx_rates_file: str = "fx_rates.json"
+    fx_refresh_interval: float = 3600.0
+    fx_base_currency: str = "RUB"
+
+    # Аналитика транзакций (/analytics): сколько клиентов держать в кэше колоночных массивов и отчётов.
+    analytics_cache_size: int = 128
+
+    # Токен административных эндпоинтов (заголовок X-Admin-Token); пустой — они отключены.
+    admin_token: str = ""
+    # Профилирование по запросу: каталог профилей, период замера стеков и максимальная длительность (сек).
+    profile_dir: str = "profiles"
+    profile_interval: float = 0.005
+    profile_max_seconds: float = 120.0
+
+    # Транспорт запросов к банкам: live — сеть, record — сеть с записью
+    # в кассеты, replay — ответы из кассет без обращения к сети.
+    bank_http_mode: str = "live"
+    cassette_dir: str = "cassettes"
+    # Задержки при воспроизведении: recorded — как при записи, zero — без задержек.
+    cassette_replay_latency: str = "recorded"
+
     bank_configs: List[Dict[str, str]] = [
         {
             "name": "vbank",
@@ -1,10 +1,30 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 import uvicorn
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 from api.banks import router as banks_router
 from api.payments import router as payments_router
+from api.jobs import router as jobs_router
+from api.health import router as health_router
+from api.batch import router as batch_router
+from api.admin import router as admin_router
+from api.clients import router as clients_router
+from api.analytics import router as analytics_router
 from config import settings
-from services.multi_bank_service import initialize_connections
+from services.multi_bank_service import initialize_connections, multi_bank_service
+from services.http_client import save_cassettes
+from services.job_manager import job_manager
+from services.bulk_payments import bulk_payment_executor
+from services.payment_tracker import payment_tracker
+from services.fx import fx_rates
+from services.state_store import state_store
+from services.readiness import readiness
+from services.deadline import Deadline
+from services.snapshot import snapshot_manager
+from services.loop_monitor import loop_monitor
+from services.profiler import profiler, ProfileRequestMiddleware
 
 
 logger = logging.getLogger(__name__)
@@ -12,16 +32,72 @@ logger = logging.getLogger(__name__)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-app = FastAPI(title=settings.app_name, debug=settings.debug)
+
+async def startup():
+    loop_monitor.start()
+    await asyncio.to_thread(state_store.purge_expired)
+    await initialize_connections()
+    logger.info("Подключения к банкам инициализированы.")
+    await snapshot_manager.restore()
+    snapshot_manager.start()
+    readiness.start(multi_bank_service, settings.warmup_timeout)
+    await job_manager.start()
+    payment_tracker.start()
+    fx_rates.start()
+
+
+async def shutdown():
+    """
+    Остановка в пределах settings.shutdown_drain_timeout: сначала перестаём принимать
+    трафик и новые задачи, дожидаемся начатой работы с банками, затем сбрасываем
+    на диск отложенные записи и снапшот кэшей и закрываем пулы соединений.
+    """
+    deadline = Deadline(settings.shutdown_drain_timeout)
+    readiness.draining = True
+    logger.info("Остановка: новые задачи не принимаются, ждём завершения начатой работы...")
+
+    await job_manager.stop(deadline.remaining())
+    await payment_tracker.stop()
+    await fx_rates.stop()
+    not_finished = await bulk_payment_executor.drain(deadline.remaining())
+    if not_finished:
+        logger.warning(f"Остановка: не дождались {not_finished} платежей из пакетов")
+    not_drained = await multi_bank_service.drain(deadline.remaining())
+    if not_drained:
+        logger.warning(f"Остановка: не дождались {not_drained} фоновых обработок клиентов")
+
+    await multi_bank_service.flush()
+    await snapshot_manager.stop()
+    await asyncio.to_thread(state_store.checkpoint)
+    await multi_bank_service.aclose()
+    save_cassettes()
+    await loop_monitor.stop()
+    logger.info(f"Остановка завершена за {settings.shutdown_drain_timeout - deadline.remaining():.2f}s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    yield
+    await shutdown()
+
+
+app = FastAPI(title=settings.app_name, debug=settings.debug, lifespan=lifespan)
+app.add_middleware(GZipMiddleware, minimum_size=settings.gzip_min_size, compresslevel=settings.gzip_level)
+app.add_middleware(ProfileRequestMiddleware, profiler=profiler)
 
 
 app.include_router(banks_router)
 app.include_router(payments_router)
-
-@app.on_event("startup")
-async def startup_event():
-    await initialize_connections()
-    logger.info("Подключения к банкам инициализированы.")
+app.include_router(jobs_router)
+app.include_router(health_router)
+app.include_router(batch_router)
+app.include_router(admin_router)
+app.include_router(clients_router)
+app.include_router(analytics_router)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=8000, log_level="info")
\ No newline at end of file
+    # Несколько процессов возможны только при запуске по строке импорта;
+    # состояние они делят через state_store.
+    uvicorn.run("main:app", host="127.0.0.1", port=8000, log_level="info", workers=settings.workers,
+                timeout_graceful_shutdown=int(settings.shutdown_drain_timeout))
\ No newline at end of file
@@ -1,10 +1,13 @@
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
+from utils.money import exponent, normalize_account
 
 class BalanceAmount(BaseModel):
     amount: str
     currency: str
+    # Сумма в минимальных единицах валюты (копейках), см. utils.money.normalize_account.
+    minor: Optional[int] = None
 
 class BalanceItem(BaseModel):
     accountId: str
@@ -16,6 +19,7 @@ class BalanceItem(BaseModel):
 class TransactionAmount(BaseModel):
     amount: str
     currency: str
+    minor: Optional[int] = None
 
 class TransactionItem(BaseModel):
     transactionId: str
@@ -33,6 +37,8 @@ class Account(BaseModel):
     id: str
     identification: Optional[str] = None
     balance: Optional[float] = None
+    # Текущий баланс в минимальных единицах валюты со знаком: для точных итогов и сортировки.
+    balance_minor: Optional[int] = None
     currency: str = "RUB"
     client_id: str
     bank_name: str
@@ -43,4 +49,38 @@ class Account(BaseModel):
     nickname: Optional[str] = None
     opening_date: Optional[str] = None
     balances: Optional[List[BalanceItem]] = None
-    transactions: Optional[List[TransactionItem]] = None
\ No newline at end of file
+    transactions: Optional[List[TransactionItem]] = None
+    # Момент получения данных от банка (ISO 8601, UTC) и их источник:
+    # live — ответ банка, cache — сохранённая копия, отданная при недоступном банке.
+    as_of: Optional[str] = None
+    source: Optional[str] = None
+
+    @classmethod
+    def from_raw_detail(cls, raw_detail: dict, client_id: str, bank_name: str) -> "Account":
+        """Строит Account из записи, которую возвращает BankService.get_all_account_details."""
+        if "balance_minor" not in raw_detail:
+            # Записи, сохранённые до нормализации сумм при получении.
+            normalize_account(raw_detail)
+        currency = raw_detail.get("currency") or raw_detail.get("balance_currency") or "RUB"
+        balance = raw_detail.get("balance")
+        if balance is None and raw_detail["balance_minor"] is not None:
+            balance = raw_detail["balance_minor"] / 10 ** exponent(raw_detail["balance_currency"])
+        return cls(
+            id=raw_detail.get("id", raw_detail.get("accountId", "unknown_id")),
+            identification=raw_detail.get("identification"),
+            balance=balance,
+            balance_minor=raw_detail["balance_minor"],
+            currency=currency,
+            client_id=client_id,
+            bank_name=bank_name,
+            status=raw_detail.get("status"),
+            account_type=raw_detail.get("accountType"),
+            account_sub_type=raw_detail.get("accountSubType"),
+            description=raw_detail.get("description"),
+            nickname=raw_detail.get("nickname"),
+            opening_date=raw_detail.get("openingDate"),
+            balances=raw_detail.get("balances"),
+            transactions=raw_detail.get("transactions"),
+            as_of=raw_detail.get("as_of"),
+            source=raw_detail.get("source")
+        )
@@ -0,0 +1,52 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+
+class MoneyAmount(BaseModel):
+    minor: int
+    amount: str
+
+
+class CashflowMonth(BaseModel):
+    month: str  # YYYY-MM
+    income: MoneyAmount
+    expense: MoneyAmount
+    net: MoneyAmount
+    # Чистый поток за последние window месяцев, включая этот.
+    rolling_net: MoneyAmount
+    transactions: int
+
+
+class CurrencyCashflow(BaseModel):
+    currency: str
+    months: List[CashflowMonth]
+    income_total: MoneyAmount
+    expense_total: MoneyAmount
+    # Перцентили месячных расходов: p50, p90.
+    monthly_expense_p50: MoneyAmount
+    monthly_expense_p90: MoneyAmount
+
+
+class CashflowReport(BaseModel):
+    client_id: str
+    window: int
+    transactions: int
+    currencies: List[CurrencyCashflow]
+
+
+class BreakdownItem(BaseModel):
+    currency: str
+    key: Optional[str] = None  # категория или контрагент; None — не указан банком
+    transactions: int
+    total: MoneyAmount
+    share: float  # доля от итога по валюте
+    median: MoneyAmount
+    p90: MoneyAmount
+
+
+class BreakdownReport(BaseModel):
+    client_id: str
+    by: str  # category | counterparty
+    direction: str  # expense | income
+    transactions: int
+    items: List[BreakdownItem]
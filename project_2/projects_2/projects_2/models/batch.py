@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+
+
+class BatchSubRequest(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str
+    params: Optional[Dict[str, Any]] = None
+    body: Optional[Any] = None
+    headers: Optional[Dict[str, str]] = None
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
+
+
+class BatchSubResult(BaseModel):
+    id: str
+    status: int
+    body: Optional[Any] = None
+    duration_ms: float
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchSubResult]
@@ -0,0 +1,28 @@
+from pydantic import BaseModel, Field
+from typing import Any, List, Optional
+
+
+class PaymentInstruction(BaseModel):
+    bank_name: str
+    client_id: str
+    consent_id: str
+    payment_data: dict
+    # Если не задан, ключ строится из batch_id и номера платежа в пакете.
+    idempotency_key: Optional[str] = Field(None, max_length=255)
+
+
+class BulkPaymentRequest(BaseModel):
+    # Повторная отправка пакета с тем же batch_id продолжает его: уже проведённые
+    # платежи возвращаются из хранилища идемпотентности, а не выполняются снова.
+    batch_id: Optional[str] = Field(None, max_length=128)
+    payments: List[PaymentInstruction]
+
+
+class BulkPaymentResult(BaseModel):
+    index: int
+    bank_name: str
+    client_id: str
+    idempotency_key: str
+    status: int
+    body: Optional[Any] = None
+    replayed: bool = False
@@ -1,6 +1,18 @@
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional
+from models.account import Account
 
 class BankAccountRequest(BaseModel):
     bank_name: str
-    client_ids: List[str]
\ No newline at end of file
+    client_ids: List[str]
+
+
+class BankCompleteness(BaseModel):
+    complete: bool
+    clients: Dict[str, bool]
+
+
+class PartialBulkAccountsResponse(BaseModel):
+    complete: bool
+    results: Dict[str, Optional[Dict[str, List[Account]]]]
+    completeness: Dict[str, BankCompleteness]
@@ -0,0 +1,39 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from models.account import Account
+from models.bulk_request import BankAccountRequest
+
+
+class AggregateJobRequest(BaseModel):
+    bank_requests: List[BankAccountRequest]
+
+
+class JobProgress(BaseModel):
+    total: int
+    done: int
+    failed: int
+
+
+class JobResultItem(BaseModel):
+    seq: int
+    bank_name: str
+    client_id: str
+    status: str
+    accounts: Optional[List[Account]] = None
+    error: Optional[str] = None
+
+
+class JobResultsPage(BaseModel):
+    job_id: str
+    items: List[JobResultItem]
+    next_cursor: Optional[int] = None
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    progress: JobProgress
+    created_at: float
+    updated_at: float
+    error: Optional[str] = None
+    results: Optional[JobResultsPage] = None
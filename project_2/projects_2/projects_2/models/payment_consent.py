@@ -91,6 +91,6 @@ class PaymentRequestData(BaseModel):
 
 
 class PaymentStatusResponse(BaseModel):
-    dict
+    data: dict
     links: dict
     meta: dict
@@ -0,0 +1,32 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+
+
+class CurrencyTotal(BaseModel):
+    currency: str
+    minor: int
+    amount: str
+    accounts: int
+
+
+class BankSummary(BaseModel):
+    bank_name: str
+    totals: List[CurrencyTotal]
+    synced_at: Optional[float] = None
+
+
+class ConvertedTotal(BaseModel):
+    currency: str
+    # Без курса хотя бы одной из валют итог не считается: minor и amount — null.
+    minor: Optional[int] = None
+    amount: Optional[str] = None
+    # Валюты, для которых нет курса.
+    missing_rates: List[str] = []
+
+
+class ClientSummary(BaseModel):
+    client_id: str
+    banks: List[BankSummary]
+    totals: List[CurrencyTotal]
+    converted: Optional[ConvertedTotal] = None
+    fx: Dict[str, Any]
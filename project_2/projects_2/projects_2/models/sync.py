@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+
+
+class ChangeItem(BaseModel):
+    bank_name: str
+    client_id: str
+    kind: str  # account | balance | transaction
+    id: str
+    op: str  # upsert | delete
+    data: Optional[Dict[str, Any]] = None
+    changed_at: float
+
+
+class ChangesPage(BaseModel):
+    changes: List[ChangeItem]
+    cursor: str
+    has_more: bool
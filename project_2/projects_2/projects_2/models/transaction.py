@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class Transaction(BaseModel):
     id: str
@@ -9,4 +9,28 @@ class Transaction(BaseModel):
     currency: str = "RUB"
     description: str
     date: datetime
-    type: str
\ No newline at end of file
+    type: str
+
+class SearchHitAmount(BaseModel):
+    minor: int  # со знаком: списание отрицательное
+    amount: str
+
+
+class TransactionSearchHit(BaseModel):
+    bank_name: str
+    account_id: str
+    transaction_id: str
+    booked_at: Optional[datetime] = None
+    amount: SearchHitAmount
+    currency: str
+    description: Optional[str] = None
+    counterparty: Optional[str] = None
+    category: Optional[str] = None
+    # Фрагмент совпадения, найденные слова в [скобках].
+    snippet: Optional[str] = None
+
+
+class TransactionSearchPage(BaseModel):
+    items: List[TransactionSearchHit]
+    # Курсор следующей страницы; None — страниц больше нет.
+    cursor: Optional[str] = None
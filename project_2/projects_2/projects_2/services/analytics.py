@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Any, Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from services.local_store import LocalStore, local_store
+from utils.money import format_minor
+
+
+logger = logging.getLogger(__name__)
+
+
+BREAKDOWN_FIELDS = ("category", "counterparty")
+DIRECTIONS = ("expense", "income")
+
+
+class TransactionColumns(NamedTuple):
+    """
+    Транзакции клиента в колоночном виде: по массиву на поле вместо списка словарей.
+    Строковые поля закодированы целыми кодами, расшифровка — в списках меток.
+    """
+    booked_at: np.ndarray  # datetime64[s]
+    amount: np.ndarray  # int64, минимальные единицы со знаком (расход < 0)
+    currency: np.ndarray  # int32, индекс в currencies
+    category: np.ndarray  # int32, индекс в categories
+    counterparty: np.ndarray  # int32, индекс в counterparties
+    currencies: List[str]
+    categories: List[Optional[str]]
+    counterparties: List[Optional[str]]
+
+    @property
+    def count(self) -> int:
+        return len(self.amount)
+
+    def select(self, mask: np.ndarray) -> "TransactionColumns":
+        return self._replace(booked_at=self.booked_at[mask], amount=self.amount[mask], currency=self.currency[mask],
+                             category=self.category[mask], counterparty=self.counterparty[mask])
+
+
+def _encode(values: Iterable[Hashable], count: int) -> Tuple[np.ndarray, List[Any]]:
+    """Кодирует значения целыми кодами в порядке первого появления: (коды, метки)."""
+    labels: Dict[Any, int] = {}
+    codes = np.fromiter((labels.setdefault(value, len(labels)) for value in values), dtype=np.int32, count=count)
+    return codes, list(labels)
+
+
+def to_columns(rows: List[Tuple[Any, ...]]) -> TransactionColumns:
+    """Строки (booked_at, amount_minor, currency, category, counterparty) -> TransactionColumns."""
+    count = len(rows)
+    booked_at, amount, currency, category, counterparty = zip(*rows) if rows else ((),) * 5
+    currency_codes, currencies = _encode(currency, count)
+    category_codes, categories = _encode(category, count)
+    counterparty_codes, counterparties = _encode(counterparty, count)
+    return TransactionColumns(
+        booked_at=np.fromiter(booked_at, dtype=np.int64, count=count).astype("datetime64[s]"),
+        amount=np.fromiter(amount, dtype=np.int64, count=count),
+        currency=currency_codes, category=category_codes, counterparty=counterparty_codes,
+        currencies=currencies, categories=categories, counterparties=counterparties)
+
+
+def _group_sum(keys: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    """Точные суммы int64 по ключам 0..size-1 (bincount с весами считает во float64 и теряет копейки)."""
+    totals = np.zeros(size, dtype=np.int64)
+    np.add.at(totals, keys, values)
+    return totals
+
+
+def _group_percentiles(keys: np.ndarray, values: np.ndarray, size: int, quantiles: List[float]) -> np.ndarray:
+    """
+    Перцентили values внутри каждой группы за одну сортировку: массив (len(quantiles), size),
+    линейная интерполяция как в np.percentile; для пустых групп — 0.
+    """
+    order = np.lexsort((values, keys))
+    sorted_values = values[order]
+    counts = np.bincount(keys, minlength=size)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    result = np.zeros((len(quantiles), size))
+    present = counts > 0
+    for i, q in enumerate(quantiles):
+        position = starts[present] + (counts[present] - 1) * q
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        result[i, present] = sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+    return result
+
+
+def _money(minor: Any, currency: str) -> Dict[str, Any]:
+    minor = int(round(minor))
+    return {"minor": minor, "amount": format_minor(minor, currency)}
+
+
+def filter_period(columns: TransactionColumns, date_from: Optional[date], date_to: Optional[date]) -> TransactionColumns:
+    """Транзакции с date_from по date_to включительно (UTC)."""
+    mask = np.ones(columns.count, dtype=bool)
+    if date_from is not None:
+        mask &= columns.booked_at >= np.datetime64(date_from, "s")
+    if date_to is not None:
+        mask &= columns.booked_at < np.datetime64(date_to + timedelta(days=1), "s")
+    return columns if mask.all() else columns.select(mask)
+
+
+def cashflow(columns: TransactionColumns, window: int) -> List[Dict[str, Any]]:
+    """
+    Помесячные доходы, расходы и чистый поток по валютам на сплошной сетке месяцев
+    (месяцы без операций — нули), скользящая сумма чистого потока за window месяцев
+    и перцентили месячных расходов.
+    """
+    if not columns.count:
+        return []
+    months = columns.booked_at.astype("datetime64[M]")
+    first_month = months.min()
+    month_index = (months - first_month).astype(np.int64)
+    month_count = int(month_index.max()) + 1
+    currency_count = len(columns.currencies)
+
+    keys = columns.currency.astype(np.int64) * month_count + month_index
+    size = currency_count * month_count
+    income = _group_sum(keys, np.maximum(columns.amount, 0), size).reshape(currency_count, month_count)
+    expense = _group_sum(keys, np.maximum(-columns.amount, 0), size).reshape(currency_count, month_count)
+    counts = np.bincount(keys, minlength=size).reshape(currency_count, month_count)
+    net = income - expense
+    cumulative = np.concatenate((np.zeros((currency_count, 1), dtype=np.int64), np.cumsum(net, axis=1)), axis=1)
+    rolling_net = cumulative[:, 1:] - cumulative[:, np.maximum(np.arange(month_count) + 1 - window, 0)]
+    expense_p50, expense_p90 = np.percentile(expense, [50, 90], axis=1)
+    labels = np.datetime_as_string(first_month + np.arange(month_count), unit="M")
+
+    report = []
+    for c, currency in enumerate(columns.currencies):
+        report.append({
+            "currency": currency,
+            "months": [{
+                "month": str(labels[m]),
+                "income": _money(income[c, m], currency),
+                "expense": _money(expense[c, m], currency),
+                "net": _money(net[c, m], currency),
+                "rolling_net": _money(rolling_net[c, m], currency),
+                "transactions": int(counts[c, m]),
+            } for m in range(month_count)],
+            "income_total": _money(income[c].sum(), currency),
+            "expense_total": _money(expense[c].sum(), currency),
+            "monthly_expense_p50": _money(expense_p50[c], currency),
+            "monthly_expense_p90": _money(expense_p90[c], currency),
+        })
+    return report
+
+
+def breakdown(columns: TransactionColumns, by: str, direction: str, limit: int) -> List[Dict[str, Any]]:
+    """
+    Итоги по категориям или контрагентам в разрезе валют: число операций, сумма, доля
+    от итога по валюте, медиана и p90 суммы операции. По каждой валюте — limit крупнейших.
+    """
+    mask = columns.amount < 0 if direction == "expense" else columns.amount > 0
+    columns = columns.select(mask)
+    if not columns.count:
+        return []
+    codes, labels = (columns.category, columns.categories) if by == "category" else (columns.counterparty, columns.counterparties)
+    amounts = np.abs(columns.amount)
+    label_count = len(labels)
+    keys = columns.currency.astype(np.int64) * label_count + codes
+    size = len(columns.currencies) * label_count
+    totals = _group_sum(keys, amounts, size).reshape(-1, label_count)
+    counts = np.bincount(keys, minlength=size).reshape(-1, label_count)
+    median, p90 = _group_percentiles(keys, amounts, size, [0.5, 0.9]).reshape(2, -1, label_count)
+    currency_totals = totals.sum(axis=1)
+
+    items = []
+    for c, currency in enumerate(columns.currencies):
+        top = np.argsort(-totals[c], kind="stable")[:limit]
+        for k in top[counts[c, top] > 0]:
+            items.append({
+                "currency": currency,
+                "key": labels[k],
+                "transactions": int(counts[c, k]),
+                "total": _money(totals[c, k], currency),
+                "share": round(float(totals[c, k] / currency_totals[c]), 4) if currency_totals[c] else 0.0,
+                "median": _money(median[c, k], currency),
+                "p90": _money(p90[c, k], currency),
+            })
+    return items
+
+
+class SpendingAnalytics:
+    """
+    Аналитика по транзакциям клиента из локального хранилища. Транзакции загружаются
+    в колоночные массивы NumPy, отчёты считаются векторно. Массивы и готовые отчёты
+    кэшируются по водяному знаку синхронизации: кэш сбрасывается сам, как только
+    синхронизация изменила транзакции клиента, и не зависит от времени.
+    """
+
+    def __init__(self, store: LocalStore, cache_size: int):
+        self.store = store
+        self.cache_size = cache_size
+        # (client_id, банки) -> (водяной знак, колонки, {параметры отчёта: отчёт})
+        self._cache: "OrderedDict[Tuple[str, Tuple[str, ...]], Tuple[Any, TransactionColumns, Dict[Hashable, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, client_id: str, bank_names: List[str]) -> Tuple[TransactionColumns, Dict[Hashable, Any]]:
+        key = (client_id, tuple(sorted(bank_names)))
+        watermark = self.store.transactions_watermark(client_id, list(key[1]))
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] == watermark:
+                self._cache.move_to_end(key)
+                return entry[1], entry[2]
+        started = time.perf_counter()
+        columns = to_columns(self.store.client_transactions(client_id, list(key[1])))
+        logger.info(f"Аналитика: {columns.count} транзакций клиента {client_id} загружено "
+                    f"за {time.perf_counter() - started:.3f}s")
+        reports: Dict[Hashable, Any] = {}
+        with self._lock:
+            self._cache[key] = (watermark, columns, reports)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return columns, reports
+
+    def _report(self, client_id: str, bank_names: List[str], params: Tuple, build) -> Any:
+        columns, reports = self._entry(client_id, bank_names)
+        report = reports.get(params)
+        if report is None:
+            report = reports[params] = build(columns)
+        return report
+
+    async def cashflow(self, client_id: str, bank_names: List[str], date_from: Optional[date] = None,
+                       date_to: Optional[date] = None, window: int = 3) -> Tuple[int, List[Dict[str, Any]]]:
+        """(число транзакций за период, помесячный отчёт по валютам)."""
+        def build(columns):
+            period = filter_period(columns, date_from, date_to)
+            return period.count, cashflow(period, window)
+        return await asyncio.to_thread(self._report, client_id, bank_names,
+                                       ("cashflow", date_from, date_to, window), build)
+
+    async def breakdown(self, client_id: str, bank_names: List[str], by: str, direction: str = "expense",
+                        limit: int = 20, date_from: Optional[date] = None,
+                        date_to: Optional[date] = None) -> Tuple[int, List[Dict[str, Any]]]:
+        """(число транзакций за период, итоги по категориям или контрагентам)."""
+        if by not in BREAKDOWN_FIELDS or direction not in DIRECTIONS:
+            raise ValueError(f"Неизвестный разрез {by}/{direction}")
+        def build(columns):
+            period = filter_period(columns, date_from, date_to)
+            return period.count, breakdown(period, by, direction, limit)
+        return await asyncio.to_thread(self._report, client_id, bank_names,
+                                       ("breakdown", by, direction, limit, date_from, date_to), build)
+
+
+spending_analytics = SpendingAnalytics(local_store, settings.analytics_cache_size)
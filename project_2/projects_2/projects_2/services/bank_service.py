@@ -1,10 +1,24 @@
 import httpx
 import asyncio
 import json
+import os
 import time
-from typing import Dict, List, Any, Optional, Union
+import uuid
+from datetime import datetime, timezone
+from contextlib import asynccontextmanager
+from typing import Dict, List, Any, Optional, Set, Tuple, Union
 from auth.bank_auth import BankAuthClient
 from config import settings
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.http_client import create_bank_client
+from services.local_store import LocalStore
+from services.payment_consent_pool import PaymentConsentPool, payment_terms
+from services.payment_store import PaymentStatusStore
+from services.deadline import Deadline, DeadlineExceeded, deadline_scope, sleep_within_deadline
+from services.state_store import StateStore
+from utils.encoding import json_loads
+from utils.money import normalize_account
+from utils.paths import data_path
 import logging
 
 
@@ -31,32 +45,193 @@ class BankAPIError(Exception):
     pass
 
 
+class PaymentOutcomeUnknownError(BankAPIError):
+    """Запрос платежа дошёл до банка, но ответа нет: платёж мог быть выполнен, повторять его нельзя."""
+
+
 class BankService:
+    # Сколько секунд ждать токен, который получает другой процесс, прежде чем запросить свой.
+    SHARED_TOKEN_WAIT = 10.0
+    # Запас до истечения токена, чтобы не использовать его на грани срока действия.
+    TOKEN_EXPIRY_MARGIN = 60
+
     def __init__(self, bank_config: Dict[str, str]):
         self.auth_client = BankAuthClient(
             base_url=bank_config['api_base_url'],
             client_id=bank_config['client_id'],
-            client_secret=bank_config['client_secret']
+            client_secret=bank_config['client_secret'],
+            bank_name=bank_config['name']
         )
         self.token: Optional[str] = None
+        self.token_expires_at: Optional[float] = None
         self.bank_name = bank_config['name']
-        self.consent_ids: Dict[str, str] = self._load_consents()
-        self.payment_consent_ids: Dict[str, str] = self._load_payment_consents()
+        # Общее хранилище воркеров: через него процессы делят токен, согласия и кэш счетов.
+        # Назначается MultiBankService; сервисы, созданные напрямую, работают только с памятью процесса.
+        self.state_store: Optional[StateStore] = None
+        # Последние успешно полученные счета; из них отвечаем, если банк недоступен.
+        # Назначается MultiBankService, как и state_store.
+        self.local_store: Optional[LocalStore] = None
+        # Созданные платежи, статус которых опрашивает PaymentStatusTracker. Назначается MultiBankService.
+        self.payment_store: Optional[PaymentStatusStore] = None
+        # Многоразовые и VRP-согласия с лимитами: повторно используются вместо запроса нового.
+        # Назначается MultiBankService.
+        self.payment_consent_pool: Optional[PaymentConsentPool] = None
+        # Размыкается после серии отказов банка: запросы отклоняются сразу, без повторных попыток.
+        self.circuit = CircuitBreaker(self.bank_name, settings.circuit_failure_threshold,
+                                      settings.circuit_reset_timeout)
+        # Файлы согласий читаются при первом обращении к ним (см. _ensure_consents_loaded),
+        # а не в конструкторе, чтобы создание сервиса не блокировало event loop.
+        self.consent_ids: Dict[str, str] = {}
+        self.payment_consent_ids: Dict[str, str] = {}
+        self._consents_loaded = False
+        self._consents_lock = asyncio.Lock()
+        # Write-behind: изменения согласий копятся в памяти и пишутся в файлы
+        # одной фоновой записью через settings.consent_flush_delay секунд (и при остановке).
+        self._dirty_files: Dict[str, bool] = {"consents": False, "payment_consents": False}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._auth_lock = asyncio.Lock()
+        # Пул соединений с API банка, общий для всех запросов сервиса.
+        self._http: Optional[httpx.AsyncClient] = None
+        # client_id -> (момент получения, счета). Заполняется и фоновыми задачами,
+        # продолжающими работу после истечения дедлайна запроса.
+        self.accounts_cache: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+        # client_id -> время (time.time()) последней успешной синхронизации счетов клиента.
+        self.sync_watermarks: Dict[str, float] = {}
+        self._inflight_clients: Dict[str, asyncio.Task] = {}
+        # Задачи клиентов под дедлайном запроса (см. _client_task); при остановке их тоже ждём.
+        self._deadline_tasks: Set[asyncio.Task] = set()
+        # Ограничивает число клиентов, которые одновременно запрашиваются в банке: при массовых
+        # запросах лишние ждут здесь, а не истекают по таймауту ожидания соединения из пула.
+        self._client_slots = asyncio.Semaphore(settings.bank_client_concurrency)
+
+    async def reconfigure(self, bank_config: Dict[str, str], reset_shared: bool = True):
+        """
+        Применяет новую конфигурацию подключения без пересоздания сервиса.
+        Пул соединений сохраняется всегда; токен сбрасывается только при смене
+        адреса или учётных данных, кэш счетов — только при смене адреса или client_id.
+        reset_shared=False — сбросить лишь состояние процесса (изменение пришло от другого воркера).
+        """
+        auth = self.auth_client
+        new_backend = (bank_config['api_base_url'], bank_config['client_id'])
+        backend_changed = (auth.base_url, auth.client_id) != new_backend
+        credentials_changed = backend_changed or auth.client_secret != bank_config['client_secret']
+
+        auth.base_url, auth.client_id = new_backend
+        auth.client_secret = bank_config['client_secret']
+
+        if credentials_changed:
+            self.token = None
+            self.token_expires_at = None
+            if reset_shared and self.state_store:
+                await asyncio.to_thread(self.state_store.delete, "tokens", self.bank_name)
+        if backend_changed:
+            self.accounts_cache.clear()
+            if reset_shared and self.state_store:
+                await asyncio.to_thread(self.state_store.clear, f"accounts:{self.bank_name}")
+            if reset_shared and self.local_store:
+                await asyncio.to_thread(self.local_store.clear_bank, self.bank_name)
+        logger.info(f"[{self.bank_name}] Конфигурация обновлена: токен {'сброшен' if credentials_changed else 'сохранён'}, "
+                    f"кэш {'сброшен' if backend_changed else 'сохранён'}")
+
+    @asynccontextmanager
+    async def _http_client(self):
+        """Отдаёт пул соединений сервиса, создавая его при первом запросе. Пул не закрывается после запроса."""
+        if self._http is None or self._http.is_closed:
+            self._http = create_bank_client(self.bank_name, self.circuit)
+        yield self._http
+
+    async def drain(self, timeout: float) -> int:
+        """
+        Ждёт завершения фоновых обработок клиентов не дольше timeout.
+        Возвращает число обработок, не успевших завершиться.
+        """
+        tasks = [task for task in [*self._inflight_clients.values(), *self._deadline_tasks] if not task.done()]
+        if not tasks:
+            return 0
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        return len(pending)
+
+    async def aclose(self):
+        """Закрывает пул соединений сервиса."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def warm_up(self):
+        """
+        Готовит сервис к первым запросам: получает токен (открывая пул соединений с банком),
+        загружает согласия и переносит общий кэш счетов в память процесса.
+        """
+        await asyncio.gather(self.authenticate(), self._ensure_consents_loaded(), self._load_shared_accounts_cache())
+        logger.info(f"[{self.bank_name}] Прогрев завершён: согласий {len(self.consent_ids)}, "
+                    f"клиентов в кэше {len(self.accounts_cache)}")
+
+    async def _load_shared_accounts_cache(self):
+        if not self.state_store or settings.accounts_cache_ttl <= 0:
+            return
+        cached_clients = await asyncio.to_thread(self.state_store.items, f"accounts:{self.bank_name}")
+        now = time.time()
+        for client_id, cached in cached_clients.items():
+            age = max(0.0, now - cached["fetched_at"])
+            self.accounts_cache.setdefault(client_id, (time.monotonic() - age, cached["accounts"]))
+
+    def export_state(self) -> Dict[str, Any]:
+        """
+        Состояние сервиса для снапшота: действующий токен, кэш счетов и метки синхронизации.
+        Время в снапшоте — по часам time.time(), так как monotonic не переживает перезапуск.
+        """
+        now, now_monotonic = time.time(), time.monotonic()
+        token = None
+        if self.token and self.token_expires_at and self.token_expires_at > now:
+            token = {"access_token": self.token, "expires_at": self.token_expires_at}
+        accounts = {}
+        if settings.accounts_cache_ttl > 0:
+            for client_id, (fetched_at, client_accounts) in self.accounts_cache.items():
+                if now_monotonic - fetched_at <= settings.accounts_cache_ttl:
+                    accounts[client_id] = {"fetched_at": now - (now_monotonic - fetched_at), "accounts": client_accounts}
+        return {"token": token, "accounts": accounts, "watermarks": dict(self.sync_watermarks)}
+
+    def import_state(self, state: Dict[str, Any]):
+        """Восстанавливает состояние из снапшота, пропуская истёкшие токен и записи кэша."""
+        now, now_monotonic = time.time(), time.monotonic()
+        token = state.get("token")
+        if token and not self.token and token["expires_at"] > now:
+            self.token, self.token_expires_at = token["access_token"], token["expires_at"]
+        for client_id, cached in state.get("accounts", {}).items():
+            age = max(0.0, now - cached["fetched_at"])
+            if age <= settings.accounts_cache_ttl:
+                self.accounts_cache.setdefault(client_id, (now_monotonic - age, cached["accounts"]))
+        for client_id, synced_at in state.get("watermarks", {}).items():
+            self.sync_watermarks[client_id] = max(synced_at, self.sync_watermarks.get(client_id, 0.0))
+
+    async def _ensure_consents_loaded(self):
+        """Загружает файлы согласий в фоновом потоке при первом обращении."""
+        if self._consents_loaded:
+            return
+        async with self._consents_lock:
+            if self._consents_loaded:
+                return
+            consent_ids, payment_consent_ids = await asyncio.gather(
+                asyncio.to_thread(self._load_consents), asyncio.to_thread(self._load_payment_consents))
+            # Записи, появившиеся в памяти до окончания загрузки, новее файла.
+            self.consent_ids = {**consent_ids, **self.consent_ids}
+            self.payment_consent_ids = {**payment_consent_ids, **self.payment_consent_ids}
+            self._consents_loaded = True
 
     def _get_consent_filename(self):
         """Возвращает имя файла для consent_ids, уникальное для банка."""
-        return f"consents_{self.bank_name}.json"
+        return str(data_path(f"consents_{self.bank_name}.json"))
 
     def _get_payment_consent_filename(self):
         """Возвращает имя файла для payment_consent_ids, уникальное для банка."""
-        return f"payment_consents_{self.bank_name}.json"
+        return str(data_path(f"payment_consents_{self.bank_name}.json"))
 
     def _load_consents(self) -> Dict[str, str]:
         """Загружает сохранённые consent_id из файла."""
         filename = self._get_consent_filename()
         try:
-            with open(filename, "r", encoding="utf-8") as f:
-                return json.load(f)
+            with open(filename, "rb") as f:
+                return json_loads(f.read())
         except FileNotFoundError:
             logger.info(f"Файл {filename} не найден, создаём пустой словарь.")
             return {}
@@ -65,25 +240,25 @@ class BankService:
             return {}
 
     def _save_consents(self):
-        """Сохраняет текущие consent_id в файл."""
-        filename = self._get_consent_filename()
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(self.consent_ids, f, ensure_ascii=False, indent=2)
-        logger.info(f"Consents сохранены в {filename}")
+        """Помечает consent_id для сохранения в файл (запись выполняется в фоне)."""
+        self._dirty_files["consents"] = True
+        self._schedule_flush()
 
-    def _remove_consent(self, client_id: str):
+    async def _remove_consent(self, client_id: str):
         """Удаляет consent_id для клиента из кэша и файла."""
         if client_id in self.consent_ids:
             consent_id = self.consent_ids.pop(client_id)
             self._save_consents()
+            if self.state_store:
+                await asyncio.to_thread(self.state_store.delete, f"consents:{self.bank_name}", client_id)
             logger.info(f"Consent ID {consent_id} для {client_id} удалён из кэша и файла.")
 
     def _load_payment_consents(self) -> Dict[str, str]:
         """Загружает сохранённые payment consent_id из файла."""
         filename = self._get_payment_consent_filename()
         try:
-            with open(filename, "r", encoding="utf-8") as f:
-                return json.load(f)
+            with open(filename, "rb") as f:
+                return json_loads(f.read())
         except FileNotFoundError:
             logger.info(f"Файл {filename} не найден, создаём пустой словарь.")
             return {}
@@ -92,24 +267,131 @@ class BankService:
             return {}
 
     def _save_payment_consents(self):
-        """Сохраняет текущие payment consent_id в файл."""
-        filename = self._get_payment_consent_filename()
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(self.payment_consent_ids, f, ensure_ascii=False, indent=2)
-        logger.info(f"Payment consents сохранены в {filename}")
+        """Помечает payment consent_id для сохранения в файл (запись выполняется в фоне)."""
+        self._dirty_files["payment_consents"] = True
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+        except RuntimeError:
+            # Вне event loop записываем сразу.
+            for filename, data in self._take_dirty_files():
+                self._write_json_file(filename, data)
+
+    async def _flush_later(self):
+        while True:
+            await asyncio.sleep(settings.consent_flush_delay)
+            await self.flush()
+            if not any(self._dirty_files.values()):
+                return
+
+    def _take_dirty_files(self) -> List[Tuple[str, Dict[str, str]]]:
+        """Снимает флаги изменений и возвращает копии словарей для записи."""
+        writes = []
+        if self._dirty_files["consents"]:
+            writes.append((self._get_consent_filename(), dict(self.consent_ids)))
+        if self._dirty_files["payment_consents"]:
+            writes.append((self._get_payment_consent_filename(), dict(self.payment_consent_ids)))
+        self._dirty_files = {name: False for name in self._dirty_files}
+        return writes
+
+    @staticmethod
+    def _write_json_file(filename: str, data: Dict[str, str]):
+        """Атомарно записывает JSON: через временный файл и os.replace."""
+        tmp_filename = f"{filename}.tmp"
+        with open(tmp_filename, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_filename, filename)
+        logger.info(f"Согласия сохранены в {filename}")
+
+    async def flush(self):
+        """Записывает накопленные изменения согласий на диск."""
+        for filename, data in self._take_dirty_files():
+            try:
+                await asyncio.to_thread(self._write_json_file, filename, data)
+            except Exception as e:
+                logger.error(f"[{self.bank_name}] Ошибка сохранения {filename}: {e}")
+                key = "consents" if filename == self._get_consent_filename() else "payment_consents"
+                self._dirty_files[key] = True
 
-    def _remove_payment_consent(self, consent_id: str):
+    async def _remove_payment_consent(self, consent_id: str):
         """Удаляет payment consent_id из кэша и файла."""
         if consent_id in self.payment_consent_ids:
             removed_id = self.payment_consent_ids.pop(consent_id)
             self._save_payment_consents()
             logger.info(f"Payment Consent ID {removed_id} удалён из кэша и файла.")
+        if self.payment_consent_pool:
+            await asyncio.to_thread(self.payment_consent_pool.revoke, consent_id)
+
+    def _token_valid(self) -> bool:
+        return bool(self.token) and self.token_expires_at is not None and self.token_expires_at > time.time()
 
     async def authenticate(self):
-        """Аутентифицируется и получает токен"""
-        if not self.token:
-            self.token = await self.auth_client.get_token()
-            logger.info("Токен получен")
+        """Получает токен, если его нет или срок его действия истёк (с учётом TOKEN_EXPIRY_MARGIN)."""
+        if self._token_valid():
+            return
+        async with self._auth_lock:
+            if not self._token_valid():
+                if self.state_store:
+                    self.token, self.token_expires_at = await self._get_shared_token()
+                else:
+                    self.token, self.token_expires_at = await self._request_token()
+                logger.info("Токен получен")
+
+    async def _refresh_rejected_token(self, headers: Dict[str, str]):
+        """
+        Банк ответил 401: токен из headers больше не действует. Сбрасывает его (если другой
+        запрос ещё не получил новый), получает новый и подставляет в headers для повтора.
+        Согласия клиента при этом не трогаются — 401 относится к токену, а не к согласию.
+        """
+        rejected = headers["Authorization"].removeprefix("Bearer ")
+        async with self._auth_lock:
+            if self.token == rejected:
+                logger.warning(f"[{self.bank_name}] Банк отклонил токен, запрашиваем новый")
+                self.token = None
+                self.token_expires_at = None
+                if self.state_store:
+                    shared = await asyncio.to_thread(self.state_store.get, "tokens", self.bank_name)
+                    if shared and shared["access_token"] == rejected:
+                        await asyncio.to_thread(self.state_store.delete, "tokens", self.bank_name)
+        await self.authenticate()
+        headers["Authorization"] = f"Bearer {self.token}"
+
+    async def _request_token(self) -> Tuple[str, float]:
+        """Запрашивает токен у банка; возвращает (токен, момент истечения с учётом запаса)."""
+        async with self._http_client() as client:
+            token_response = await self.auth_client.get_token_response(client)
+        return token_response.access_token, time.time() + token_response.expires_in - self.TOKEN_EXPIRY_MARGIN
+
+    async def _get_shared_token(self) -> Tuple[str, float]:
+        """
+        Берёт токен банка из общего хранилища. Если его там нет, токен запрашивает
+        только процесс, взявший аренду; остальные ждут, пока он появится в хранилище.
+        """
+        lease_name = f"token:{self.bank_name}"
+        waited = 0.0
+        while True:
+            token = await asyncio.to_thread(self.state_store.get, "tokens", self.bank_name)
+            if token and token["expires_at"] > time.time():
+                return token["access_token"], token["expires_at"]
+            if await asyncio.to_thread(self.state_store.acquire_lease, lease_name, self.SHARED_TOKEN_WAIT):
+                break
+            if waited >= self.SHARED_TOKEN_WAIT:
+                logger.warning(f"[{self.bank_name}] Не дождались токена от другого процесса, запрашиваем свой")
+                return await self._request_token()
+            await asyncio.sleep(0.1)
+            waited += 0.1
+
+        try:
+            token, expires_at = await self._request_token()
+            await asyncio.to_thread(self.state_store.set, "tokens", self.bank_name,
+                                    {"access_token": token, "expires_at": expires_at}, max(expires_at - time.time(), 1))
+            return token, expires_at
+        finally:
+            await asyncio.to_thread(self.state_store.release_lease, lease_name)
 
     async def request_consent_if_needed(self, client_id: str, max_retries: int = 5) -> str:
         """
@@ -117,14 +399,18 @@ class BankService:
         В случае ошибки, повторяет до max_retries раз.
         Возвращает X-Consent-Id.
         """
+        await self._ensure_consents_loaded()
         consent_id = self.consent_ids.get(client_id)
+        if not consent_id and self.state_store:
+            consent_id = await asyncio.to_thread(self.state_store.get, f"consents:{self.bank_name}", client_id)
+            if consent_id:
+                self.consent_ids[client_id] = consent_id
         if consent_id:
             logger.info(f"[{self.bank_name}] Consent ID для {client_id} уже существует: {consent_id}")
             return consent_id
 
         logger.info(f"[{self.bank_name}] Consent ID для {client_id} не найден, запрашиваем новый...")
-        if not self.token:
-            await self.authenticate()
+        await self.authenticate()
 
         url = f"{self.auth_client.base_url}/account-consents/request"
         headers = {
@@ -144,7 +430,7 @@ class BankService:
 
         for attempt in range(max_retries):
             try:
-                async with httpx.AsyncClient() as client:
+                async with self._http_client() as client:
                     response = await client.post(url, headers=headers, json=body)
                     response.raise_for_status()
 
@@ -165,6 +451,8 @@ class BankService:
 
                     self.consent_ids[client_id] = consent_id
                     self._save_consents()
+                    if self.state_store:
+                        await asyncio.to_thread(self.state_store.set, f"consents:{self.bank_name}", client_id, consent_id)
                     logger.info(f"[{self.bank_name}] Согласие получено и сохранено для {client_id}: {consent_id}")
                     return consent_id
             except httpx.HTTPStatusError as e:
@@ -172,23 +460,28 @@ class BankService:
                 response_text = e.response.text
                 logger.error(
                     f"[{self.bank_name}] HTTP ошибка при запросе согласия для {client_id} (попытка {attempt + 1}/{max_retries}): {status_code} - {response_text}")
+                if status_code == 401 and attempt < max_retries - 1:
+                    await self._refresh_rejected_token(headers)
+                    continue
                 if status_code == 429 or 500 <= status_code < 600:
                     if attempt < max_retries - 1:
                         wait_time = 2 ** attempt
                         logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                        await asyncio.sleep(wait_time)
+                        await sleep_within_deadline(wait_time, "backoff")
                         continue
-                if status_code in [400, 401, 403] and (
+                if status_code in [400, 403] and (
                         "consent" in response_text.lower() or "invalid" in response_text.lower() or "revoked" in response_text.lower()):
-                    self._remove_consent(client_id)
+                    await self._remove_consent(client_id)
                     raise
                 raise
+            except CircuitOpenError:
+                raise
             except Exception as e:
                 logger.error(f"[{self.bank_name}] Ошибка при запросе согласия для {client_id} (попытка {attempt + 1}/{max_retries}): {e}")
                 if attempt < max_retries - 1:
                     wait_time = 2 ** attempt
                     logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                    await asyncio.sleep(wait_time)
+                    await sleep_within_deadline(wait_time, "backoff")
                     continue
                 raise
 
@@ -199,8 +492,7 @@ class BankService:
         Возвращает X-Consent-Id, если согласие выдано автоматически (auto_approved == True).
         Возвращает None, если согласие требует ручного подтверждения (auto_approved == False).
         """
-        if not self.token:
-            await self.authenticate()
+        await self.authenticate()
 
         url = f"{self.auth_client.base_url}/account-consents/request"
         headers = {
@@ -219,7 +511,7 @@ class BankService:
 
         for attempt in range(max_retries):
             try:
-                async with httpx.AsyncClient() as client:
+                async with self._http_client() as client:
                     response = await client.post(url, headers=headers, json=body)
                     response.raise_for_status()
 
@@ -255,19 +547,24 @@ class BankService:
                 response_text = e.response.text
                 logger.error(
                     f"[{self.bank_name}] HTTP ошибка при запросе согласия для {client_id} (попытка {attempt + 1}/{max_retries}): {status_code} - {response_text}")
+                if status_code == 401 and attempt < max_retries - 1:
+                    await self._refresh_rejected_token(headers)
+                    continue
                 if status_code == 429 or 500 <= status_code < 600:
                     if attempt < max_retries - 1:
                         wait_time = 2 ** attempt
                         logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                        await asyncio.sleep(wait_time)
+                        await sleep_within_deadline(wait_time, "backoff")
                         continue
                 raise
+            except CircuitOpenError:
+                raise
             except Exception as e:
                 logger.error(f"[{self.bank_name}] Ошибка при запросе согласия для {client_id} (попытка {attempt + 1}/{max_retries}): {e}")
                 if attempt < max_retries - 1:
                     wait_time = 2 ** attempt
                     logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                    await asyncio.sleep(wait_time)
+                    await sleep_within_deadline(wait_time, "backoff")
                     continue
                 raise
 
@@ -275,8 +572,7 @@ class BankService:
         """
         Получает список счетов (только ID и основная информация) для клиента.
         """
-        if not self.token:
-            await self.authenticate()
+        await self.authenticate()
 
         url = f"{self.auth_client.base_url}/accounts?client_id={client_id}"
         headers = {
@@ -286,13 +582,13 @@ class BankService:
         }
 
         logger.info(f"[{self.bank_name}] Запрашиваем список счетов для {client_id} с consent_id: {consent_id}")
-        logger.info(f"[{self.bank_name}] Ждём 10 секунд перед запросом списка счетов...")
-        await asyncio.sleep(10)
+        logger.info(f"[{self.bank_name}] Ждём {settings.consent_propagation_delay} секунд перед запросом списка счетов...")
+        await sleep_within_deadline(settings.consent_propagation_delay, "применение согласия")
         logger.info(f"[{self.bank_name}] Отправляем запрос на /accounts для {client_id} после задержки.")
 
         for attempt in range(max_retries):
             try:
-                async with httpx.AsyncClient() as client:
+                async with self._http_client() as client:
                     response = await client.get(url, headers=headers)
                     response.raise_for_status()
 
@@ -311,11 +607,14 @@ class BankService:
                 response_text = e.response.text
                 logger.error(
                     f"[{self.bank_name}] HTTP ошибка при запросе списка счетов для {client_id} (попытка {attempt + 1}/{max_retries}): {status_code} - {response_text}")
+                if status_code == 401 and attempt < max_retries - 1:
+                    await self._refresh_rejected_token(headers)
+                    continue
 
-                if status_code in [400, 401, 403] and (
+                if status_code in [400, 403] and (
                         "consent" in response_text.lower() or "invalid" in response_text.lower() or "revoked" in response_text.lower()):
                     logger.warning(f"[{self.bank_name}] Согласие для {client_id} ({consent_id}) возможно отозвано или недействительно.")
-                    self._remove_consent(client_id)
+                    await self._remove_consent(client_id)
                     logger.info(f"[{self.bank_name}] Повторно запрашиваем согласие для {client_id}...")
                     new_consent_id = await self.request_consent_if_needed(client_id)
                     logger.info(
@@ -325,16 +624,18 @@ class BankService:
                     if attempt < max_retries - 1:
                         wait_time = 2 ** attempt
                         logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                        await asyncio.sleep(wait_time)
+                        await sleep_within_deadline(wait_time, "backoff")
                         continue
                 raise
+            except CircuitOpenError:
+                raise
             except Exception as e:
                 logger.error(
                     f"[{self.bank_name}] Ошибка при запросе списка счетов для {client_id} (попытка {attempt + 1}/{max_retries}): {e}")
                 if attempt < max_retries - 1:
                     wait_time = 2 ** attempt
                     logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                    await asyncio.sleep(wait_time)
+                    await sleep_within_deadline(wait_time, "backoff")
                     continue
                 raise
 
@@ -346,8 +647,7 @@ class BankService:
         if retry_count > max_retries:
             raise BankAPIError(f"[{self.bank_name}] Превышено количество попыток запроса списка счетов для {client_id}")
 
-        if not self.token:
-            await self.authenticate()
+        await self.authenticate()
 
         url = f"{self.auth_client.base_url}/accounts?client_id={client_id}"
         headers = {
@@ -358,14 +658,14 @@ class BankService:
 
         logger.info(f"[{self.bank_name}] Запрашиваем список счетов для {client_id} с consent_id: {consent_id} (попытка {retry_count + 1})")
 
-        logger.info(f"[{self.bank_name}] Ждём 10 секунд перед запросом списка счетов...")
-        await asyncio.sleep(10)
+        logger.info(f"[{self.bank_name}] Ждём {settings.consent_propagation_delay} секунд перед запросом списка счетов...")
+        await sleep_within_deadline(settings.consent_propagation_delay, "применение согласия")
         logger.info(f"[{self.bank_name}] Отправляем запрос на /accounts для {client_id} после задержки.")
 
 
         for attempt in range(5):
             try:
-                async with httpx.AsyncClient() as client:
+                async with self._http_client() as client:
                     response = await client.get(url, headers=headers)
                     response.raise_for_status()
 
@@ -383,13 +683,16 @@ class BankService:
                 response_text = e.response.text
                 logger.error(
                     f"[{self.bank_name}] HTTP ошибка при запросе списка счетов для {client_id} (попытка {attempt + 1}/5): {status_code} - {response_text}")
+                if status_code == 401 and attempt < 4:
+                    await self._refresh_rejected_token(headers)
+                    continue
 
-                if status_code in [400, 401, 403] and (
+                if status_code in [400, 403] and (
                         "consent" in response_text.lower() or "invalid" in response_text.lower() or "revoked" in response_text.lower()):
                     if retry_count < max_retries:
                         logger.warning(
                             f"[{self.bank_name}] Согласие для {client_id} ({consent_id}) возможно отозвано. Удаляем и запрашиваем новое.")
-                        self._remove_consent(client_id)
+                        await self._remove_consent(client_id)
                         new_consent_id = await self.request_consent_if_needed(client_id)
                         return await self._fetch_account_list_with_consent(client_id, new_consent_id, retry_count + 1)
                     else:
@@ -400,15 +703,17 @@ class BankService:
                     if attempt < 4:
                         wait_time = 2 ** attempt
                         logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                        await asyncio.sleep(wait_time)
+                        await sleep_within_deadline(wait_time, "backoff")
                         continue
                 raise
+            except CircuitOpenError:
+                raise
             except Exception as e:
                 logger.error(f"[{self.bank_name}] Ошибка при запросе списка счетов для {client_id} (попытка {attempt + 1}/5): {e}")
                 if attempt < 4:
                     wait_time = 2 ** attempt
                     logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                    await asyncio.sleep(wait_time)
+                    await sleep_within_deadline(wait_time, "backoff")
                     continue
                 raise
 
@@ -417,8 +722,7 @@ class BankService:
         """
         Получает детальную информацию о конкретном счёте.
         """
-        if not self.token:
-            await self.authenticate()
+        await self.authenticate()
 
         url = f"{self.auth_client.base_url}/accounts/{account_id}"
         headers = {
@@ -431,7 +735,7 @@ class BankService:
         logger.info(f"[{self.bank_name}] Запрашиваем детали счёта {account_id} для {client_id}")
         for attempt in range(max_retries):
             try:
-                async with httpx.AsyncClient() as client:
+                async with self._http_client() as client:
                     response = await client.get(url, headers=headers)
                     response.raise_for_status()
 
@@ -448,29 +752,34 @@ class BankService:
                 response_text = e.response.text
                 logger.error(
                     f"[{self.bank_name}] HTTP ошибка при запросе деталей счёта {account_id} (попытка {attempt + 1}/{max_retries}): {status_code} - {response_text}")
-                if status_code in [400, 401, 403]:
+                if status_code == 401 and attempt < max_retries - 1:
+                    await self._refresh_rejected_token(headers)
+                    continue
+                if status_code in [400, 403]:
                     if "consent" in response_text.lower() or "invalid" in response_text.lower() or "revoked" in response_text.lower():
                         logger.warning(
                             f"[{self.bank_name}] Согласие для {client_id} ({consent_id}) возможно отозвано при запросе деталей счёта {account_id}.")
-                        self._remove_consent(client_id)
+                        await self._remove_consent(client_id)
 
                         return None
                 elif status_code == 429 or 500 <= status_code < 600:
                     if attempt < max_retries - 1:
                         wait_time = 2 ** attempt
                         logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                        await asyncio.sleep(wait_time)
+                        await sleep_within_deadline(wait_time, "backoff")
                         continue
 
                 logger.error(f"[{self.bank_name}] Не удалось получить детали для счёта {account_id}: {e}. Пропускаем.")
                 return None
+            except CircuitOpenError:
+                raise
             except Exception as e:
                 logger.error(
                     f"[{self.bank_name}] Ошибка при запросе деталей счёта {account_id} (попытка {attempt + 1}/{max_retries}): {e}")
                 if attempt < max_retries - 1:
                     wait_time = 2 ** attempt
                     logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                    await asyncio.sleep(wait_time)
+                    await sleep_within_deadline(wait_time, "backoff")
                     continue
 
                 logger.error(f"[{self.bank_name}] Не удалось получить детали для счёта {account_id}: {e}. Пропускаем.")
@@ -481,8 +790,7 @@ class BankService:
         """
         Получает балансы для конкретного счёта.
         """
-        if not self.token:
-            await self.authenticate()
+        await self.authenticate()
 
         url = f"{self.auth_client.base_url}/accounts/{account_id}/balances"
         headers = {
@@ -495,7 +803,7 @@ class BankService:
         logger.info(f"[{self.bank_name}] Запрашиваем балансы для счёта {account_id} для {client_id}")
         for attempt in range(max_retries):
             try:
-                async with httpx.AsyncClient() as client:
+                async with self._http_client() as client:
                     response = await client.get(url, headers=headers)
                     response.raise_for_status()
 
@@ -508,27 +816,32 @@ class BankService:
                 response_text = e.response.text
                 logger.error(
                     f"[{self.bank_name}] HTTP ошибка при запросе баланса для счёта {account_id} (попытка {attempt + 1}/{max_retries}): {status_code} - {response_text}")
-                if status_code in [400, 401, 403]:
+                if status_code == 401 and attempt < max_retries - 1:
+                    await self._refresh_rejected_token(headers)
+                    continue
+                if status_code in [400, 403]:
                     if "consent" in response_text.lower() or "invalid" in response_text.lower() or "revoked" in response_text.lower():
                         logger.warning(
                             f"[{self.bank_name}] Согласие для {client_id} ({consent_id}) возможно отозвано при запросе баланса счёта {account_id}.")
-                        self._remove_consent(client_id)
+                        await self._remove_consent(client_id)
                         return None
                 elif status_code == 429 or 500 <= status_code < 600:
                     if attempt < max_retries - 1:
                         wait_time = 2 ** attempt
                         logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                        await asyncio.sleep(wait_time)
+                        await sleep_within_deadline(wait_time, "backoff")
                         continue
                 logger.error(f"[{self.bank_name}] Не удалось получить баланс для счёта {account_id}: {e}. Пропускаем.")
                 return None
+            except CircuitOpenError:
+                raise
             except Exception as e:
                 logger.error(
                     f"[{self.bank_name}] Ошибка при запросе баланса для счёта {account_id} (попытка {attempt + 1}/{max_retries}): {e}")
                 if attempt < max_retries - 1:
                     wait_time = 2 ** attempt
                     logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                    await asyncio.sleep(wait_time)
+                    await sleep_within_deadline(wait_time, "backoff")
                     continue
                 logger.error(f"[{self.bank_name}] Не удалось получить баланс для счёта {account_id}: {e}. Пропускаем.")
                 return None
@@ -538,8 +851,7 @@ class BankService:
         """
         Получает ВСЕ транзакции для конкретного счёта.
         """
-        if not self.token:
-            await self.authenticate()
+        await self.authenticate()
 
         all_transactions = []
         page = 1
@@ -557,7 +869,7 @@ class BankService:
             page_transactions = []
             for attempt in range(max_retries):
                 try:
-                    async with httpx.AsyncClient() as client:
+                    async with self._http_client() as client:
                         response = await client.get(url, headers=headers)
                         response.raise_for_status()
 
@@ -570,28 +882,33 @@ class BankService:
                     response_text = e.response.text
                     logger.error(
                         f"[{self.bank_name}] HTTP ошибка при запросе транзакций для счёта {account_id}, страница {page} (попытка {attempt + 1}/{max_retries}): {status_code} - {response_text}")
-                    if status_code in [400, 401, 403]:
+                    if status_code == 401 and attempt < max_retries - 1:
+                        await self._refresh_rejected_token(headers)
+                        continue
+                    if status_code in [400, 403]:
                         if "consent" in response_text.lower() or "invalid" in response_text.lower() or "revoked" in response_text.lower():
                             logger.warning(
                                 f"[{self.bank_name}] Согласие для {client_id} ({consent_id}) возможно отозвано при запросе транзакций счёта {account_id}.")
-                            self._remove_consent(client_id)
+                            await self._remove_consent(client_id)
                             return None
                     elif status_code == 429 or 500 <= status_code < 600:
                         if attempt < max_retries - 1:
                             wait_time = 2 ** attempt
                             logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                            await asyncio.sleep(wait_time)
+                            await sleep_within_deadline(wait_time, "backoff")
                             continue
                     logger.error(
                         f"[{self.bank_name}] Не удалось получить транзакции для счёта {account_id}, страница {page}: {e}. Пропускаем.")
                     return None
+                except CircuitOpenError:
+                    raise
                 except Exception as e:
                     logger.error(
                         f"[{self.bank_name}] Ошибка при запросе транзакций для счёта {account_id}, страница {page} (попытка {attempt + 1}/{max_retries}): {e}")
                     if attempt < max_retries - 1:
                         wait_time = 2 ** attempt
                         logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                        await asyncio.sleep(wait_time)
+                        await sleep_within_deadline(wait_time, "backoff")
                         continue
                     logger.error(
                         f"[{self.bank_name}] Не удалось получить транзакции для счёта {account_id}, страница {page}: {e}. Пропускаем.")
@@ -646,12 +963,15 @@ class BankService:
                     transactions = await self.get_transactions_for_account(client_id, consent_id, acc_id)
 
                     detail["transactions"] = transactions
+                    normalize_account(detail)
 
 
                     logger.info(f"[{self.bank_name}] Детали счёта {acc_id} перед добавлением: {detail}")
 
 
                     all_details.append(detail)
+            except (DeadlineExceeded, CircuitOpenError):
+                raise
             except Exception as e:
                 logger.error(f"[{self.bank_name}] Не удалось получить детали для счёта {acc_id}: {e}. Пропускаем.")
                 continue
@@ -673,9 +993,6 @@ class BankService:
         Использует сохранённое согласие, если оно есть.
         Обрабатывает клиентов параллельно.
         """
-        if not self.token:
-            await self.authenticate()
-
         target_client_ids = specific_client_ids
 
         logger.info(f"[{self.bank_name}] Начинаем параллельную обработку {len(target_client_ids)} клиентов.")
@@ -703,16 +1020,169 @@ class BankService:
         return all_accounts
 
 
+    async def get_accounts_for_client_list_within_deadline(self, specific_client_ids: List[str],
+                                                           deadline: Optional[Deadline]) -> Tuple[
+        Dict[str, List[Dict[str, Any]]], Dict[str, bool]]:
+        """
+        Как get_all_accounts_for_client_list, но возвращается не позже дедлайна.
+        Возвращает (счета по клиентам, признак полноты по клиентам).
+        Незавершённые к дедлайну и завершившиеся ошибкой клиенты получают пустой список и признак False;
+        Задачи клиентов выполняются под этим дедлайном: повторы и backoff в них прекращаются,
+        когда бюджета не хватает, и клиента дообрабатывает фоновая задача, прогревая кэш счетов.
+        Без дедлайна (None) ждёт всех клиентов; признак False тогда означает ошибку.
+        """
+        tasks = {client_id: self._client_task(client_id, deadline) for client_id in specific_client_ids}
+
+        if tasks:
+            await asyncio.wait(set(tasks.values()), timeout=deadline.remaining() if deadline else None)
+
+        all_accounts: Dict[str, List[Dict[str, Any]]] = {}
+        completeness: Dict[str, bool] = {}
+        for client_id, task in tasks.items():
+            if task.done() and not task.cancelled() and task.exception() is None:
+                all_accounts[client_id] = task.result()
+                completeness[client_id] = True
+                continue
+            if not task.done():
+                logger.warning(f"[{self.bank_name}] Дедлайн истёк, клиент {client_id} дообрабатывается в фоне")
+            elif not task.cancelled() and isinstance(task.exception(), DeadlineExceeded):
+                logger.warning(f"[{self.bank_name}] Бюджета не хватило ({task.exception()}), "
+                               f"клиент {client_id} дообрабатывается в фоне")
+            elif not task.cancelled():
+                logger.warning(f"[{self.bank_name}] Клиент {client_id} не обработан: {task.exception()}")
+            all_accounts[client_id] = []
+            completeness[client_id] = False
+
+        logger.info(
+            f"[{self.bank_name}] Обработано {sum(completeness.values())}/{len(completeness)} клиентов в пределах дедлайна")
+        return all_accounts, completeness
+
+    def _client_task(self, client_id: str, deadline: Optional[Deadline]) -> asyncio.Task:
+        """
+        Задача обработки клиента для запроса с дедлайном deadline.
+        Если клиент уже дообрабатывается в фоне, отдаётся эта задача: повторный запрос
+        не дублирует обращения к банку. Иначе задача создаётся под дедлайном запроса,
+        и sleep_within_deadline прекращает в ней повторы и backoff, на которые бюджета нет.
+        Такая задача не разделяется с другими запросами: их бюджет может быть другим.
+        Прерванного дедлайном клиента дообрабатывает фоновая задача (_background_client_task).
+        """
+        background = self._inflight_clients.get(client_id)
+        if background is not None and not background.done():
+            return background
+        if deadline is None:
+            return self._background_client_task(client_id)
+        with deadline_scope(deadline):
+            task = asyncio.create_task(self.fetch_client_accounts(client_id))
+        self._deadline_tasks.add(task)
+        task.add_done_callback(lambda t, c=client_id: self._continue_in_background(c, t))
+        return task
+
+    def _continue_in_background(self, client_id: str, task: asyncio.Task):
+        self._deadline_tasks.discard(task)
+        if not task.cancelled() and isinstance(task.exception(), DeadlineExceeded):
+            self._background_client_task(client_id)
+
+    def _background_client_task(self, client_id: str) -> asyncio.Task:
+        """
+        Фоновая обработка клиента без дедлайна, одна на клиента. Переживает запрос,
+        который её начал, и может быть отдана другому запросу со своим бюджетом времени.
+        """
+        task = self._inflight_clients.get(client_id)
+        if task is None or task.done():
+            with deadline_scope(None):
+                task = asyncio.create_task(self.fetch_client_accounts(client_id))
+            self._inflight_clients[client_id] = task
+            task.add_done_callback(lambda t, c=client_id: self._forget_client_task(c, t))
+        return task
+
+    def _forget_client_task(self, client_id: str, task: asyncio.Task):
+        if self._inflight_clients.get(client_id) is task:
+            del self._inflight_clients[client_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.info(f"[{self.bank_name}] Фоновая обработка клиента {client_id} завершилась ошибкой: {task.exception()}")
+
+    def _get_cached_accounts(self, client_id: str) -> Optional[List[Dict[str, Any]]]:
+        cached = self.accounts_cache.get(client_id)
+        if cached is None:
+            return None
+        fetched_at, accounts = cached
+        if time.monotonic() - fetched_at > settings.accounts_cache_ttl:
+            return None
+        return accounts
+
+    async def _get_shared_cached_accounts(self, client_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Ищет счета клиента в кэше, общем для всех процессов, и переносит их в локальный кэш."""
+        if not self.state_store or settings.accounts_cache_ttl <= 0:
+            return None
+        cached = await asyncio.to_thread(self.state_store.get, f"accounts:{self.bank_name}", client_id)
+        if cached is None:
+            return None
+        age = max(0.0, time.time() - cached["fetched_at"])
+        self.accounts_cache[client_id] = (time.monotonic() - age, cached["accounts"])
+        return cached["accounts"]
+
+    async def fetch_client_accounts(self, client_id: str) -> List[Dict[str, Any]]:
+        """
+        Получает счета одного клиента (из кэша, если он свежий) и кладёт результат в кэш.
+        В отличие от _process_single_client, ошибки пробрасываются вызывающему.
+        """
+        cached = self._get_cached_accounts(client_id)
+        if cached is None:
+            cached = await self._get_shared_cached_accounts(client_id)
+        if cached is not None:
+            logger.info(f"[{self.bank_name}] Счета клиента {client_id} взяты из кэша")
+            return cached
+
+        logger.info(f"[{self.bank_name}] Обработка клиента {client_id}...")
+        try:
+            async with self._client_slots:
+                if self.circuit.is_open:
+                    raise CircuitOpenError(f"Цепь банка {self.bank_name} разомкнута")
+                consent_id = await self.request_consent_if_needed(client_id)
+                accounts = await self.get_all_account_details(client_id, consent_id)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            stale = await self._load_last_known_accounts(client_id)
+            if stale is None:
+                raise
+            logger.warning(f"[{self.bank_name}] Банк недоступен ({e}), клиенту {client_id} "
+                           f"отданы сохранённые данные ({len(stale)} счетов)")
+            return stale
+
+        synced_at = time.time()
+        as_of = datetime.fromtimestamp(synced_at, timezone.utc).isoformat()
+        for account in accounts:
+            account["as_of"] = as_of
+            account["source"] = "live"
+        self.sync_watermarks[client_id] = synced_at
+        if self.local_store:
+            await asyncio.to_thread(self.local_store.save_client_accounts, self.bank_name, client_id,
+                                    accounts, synced_at)
+        if settings.accounts_cache_ttl > 0:
+            self.accounts_cache[client_id] = (time.monotonic(), accounts)
+            if self.state_store:
+                await asyncio.to_thread(self.state_store.set, f"accounts:{self.bank_name}", client_id,
+                                        {"fetched_at": time.time(), "accounts": accounts}, settings.accounts_cache_ttl)
+        logger.info(f"[{self.bank_name}] Завершена обработка клиента {client_id}, получено {len(accounts)} счетов")
+        return accounts
+
+    async def _load_last_known_accounts(self, client_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Последние успешно полученные счета клиента с пометкой source=cache; None, если их нет."""
+        if not self.local_store:
+            return None
+        stored = await asyncio.to_thread(self.local_store.load_client_accounts, self.bank_name, client_id)
+        if stored is None:
+            return None
+        _, accounts = stored
+        return [{**account, "source": "cache"} for account in accounts]
+
     async def _process_single_client(self, client_id: str) -> List[Dict[str, Any]]:
         """
         Обрабатывает одного клиента: запрашивает согласие, получает счета, детали, балансы, транзакции.
         """
         try:
-            logger.info(f"[{self.bank_name}] Обработка клиента {client_id}...")
-            consent_id = await self.request_consent_if_needed(client_id)
-            accounts = await self.get_all_account_details(client_id, consent_id)
-            logger.info(f"[{self.bank_name}] Завершена обработка клиента {client_id}, получено {len(accounts)} счетов")
-            return accounts
+            return await self.fetch_client_accounts(client_id)
         except Exception as e:
             logger.error(f"[{self.bank_name}] Критическая ошибка при обработке клиента {client_id}: {e}")
             return []
@@ -728,8 +1198,24 @@ class BankService:
         Запрашивает согласие на платёж.
         request_data - это объект Pydantic-модели (например, SingleUseConsentWithCreditorRequest).
         """
-        if not self.token:
-            await self.authenticate()
+        await self._ensure_consents_loaded()
+        reusable = isinstance(request_data, (MultiUseConsentRequest, VRPConsentRequest)) and self.payment_consent_pool
+        if reusable:
+            pooled = await asyncio.to_thread(self.payment_consent_pool.find, self.bank_name, request_data)
+            if pooled:
+                logger.info(
+                    f"[{self.bank_name}] Используем действующее согласие {pooled['consent_id']} ({pooled['consent_type']}) для клиента {request_data.client_id}")
+                return PaymentConsentResponse(
+                    request_id=f"pool-{pooled['consent_id']}",
+                    consent_id=pooled["consent_id"],
+                    status="approved",
+                    consent_type=pooled["consent_type"],
+                    auto_approved=True,
+                    message="Использовано действующее согласие с неисчерпанными лимитами",
+                    valid_until=datetime.fromtimestamp(pooled["valid_until"], tz=timezone.utc) if pooled["valid_until"] else None,
+                )
+
+        await self.authenticate()
 
         url = f"{self.auth_client.base_url}/payment-consents/request"
         headers = {
@@ -742,7 +1228,7 @@ class BankService:
 
         for attempt in range(max_retries):
             try:
-                async with httpx.AsyncClient() as client:
+                async with self._http_client() as client:
                     response = await client.post(url, headers=headers, json=body)
                     response.raise_for_status()
 
@@ -754,13 +1240,20 @@ class BankService:
 
                     self.payment_consent_ids[consent_response.consent_id] = request_data.client_id
                     self._save_payment_consents()
+                    if self.state_store:
+                        await asyncio.to_thread(self.state_store.set, f"payment_consents:{self.bank_name}",
+                                                consent_response.consent_id, request_data.client_id)
+                    if reusable:
+                        await asyncio.to_thread(self.payment_consent_pool.register, self.bank_name,
+                                                consent_response.consent_id, request_data,
+                                                consent_response.valid_until)
 
                     logger.info(
                         f"[{self.bank_name}] Согласие на платёж получено: {consent_response.consent_id} для клиента {request_data.client_id}")
 
 
-                    logger.info(f"[{self.bank_name}] Ждём 10 секунд перед выполнением платежа по этому согласию...")
-                    await asyncio.sleep(10)
+                    logger.info(f"[{self.bank_name}] Ждём {settings.consent_propagation_delay} секунд перед выполнением платежа по этому согласию...")
+                    await sleep_within_deadline(settings.consent_propagation_delay, "применение согласия")
                     logger.info(
                         f"[{self.bank_name}] Задержка завершена. Согласие {consent_response.consent_id} готово к использованию.")
 
@@ -771,19 +1264,24 @@ class BankService:
                 response_text = e.response.text
                 logger.error(
                     f"[{self.bank_name}] HTTP ошибка при запросе согласия на платёж (попытка {attempt + 1}/{max_retries}): {status_code} - {response_text}")
+                if status_code == 401 and attempt < max_retries - 1:
+                    await self._refresh_rejected_token(headers)
+                    continue
                 if status_code == 429 or 500 <= status_code < 600:
                     if attempt < max_retries - 1:
                         wait_time = 2 ** attempt
                         logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                        await asyncio.sleep(wait_time)
+                        await sleep_within_deadline(wait_time, "backoff")
                         continue
                 raise
+            except CircuitOpenError:
+                raise
             except Exception as e:
                 logger.error(f"Ошибка при запросе согласия на платёж (попытка {attempt + 1}/{max_retries}): {e}")
                 if attempt < max_retries - 1:
                     wait_time = 2 ** attempt
                     logger.info(f"Ждём {wait_time} секунд перед повторной попыткой...")
-                    await asyncio.sleep(wait_time)
+                    await sleep_within_deadline(wait_time, "backoff")
                     continue
                 raise
 
@@ -795,15 +1293,14 @@ class BankService:
         Выполняет платёж на основе предоставленного consent_id.
         payment_data - это словарь (dict), полученный из model_dump() Pydantic-модели из API.
         """
-        if not self.token:
-            await self.authenticate()
+        await self.authenticate()
 
         url = f"{self.auth_client.base_url}/payments?client_id={client_id}"
         headers = {
             "Authorization": f"Bearer {self.token}",
             "X-Requesting-Bank": self.auth_client.client_id,
             "X-Payment-Consent-Id": consent_id,
-            "X-FAPI-Interaction-ID": f"team020-pay-{int(time.time())}",
+            "X-FAPI-Interaction-ID": f"team020-pay-{uuid.uuid4()}",
             "X-FAPI-Customer-IP-Address": "192.168.1.100",
             "Content-Type": "application/json"
         }
@@ -823,9 +1320,73 @@ class BankService:
         body = vbank_request_body
 
         logger.info(f"[{self.bank_name}] Выполняем платёж с consent_id: {consent_id}, тело: {body}")
+        charged_at = time.time()
+        charged = await self._charge_payment_consent(consent_id, payment_data)
+        try:
+            payment_response = await self._post_payment(url, headers, body, consent_id, max_retries)
+        except PaymentOutcomeUnknownError:
+            # Банк мог провести платёж: списание по согласию не возвращаем.
+            raise
+        except BaseException:
+            if charged is not None:
+                await asyncio.to_thread(self.payment_consent_pool.refund, consent_id, charged, charged_at)
+            raise
+
+        if self.payment_store and payment_response.data.get("paymentId"):
+            try:
+                await asyncio.to_thread(self.payment_store.record, self.bank_name, client_id, consent_id,
+                                        payment_response.data, settings.payment_poll_initial)
+            except Exception as e:
+                logger.error(f"[{self.bank_name}] Платёж {payment_response.data['paymentId']} не поставлен на отслеживание статуса: {e}")
+        return payment_response
+
+    async def get_payment_status(self, payment_id: str, client_id: str, consent_id: Optional[str] = None) -> PaymentStatusResponse:
+        """
+        Запрашивает у банка текущий статус платежа (одна попытка: повторы — забота PaymentStatusTracker).
+        """
+        await self.authenticate()
+
+        url = f"{self.auth_client.base_url}/payments/{payment_id}?client_id={client_id}"
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "X-Requesting-Bank": self.auth_client.client_id,
+            "Accept": "application/json"
+        }
+        if consent_id:
+            headers["X-Payment-Consent-Id"] = consent_id
+
+        async with self._http_client() as client:
+            response = await client.get(url, headers=headers)
+            if response.status_code == 401:
+                await self._refresh_rejected_token(headers)
+                response = await client.get(url, headers=headers)
+            response.raise_for_status()
+            payment_response = PaymentStatusResponse(**response.json())
+        logger.info(f"[{self.bank_name}] Статус платежа {payment_id}: {payment_response.data.get('status')}")
+        return payment_response
+
+    async def _charge_payment_consent(self, consent_id: str, payment_data: dict) -> Optional[int]:
+        """
+        Списывает платёж по согласию из пула многоразовых согласий.
+        Возвращает списанную сумму в копейках или None, если согласие в пуле не отслеживается.
+        """
+        if not self.payment_consent_pool:
+            return None
+        terms = payment_terms(payment_data)
+        if terms["amount"] is None:
+            return None
+        charged = await asyncio.to_thread(self.payment_consent_pool.charge, consent_id, terms["amount"],
+                                          terms["creditor_account"], terms["currency"])
+        return terms["amount"] if charged else None
+
+    async def _post_payment(self, url: str, headers: Dict[str, str], body: dict, consent_id: str,
+                            max_retries: int) -> PaymentStatusResponse:
+        # Повтор POST безопасен, только если банк точно не обработал запрос: соединение
+        # не установлено, 429 или 503. При остальных ошибках после отправки платёж мог
+        # пройти, поэтому вместо повтора поднимается PaymentOutcomeUnknownError.
         for attempt in range(max_retries):
             try:
-                async with httpx.AsyncClient() as client:
+                async with self._http_client() as client:
                     response = await client.post(url, headers=headers, json=body)
                     response.raise_for_status()
 
@@ -841,36 +1402,51 @@ class BankService:
                 response_text = e.response.text
                 logger.error(
                     f"[{self.bank_name}] HTTP ошибка при выполнении платежа (попытка {attempt + 1}/{max_retries}): {status_code} - {response_text}")
-                if status_code in [400, 401, 403]:
+                if status_code == 401 and attempt < max_retries - 1:
+                    await self._refresh_rejected_token(headers)
+                    continue
+                if status_code in [400, 403]:
                     if "consent" in response_text.lower() or "invalid" in response_text.lower() or "revoked" in response_text.lower():
                         logger.warning(
                             f"[{self.bank_name}] Согласие {consent_id} возможно отозвано или недействительно при выполнении платежа.")
-                        self._remove_payment_consent(consent_id)
+                        await self._remove_payment_consent(consent_id)
                         raise BankAPIError(
                             f"[{self.bank_name}] Согласие на платёж {consent_id} недействительно: {response_text}")
-                elif status_code == 429 or 500 <= status_code < 600:
+                elif status_code in [429, 503]:
                     if attempt < max_retries - 1:
                         wait_time = 2 ** attempt
                         logger.info(f"[{self.bank_name}] Ждём {wait_time} секунд перед повторной попыткой...")
-                        await asyncio.sleep(wait_time)
+                        await sleep_within_deadline(wait_time, "backoff")
                         continue
+                elif status_code >= 500:
+                    raise PaymentOutcomeUnknownError(
+                        f"[{self.bank_name}] Банк ответил {status_code} на платёж (interaction {headers['X-FAPI-Interaction-ID']})") from e
                 raise
-            except Exception as e:
-                logger.error(f"Ошибка при выполнении платежа (попытка {attempt + 1}/{max_retries}): {e}")
+            except CircuitOpenError:
+                raise
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                logger.error(f"[{self.bank_name}] Платёж не отправлен (попытка {attempt + 1}/{max_retries}): {e}")
                 if attempt < max_retries - 1:
                     wait_time = 2 ** attempt
                     logger.info(f"Ждём {wait_time} секунд перед повторной попыткой...")
-                    await asyncio.sleep(wait_time)
+                    await sleep_within_deadline(wait_time, "backoff")
                     continue
                 raise
+            except httpx.TransportError as e:
+                logger.error(f"[{self.bank_name}] Ответ на платёж не получен: {e}")
+                raise PaymentOutcomeUnknownError(
+                    f"[{self.bank_name}] Ответ на платёж не получен (interaction {headers['X-FAPI-Interaction-ID']}): {e}") from e
+            except Exception as e:
+                logger.error(f"[{self.bank_name}] Ошибка при разборе ответа на платёж: {e}")
+                raise PaymentOutcomeUnknownError(
+                    f"[{self.bank_name}] Ответ на платёж не разобран (interaction {headers['X-FAPI-Interaction-ID']}): {e}") from e
 
     async def get_all_accounts_for_all_clients(self) -> Dict[str, List[Dict[str, Any]]]:
         """
         Получает детальную информацию, балансы и транзакции о всех счетах для ВСЕХ клиентов: team020-1 .. team020-5.
         Использует сохранённое согласие, если оно есть.
         """
-        if not self.token:
-            await self.authenticate()
+        await self.authenticate()
 
         all_accounts = {}
         for i in range(1, 6):
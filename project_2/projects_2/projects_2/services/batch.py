@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Dict, List, Set
+
+import httpx
+
+from models.batch import BatchSubRequest
+
+
+logger = logging.getLogger(__name__)
+
+
+# Ссылка на результат более раннего подзапроса: {{id.body.connected_banks.0}}.
+# Строка, целиком состоящая из ссылки, заменяется значением любого типа,
+# ссылка внутри строки (например, в пути) — его строковым представлением.
+REFERENCE_PATTERN = re.compile(r"\{\{\s*([A-Za-z0-9_\-]+)((?:\.[^.{}\s]+)*)\s*\}\}")
+
+
+class BatchError(ValueError):
+    """Некорректный пакет запросов: пакет не выполняется целиком."""
+
+
+class UnresolvedReference(Exception):
+    pass
+
+
+def _find_references(value: Any) -> Set[str]:
+    if isinstance(value, str):
+        return {match.group(1) for match in REFERENCE_PATTERN.finditer(value)}
+    if isinstance(value, dict):
+        return set().union(*(_find_references(item) for item in value.values())) if value else set()
+    if isinstance(value, list):
+        return set().union(*(_find_references(item) for item in value)) if value else set()
+    return set()
+
+
+def _lookup(results: Dict[str, Dict[str, Any]], request_id: str, path: str) -> Any:
+    node: Any = results[request_id]
+    for key in path.split(".")[1:]:
+        try:
+            node = node[int(key)] if isinstance(node, list) else node[key]
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise UnresolvedReference(f"В результате '{request_id}' нет значения '{path.lstrip('.')}'")
+    return node
+
+
+def _resolve(value: Any, results: Dict[str, Dict[str, Any]]) -> Any:
+    if isinstance(value, str):
+        match = REFERENCE_PATTERN.fullmatch(value)
+        if match:
+            return _lookup(results, match.group(1), match.group(2))
+        return REFERENCE_PATTERN.sub(lambda m: str(_lookup(results, m.group(1), m.group(2))), value)
+    if isinstance(value, dict):
+        return {key: _resolve(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_resolve(item, results) for item in value]
+    return value
+
+
+class BatchExecutor:
+    """
+    Выполняет пакет подзапросов к приложению внутри процесса, через ASGI-транспорт
+    (без HTTP-петли через сеть). Независимые подзапросы идут параллельно; подзапрос
+    со ссылками на результаты более ранних ждёт только их. Если зависимость
+    завершилась ошибкой (статус >= 400), зависимый подзапрос получает 424.
+    """
+
+    def __init__(self, max_requests: int):
+        self.max_requests = max_requests
+
+    def _validate(self, sub_requests: List[BatchSubRequest]) -> Dict[str, Set[str]]:
+        """Проверяет пакет и возвращает зависимости подзапросов {id: {id, ...}}."""
+        if not sub_requests:
+            raise BatchError("Пакет пуст")
+        if len(sub_requests) > self.max_requests:
+            raise BatchError(f"В пакете больше {self.max_requests} подзапросов")
+        dependencies: Dict[str, Set[str]] = {}
+        for sub_request in sub_requests:
+            if sub_request.id in dependencies:
+                raise BatchError(f"Повторяющийся id подзапроса: {sub_request.id}")
+            if not sub_request.path.startswith("/") or sub_request.path.split("?")[0].rstrip("/") == "/batch":
+                raise BatchError(f"Недопустимый путь подзапроса: {sub_request.path}")
+            references = _find_references([sub_request.path, sub_request.params, sub_request.body])
+            unknown = references - set(dependencies)
+            if unknown:
+                raise BatchError(f"Подзапрос '{sub_request.id}' ссылается не на более ранние подзапросы: {sorted(unknown)}")
+            dependencies[sub_request.id] = references
+        return dependencies
+
+    async def execute(self, app, sub_requests: List[BatchSubRequest]) -> List[Dict[str, Any]]:
+        sub_requests = [sub_request if sub_request.id else sub_request.model_copy(update={"id": str(index)})
+                        for index, sub_request in enumerate(sub_requests)]
+        dependencies = self._validate(sub_requests)
+        results: Dict[str, Dict[str, Any]] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://batch") as client:
+            async def run(sub_request: BatchSubRequest):
+                deps = dependencies[sub_request.id]
+                if deps:
+                    await asyncio.gather(*(tasks[dep] for dep in deps))
+                started = time.perf_counter()
+                results[sub_request.id] = await self._run_one(client, sub_request, deps, results)
+                results[sub_request.id]["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+            for sub_request in sub_requests:
+                tasks[sub_request.id] = asyncio.create_task(run(sub_request))
+            await asyncio.gather(*tasks.values())
+
+        return [results[sub_request.id] for sub_request in sub_requests]
+
+    async def _run_one(self, client: httpx.AsyncClient, sub_request: BatchSubRequest, deps: Set[str],
+                       results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        failed = sorted(dep for dep in deps if results[dep]["status"] >= 400)
+        if failed:
+            return {"id": sub_request.id, "status": 424, "body": {"detail": f"Зависимости завершились ошибкой: {failed}"}}
+        try:
+            path = _resolve(sub_request.path, results)
+            params = _resolve(sub_request.params, results)
+            body = _resolve(sub_request.body, results)
+        except UnresolvedReference as e:
+            return {"id": sub_request.id, "status": 424, "body": {"detail": str(e)}}
+
+        headers = dict(sub_request.headers or {})
+        headers.update({"accept": "application/json", "accept-encoding": "identity"})
+        response = await client.request(sub_request.method.upper(), path, params=params, headers=headers,
+                                        json=body)
+        if response.headers.get("content-type", "").startswith("application/json"):
+            response_body = response.json()
+        else:
+            response_body = response.text or None
+        logger.info(f"Пакет: {sub_request.method.upper()} {path} -> {response.status_code}")
+        return {"id": sub_request.id, "status": response.status_code, "body": response_body}
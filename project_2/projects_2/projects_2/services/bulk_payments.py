@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Set, Tuple
+
+from config import settings
+from models.bulk_payment import PaymentInstruction
+from services.bank_service import PaymentOutcomeUnknownError
+from services.payment_consent_pool import ConsentLimitExceeded
+from services.idempotency import (
+    IdempotencyStore,
+    IdempotencyKeyReused,
+    IdempotencyInProgress,
+    idempotency_store,
+    request_fingerprint,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class BulkPaymentError(ValueError):
+    """Некорректный пакет платежей: пакет не выполняется целиком."""
+
+
+async def payment_outcome(service, client_id: str, consent_id: str, payment_data: dict) -> Tuple[int, Any]:
+    """
+    Выполняет платёж и возвращает (HTTP-статус, тело) для сохранения за ключом идемпотентности.
+    Неизвестный исход (банк мог провести платёж) фиксируется как 502, чтобы повтор не заплатил дважды;
+    остальные ошибки пробрасываются и не сохраняются — такой платёж можно повторить.
+    """
+    try:
+        payment_response = await service.execute_payment(client_id, consent_id, payment_data)
+    except PaymentOutcomeUnknownError as e:
+        logger.error(f"Исход платежа клиента {client_id} по согласию {consent_id} неизвестен: {e}")
+        return 502, {"detail": f"Исход платежа неизвестен, проверьте его статус в банке: {str(e)}"}
+    return 200, payment_response.model_dump(mode="json")
+
+
+class BulkPaymentExecutor:
+    """
+    Выполняет пакет платежей по разным банкам и клиентам. Пакет проверяется целиком
+    до первого платежа, затем платежи идут параллельно, не больше per_bank_limit
+    одновременно на банк, а результаты отдаются по мере готовности.
+    Каждый платёж выполняется через IdempotencyStore под своим ключом, поэтому
+    прерванный пакет, отправленный повторно с тем же batch_id, продолжается с места
+    остановки. Начатые платежи доводятся до конца и при обрыве соединения клиента,
+    ещё не начатые — пропускаются.
+    """
+
+    def __init__(self, idempotency: IdempotencyStore, max_payments: int, per_bank_limit: int):
+        self.idempotency = idempotency
+        self.max_payments = max_payments
+        self.per_bank_limit = per_bank_limit
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._running: Set[asyncio.Task] = set()
+
+    def prepare(self, batch_id: str, payments: List[PaymentInstruction], services: Dict[str, Any]) -> List[str]:
+        """Проверяет пакет и возвращает ключи идемпотентности платежей."""
+        if not payments:
+            raise BulkPaymentError("Пакет платежей пуст")
+        if len(payments) > self.max_payments:
+            raise BulkPaymentError(f"В пакете больше {self.max_payments} платежей")
+        missing_banks = sorted({payment.bank_name for payment in payments} - set(services))
+        if missing_banks:
+            raise BulkPaymentError(f"Банки не найдены или не подключены: {missing_banks}")
+        keys = [payment.idempotency_key or f"bulk:{batch_id}:{index}" for index, payment in enumerate(payments)]
+        if len({(payment.bank_name, payment.client_id, key) for payment, key in zip(payments, keys)}) != len(keys):
+            raise BulkPaymentError("Повторяющиеся idempotency_key в пакете")
+        return keys
+
+    def _semaphore(self, bank_name: str) -> asyncio.Semaphore:
+        if bank_name not in self._semaphores:
+            self._semaphores[bank_name] = asyncio.Semaphore(self.per_bank_limit)
+        return self._semaphores[bank_name]
+
+    async def execute(self, batch_id: str, payments: List[PaymentInstruction], keys: List[str],
+                      services: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        stopped = False
+
+        async def run(index: int) -> Dict[str, Any]:
+            payment, key = payments[index], keys[index]
+            result = {"index": index, "bank_name": payment.bank_name, "client_id": payment.client_id,
+                      "idempotency_key": key}
+            async with self._semaphore(payment.bank_name):
+                if stopped:
+                    return {**result, "status": 499, "body": {"detail": "Пакет прерван до выполнения платежа"}}
+                fingerprint = request_fingerprint(payment.bank_name, payment.client_id, payment.consent_id,
+                                                  payment.payment_data)
+
+                async def pay() -> Tuple[int, Any]:
+                    return await payment_outcome(services[payment.bank_name], payment.client_id,
+                                                 payment.consent_id, payment.payment_data)
+
+                try:
+                    status, body, replayed = await self.idempotency.execute(payment.bank_name, payment.client_id,
+                                                                            key, fingerprint, pay)
+                except IdempotencyKeyReused:
+                    return {**result, "status": 422,
+                            "body": {"detail": "Idempotency-Key уже использован для платежа с другими параметрами."}}
+                except ConsentLimitExceeded as e:
+                    return {**result, "status": 422, "body": {"detail": str(e)}}
+                except IdempotencyInProgress:
+                    return {**result, "status": 409,
+                            "body": {"detail": "Платёж с этим ключом ещё выполняется, повторите пакет позже."}}
+                except Exception as e:
+                    logger.error(f"Пакет {batch_id}: ошибка платежа #{index} клиента {payment.client_id}: {e}")
+                    return {**result, "status": 500, "body": {"detail": f"Ошибка при выполнении платежа: {str(e)}"}}
+            return {**result, "status": status, "body": body, "replayed": replayed}
+
+        tasks = [asyncio.create_task(run(index)) for index in range(len(payments))]
+        self._running.update(tasks)
+        for task in tasks:
+            task.add_done_callback(self._running.discard)
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Клиент отключился: новые платежи не начинаем, начатые доводим до сохранения результата.
+            stopped = True
+
+    async def drain(self, timeout: float) -> int:
+        """Ждёт начатые платежи пакетов не дольше timeout; возвращает число незавершённых."""
+        if not self._running or timeout <= 0:
+            return len(self._running)
+        _, pending = await asyncio.wait(set(self._running), timeout=timeout)
+        return len(pending)
+
+
+bulk_payment_executor = BulkPaymentExecutor(idempotency_store, settings.bulk_payments_max,
+                                            settings.bulk_payments_per_bank)
@@ -0,0 +1,191 @@
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+
+# Параметры запроса, которые не должны попадать в кассету (секреты).
+SCRUBBED_PARAMS = {"client_secret"}
+
+# Поля JSON-тел ответов, значения которых заменяются при записи: токены банка
+# действуют и после записи. Данные счетов и клиентов в кассете остаются как есть,
+# поэтому кассеты с реальных банков не должны попадать в репозиторий.
+REDACTED_BODY_FIELDS = {"access_token", "refresh_token", "id_token", "client_secret"}
+REDACTED = "REDACTED"
+
+# Заголовки ответа, которые не нужны при воспроизведении: тело хранится уже
+# раскодированным, а служебные заголовки только раздувают кассету.
+DROPPED_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "date",
+                            "server", "keep-alive", "set-cookie"}
+
+
+class CassetteMissError(httpx.TransportError):
+    """Запрос не найден в кассете в режиме воспроизведения."""
+
+
+def _scrub_url(url: httpx.URL) -> str:
+    params = [(k, v) for k, v in parse_qsl(url.query.decode(), keep_blank_values=True) if k not in SCRUBBED_PARAMS]
+    query = urlencode(sorted(params))
+    return f"{url.path}?{query}" if query else url.path
+
+
+def _redact(value):
+    if isinstance(value, dict):
+        return {k: REDACTED if k in REDACTED_BODY_FIELDS and v is not None else _redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_redact(item) for item in value]
+    return value
+
+
+def redact_body(content: bytes) -> bytes:
+    """Тело ответа с заменёнными значениями полей REDACTED_BODY_FIELDS; не-JSON тела не меняются."""
+    if not content or not any(field.encode() in content for field in REDACTED_BODY_FIELDS):
+        return content
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return content
+    return json.dumps(_redact(data), ensure_ascii=False).encode("utf-8")
+
+
+def _body_digest(content: bytes) -> str:
+    if not content:
+        return ""
+    try:
+        # JSON-тела нормализуются, чтобы порядок ключей не влиял на совпадение.
+        content = json.dumps(json.loads(content), sort_keys=True, ensure_ascii=False).encode()
+    except ValueError:
+        pass
+    return hashlib.sha1(content).hexdigest()[:16]
+
+
+def interaction_key(request: httpx.Request) -> str:
+    """Ключ взаимодействия: метод, путь с отсортированными параметрами и хэш тела."""
+    return f"{request.method} {_scrub_url(request.url)} {_body_digest(request.content)}"
+
+
+class Cassette:
+    """
+    Записанные пары запрос/ответ одного банка.
+    Хранится в одном gzip-файле JSON Lines: по строке на взаимодействие.
+    Для одного ключа ответы воспроизводятся в порядке записи, последний повторяется.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.interactions: Dict[str, List[Dict]] = {}
+        self._cursors: Dict[str, int] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path) -> "Cassette":
+        cassette = cls(path)
+        if path.exists():
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    cassette.interactions.setdefault(entry["k"], []).append(entry)
+            logger.info(f"Кассета {path} загружена: {sum(map(len, cassette.interactions.values()))} взаимодействий")
+        return cassette
+
+    def record(self, request: httpx.Request, response: httpx.Response, content: bytes, latency: float):
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_RESPONSE_HEADERS}
+        content = redact_body(content)
+        try:
+            body = {"t": content.decode("utf-8")}
+        except UnicodeDecodeError:
+            body = {"b64": base64.b64encode(content).decode("ascii")}
+        entry = {
+            "k": interaction_key(request),
+            "s": response.status_code,
+            "h": headers,
+            "l": round(latency * 1000, 1),
+            **body,
+        }
+        with self._lock:
+            self.interactions.setdefault(entry["k"], []).append(entry)
+            self._dirty = True
+
+    def next_entry(self, request: httpx.Request) -> Optional[Dict]:
+        key = interaction_key(request)
+        with self._lock:
+            entries = self.interactions.get(key)
+            if not entries:
+                return None
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+            return entries[min(cursor, len(entries) - 1)]
+
+    def save(self):
+        """Перезаписывает файл кассеты атомарно (через временный файл)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = [entry for group in self.interactions.values() for entry in group]
+            self._dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")))
+                f.write("\n")
+        tmp_path.replace(self.path)
+        logger.info(f"Кассета {self.path} сохранена: {len(entries)} взаимодействий")
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Проксирует запросы в реальный транспорт и записывает ответы в кассету."""
+
+    def __init__(self, cassette: Cassette, inner: Optional[httpx.AsyncBaseTransport] = None):
+        self.cassette = cassette
+        self.inner = inner or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        content = await response.aread()
+        latency = time.perf_counter() - started
+        self.cassette.record(request, response, content, latency)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=[(k, v) for k, v in response.headers.items() if k.lower() not in DROPPED_RESPONSE_HEADERS],
+            content=content,
+            request=request,
+        )
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Отдаёт ответы из кассеты, не обращаясь к сети. Задержки — записанные или нулевые."""
+
+    def __init__(self, cassette: Cassette, replay_latency: bool = True):
+        self.cassette = cassette
+        self.replay_latency = replay_latency
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        entry = self.cassette.next_entry(request)
+        if entry is None:
+            raise CassetteMissError(f"В кассете {self.cassette.path} нет ответа для {interaction_key(request)}",
+                                    request=request)
+        if self.replay_latency and entry["l"]:
+            await asyncio.sleep(entry["l"] / 1000)
+        if "t" in entry:
+            content = entry["t"].encode("utf-8")
+        else:
+            content = base64.b64decode(entry["b64"])
+        return httpx.Response(status_code=entry["s"], headers=entry["h"], content=content, request=request)
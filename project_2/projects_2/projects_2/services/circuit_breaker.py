@@ -0,0 +1,115 @@
+import logging
+import time
+
+import httpx
+
+from services.cassette import CassetteMissError
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Запрос не отправлен: цепь банка разомкнута после серии отказов."""
+
+
+# Ошибки на нашей стороне, а не отказ банка: пул соединений переполнен, запрос
+# некорректен или его нет в кассете. В счётчик отказов они не идут, иначе перегрузка
+# собственного пула размыкала бы цепь здорового банка.
+CLIENT_SIDE_ERRORS = (httpx.PoolTimeout, httpx.UnsupportedProtocol, httpx.LocalProtocolError, CassetteMissError,
+                      CircuitOpenError)
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для обращений к API одного банка.
+    После failure_threshold отказов подряд (сетевые ошибки и 5xx) цепь размыкается,
+    и запросы отклоняются сразу, без сети и повторных попыток. Через reset_timeout
+    секунд пропускается один пробный запрос: успех замыкает цепь, отказ снова размыкает.
+    Ошибки CLIENT_SIDE_ERRORS отказами банка не считаются.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос. В полуоткрытом состоянии пропускает только один пробный."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        if self._opened_at is not None:
+            logger.info(f"[{self.name}] Банк снова отвечает, цепь замкнута")
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        probe_failed = self._probe_in_flight
+        self._probe_in_flight = False
+        if probe_failed or (self._opened_at is None and self._failures >= self.failure_threshold):
+            self._opened_at = time.monotonic()
+            logger.warning(f"[{self.name}] Цепь разомкнута после {self._failures} отказов подряд, "
+                           f"запросы к банку приостановлены на {self.reset_timeout}s")
+
+    def release_probe(self):
+        """Пробный запрос отменён, не дойдя до ответа: следующий запрос снова может стать пробным."""
+        self._probe_in_flight = False
+
+
+class CircuitBreakerTransport(httpx.AsyncBaseTransport):
+    """Транспорт, который учитывает ответы банка в CircuitBreaker и не пускает запросы при разомкнутой цепи."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, breaker: CircuitBreaker):
+        self.transport = transport
+        self.breaker = breaker
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Цепь банка {self.breaker.name} разомкнута", request=request)
+        try:
+            response = await self.transport.handle_async_request(request)
+        except CLIENT_SIDE_ERRORS:
+            self.breaker.release_probe()
+            raise
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
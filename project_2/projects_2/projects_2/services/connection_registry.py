@@ -0,0 +1,25 @@
+from typing import Dict
+
+from services.state_store import StateStore
+
+
+class ConnectionRegistry:
+    """
+    Реестр подключений к банкам в общем хранилище.
+    Подключения, добавленные через /banks/connect, переживают перезапуск
+    и видны всем процессам uvicorn.
+    """
+
+    NAMESPACE = "connections"
+
+    def __init__(self, store: StateStore):
+        self.store = store
+
+    def all(self) -> Dict[str, Dict[str, str]]:
+        return self.store.items(self.NAMESPACE)
+
+    def put(self, bank_config: Dict[str, str]):
+        self.store.set(self.NAMESPACE, bank_config['name'], bank_config)
+
+    def remove(self, bank_name: str):
+        self.store.delete(self.NAMESPACE, bank_name)
@@ -0,0 +1,76 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """Оставшегося бюджета времени запроса не хватает на очередное ожидание."""
+
+
+class Deadline:
+    """
+    Бюджет времени входящего запроса.
+    Хранит момент истечения по монотонным часам, поэтому не зависит от
+    расхождения часов клиента и сервера.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def can_afford(self, seconds: float) -> bool:
+        return self.remaining() >= seconds
+
+    def __repr__(self):
+        return f"Deadline(remaining={self.remaining():.3f}s)"
+
+
+# Дедлайн текущего запроса. ContextVar копируется в задачи asyncio при их
+# создании, поэтому дедлайн автоматически доходит до всех подзадач fan-out.
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """Устанавливает дедлайн для кода внутри блока и всех задач, созданных в нём."""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def deadline_from_ms(deadline_ms: Optional[int]) -> Optional[Deadline]:
+    """Создаёт дедлайн из бюджета в миллисекундах (заголовок X-Deadline-Ms или параметр deadline_ms)."""
+    if deadline_ms is None:
+        return None
+    if deadline_ms <= 0:
+        raise ValueError("Бюджет дедлайна должен быть положительным")
+    return Deadline(deadline_ms / 1000)
+
+
+async def sleep_within_deadline(seconds: float, reason: str = ""):
+    """
+    asyncio.sleep, который учитывает дедлайн текущего запроса:
+    если оставшегося бюджета не хватает на ожидание, сразу поднимает DeadlineExceeded,
+    чтобы повторные попытки и backoff не тратили время, которого у запроса уже нет.
+    """
+    deadline = _current_deadline.get()
+    if deadline is not None and not deadline.can_afford(seconds):
+        raise DeadlineExceeded(
+            f"Осталось {deadline.remaining():.2f}s из бюджета, ожидание {seconds}s невозможно"
+            + (f" ({reason})" if reason else ""))
+    await asyncio.sleep(seconds)
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import httpx
+
+from config import settings
+from utils.encoding import json_loads
+from utils.money import exponent
+from utils.paths import data_path
+from services.state_store import StateStore, state_store
+
+
+logger = logging.getLogger(__name__)
+
+
+FX_NAMESPACE = "fx"
+FX_KEY = "rates"
+
+
+class FxSourceError(Exception):
+    pass
+
+
+class FileRateSource:
+    """
+    Курсы из локального JSON-файла (офлайн, для тестов и стендов без сети):
+    {"base": "RUB", "as_of": "2024-01-01", "rates": {"USD": "92.5", "EUR": "100.1"}},
+    где rates — стоимость единицы валюты в базовой валюте.
+    """
+
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    async def fetch(self) -> Dict[str, Any]:
+        try:
+            raw = json_loads(await asyncio.to_thread(self.path.read_bytes))
+        except (OSError, ValueError) as e:
+            raise FxSourceError(f"Файл курсов {self.path} не прочитан: {e}")
+        return {"base": raw.get("base", settings.fx_base_currency), "as_of": raw.get("as_of"),
+                "rates": {currency.upper(): str(rate) for currency, rate in (raw.get("rates") or {}).items()}}
+
+
+class CbrRateSource:
+    """Курсы ЦБ РФ в формате cbr-xml-daily (daily_json.js): Valute.{код}.Value за Nominal единиц, база — RUB."""
+
+    name = "cbr"
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+
+    async def fetch(self) -> Dict[str, Any]:
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.get(self.url)
+                response.raise_for_status()
+                raw = json_loads(response.content)
+        except (httpx.HTTPError, ValueError) as e:
+            raise FxSourceError(f"Курсы {self.url} не получены: {e}")
+        rates = {}
+        for code, valute in (raw.get("Valute") or {}).items():
+            try:
+                rates[code.upper()] = str(Decimal(str(valute["Value"])) / Decimal(str(valute.get("Nominal", 1))))
+            except (KeyError, InvalidOperation, ZeroDivisionError):
+                logger.warning(f"Курс {code} от {self.url} пропущен: {valute}")
+        return {"base": "RUB", "as_of": raw.get("Date"), "rates": rates}
+
+
+def create_rate_source():
+    if settings.fx_source == "file":
+        return FileRateSource(str(data_path(settings.fx_rates_file)))
+    if settings.fx_source == "cbr":
+        return CbrRateSource(settings.fx_url)
+    raise ValueError(f"Неизвестный источник курсов fx_source={settings.fx_source!r}")
+
+
+class FxRates:
+    """
+    Таблица курсов валют для пересчёта итогов. Таблица кэшируется в общем хранилище
+    (видна всем процессам uvicorn и переживает перезапуск) и обновляется из источника
+    в фоне раз в interval секунд; обновляет её один процесс, остальные перечитывают кэш.
+    Запросы клиентов к источнику курсов не обращаются.
+    """
+
+    def __init__(self, source, store: StateStore, interval: float, base_currency: str):
+        self.source = source
+        self.store = store
+        self.interval = interval
+        self.base_currency = base_currency.upper()
+        self._table: Optional[Dict[str, Any]] = None
+        self._rates: Dict[str, Decimal] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _apply(self, table: Optional[Dict[str, Any]]):
+        if table is None or table is self._table:
+            return
+        rates = {currency: Decimal(rate) for currency, rate in table["rates"].items()}
+        rates[table["base"]] = Decimal(1)
+        self._table, self._rates = table, rates
+
+    def _is_stale(self) -> bool:
+        return self._table is None or time.time() - self._table["fetched_at"] >= self.interval
+
+    async def refresh(self, force: bool = False) -> bool:
+        """Перечитывает кэш и, если он устарел, загружает курсы из источника. True, если курсы доступны."""
+        self._apply(await asyncio.to_thread(self.store.get, FX_NAMESPACE, FX_KEY))
+        if not force and not self._is_stale():
+            return True
+        lease = f"{FX_NAMESPACE}:refresh"
+        if not await asyncio.to_thread(self.store.acquire_lease, lease, 60):
+            return self._table is not None
+        try:
+            table = await self.source.fetch()
+            table.update(source=self.source.name, fetched_at=time.time())
+            await asyncio.to_thread(self.store.set, FX_NAMESPACE, FX_KEY, table)
+            self._apply(table)
+            logger.info(f"Курсы валют обновлены из {self.source.name}: {len(table['rates'])} валют на {table['as_of']}")
+        except FxSourceError as e:
+            logger.error(f"{e}; используются курсы из кэша")
+        finally:
+            await asyncio.to_thread(self.store.release_lease, lease)
+        return self._table is not None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._periodic_refresh())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _periodic_refresh(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Ошибка обновления курсов валют: {e}")
+            await asyncio.sleep(self.interval if self._table is not None else min(self.interval, 60))
+
+    def rate(self, currency: str) -> Optional[Decimal]:
+        """Стоимость единицы валюты в базовой валюте таблицы; None, если курса нет."""
+        return self._rates.get(currency.upper())
+
+    def convert(self, minor: int, from_currency: str, to_currency: str) -> Optional[int]:
+        """
+        Пересчитывает сумму в минимальных единицах from_currency в минимальные единицы
+        to_currency (кросс-курс через базовую валюту, банковское округление); None, если курса нет.
+        """
+        if from_currency.upper() == to_currency.upper():
+            return minor
+        from_rate, to_rate = self.rate(from_currency), self.rate(to_currency)
+        if from_rate is None or to_rate is None:
+            return None
+        value = Decimal(minor).scaleb(exponent(to_currency) - exponent(from_currency)) * from_rate / to_rate
+        return int(value.to_integral_value(rounding=ROUND_HALF_EVEN))
+
+    def as_dict(self) -> Dict[str, Any]:
+        if self._table is None:
+            return {"available": False, "source": self.source.name}
+        return {"available": True, "source": self._table["source"], "base": self._table["base"],
+                "as_of": self._table["as_of"], "fetched_at": self._table["fetched_at"], "stale": self._is_stale()}
+
+
+fx_rates = FxRates(create_rate_source(), state_store, settings.fx_refresh_interval, settings.fx_base_currency)
@@ -0,0 +1,106 @@
+import asyncio
+import atexit
+import logging
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from config import settings
+from services.cassette import Cassette, RecordingTransport, ReplayTransport
+from services.circuit_breaker import CircuitBreaker, CircuitBreakerTransport
+from services.deadline import sleep_within_deadline
+from services.state_store import StateStore, state_store
+from utils.paths import data_path
+
+
+logger = logging.getLogger(__name__)
+
+
+HTTP_MODES = ("live", "record", "replay")
+
+_cassettes: Dict[str, Cassette] = {}
+
+
+def get_cassette(bank_name: str) -> Cassette:
+    """Возвращает кассету банка, загружая её с диска при первом обращении."""
+    cassette = _cassettes.get(bank_name)
+    if cassette is None:
+        path = data_path(settings.cassette_dir) / f"{bank_name}.jsonl.gz"
+        cassette = Cassette.load(path)
+        _cassettes[bank_name] = cassette
+    return cassette
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    Ограничивает число запросов к банку в секунду. Счётчик окна хранится в общем
+    хранилище, поэтому лимит соблюдается суммарно по всем процессам uvicorn.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, store: StateStore, bucket: str, limit: int):
+        self.transport = transport
+        self.store = store
+        self.bucket = bucket
+        self.limit = limit
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        while True:
+            now = time.time()
+            count = await asyncio.to_thread(self.store.hit, self.bucket, int(now))
+            if count <= self.limit:
+                break
+            await sleep_within_deadline(int(now) + 1 - now, "лимит запросов к банку")
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def _network_transport() -> httpx.AsyncHTTPTransport:
+    """Сетевой транспорт с пулом по настройкам: limits клиента к переданному транспорту не применяются."""
+    return httpx.AsyncHTTPTransport(limits=httpx.Limits(
+        max_connections=settings.bank_max_connections,
+        max_keepalive_connections=settings.bank_max_keepalive_connections))
+
+
+def _create_transport(bank_name: str) -> httpx.AsyncBaseTransport:
+    mode = settings.bank_http_mode
+    if mode == "live":
+        return _network_transport()
+    if mode == "record":
+        return RecordingTransport(get_cassette(bank_name), _network_transport())
+    if mode == "replay":
+        replay_latency = settings.cassette_replay_latency == "recorded"
+        return ReplayTransport(get_cassette(bank_name), replay_latency)
+    raise ValueError(f"Неизвестный режим HTTP-транспорта '{mode}', допустимы: {HTTP_MODES}")
+
+
+def create_bank_client(bank_name: str, breaker: Optional[CircuitBreaker] = None) -> httpx.AsyncClient:
+    """
+    Создаёт HTTP-клиент для обращений к API банка.
+    В зависимости от settings.bank_http_mode запросы идут в сеть (live),
+    в сеть с записью в кассету (record) или обслуживаются из кассеты (replay).
+    При settings.bank_rate_limit > 0 запросы ограничиваются общим для всех процессов лимитом.
+    С breaker запросы при разомкнутой цепи завершаются CircuitOpenError без обращения к банку.
+    Размер пула и таймауты — из settings.bank_max_connections, bank_request_timeout и bank_pool_timeout.
+    """
+    transport = _create_transport(bank_name)
+    if settings.bank_rate_limit > 0:
+        transport = RateLimitedTransport(transport, state_store, f"bank:{bank_name}", settings.bank_rate_limit)
+    if breaker is not None:
+        transport = CircuitBreakerTransport(transport, breaker)
+    return httpx.AsyncClient(transport=transport,
+                             timeout=httpx.Timeout(settings.bank_request_timeout, pool=settings.bank_pool_timeout))
+
+
+def save_cassettes():
+    """Сохраняет на диск все кассеты, в которые были записаны новые взаимодействия."""
+    for cassette in _cassettes.values():
+        try:
+            cassette.save()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения кассеты {cassette.path}: {e}")
+
+
+atexit.register(save_cassettes)
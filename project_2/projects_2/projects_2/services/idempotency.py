@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from config import settings
+from services.state_store import StateStore, state_store
+
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyKeyReused(Exception):
+    """Ключ уже использован для запроса с другими параметрами."""
+
+
+class IdempotencyInProgress(Exception):
+    """Первый запрос с этим ключом ещё выполняется дольше, чем мы готовы ждать."""
+
+
+def request_fingerprint(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Результаты запросов по клиентскому ключу Idempotency-Key в общем хранилище
+    (индекс по (namespace, key), срок жизни settings.idempotency_ttl). Ключ действует
+    в пределах банка и клиента: одинаковые ключи разных клиентов не пересекаются.
+    Повтор с тем же ключом получает сохранённый результат без обращения к банку.
+    Одновременные дубликаты ждут первую попытку: в процессе — на её future,
+    между процессами — через аренду ключа и опрос хранилища.
+    Сохраняются только результаты, которые operation вернула; если она
+    завершилась исключением, ключ освобождается и запрос можно повторить.
+    """
+
+    NAMESPACE = "idempotency"
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, store: StateStore, ttl: float, lock_ttl: float, wait_timeout: float):
+        self.store = store
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def scoped_key(bank_name: str, client_id: str, key: str) -> str:
+        """Ключ записи и аренды: клиентский ключ в пространстве банка и клиента."""
+        return json.dumps([bank_name, client_id, key], ensure_ascii=False, separators=(",", ":"))
+
+    async def execute(self, bank_name: str, client_id: str, key: str, fingerprint: str,
+                      operation: Callable[[], Awaitable[Tuple[int, Any]]]) -> Tuple[int, Any, bool]:
+        """
+        Выполняет operation один раз для ключа key клиента client_id в банке bank_name.
+        operation возвращает (HTTP-статус, тело).
+        Возвращает (статус, тело, replayed), где replayed — результат взят из хранилища.
+        """
+        key = self.scoped_key(bank_name, client_id, key)
+        deadline = time.monotonic() + self.wait_timeout
+        lease_name = f"idempotency:{key}"
+        while True:
+            stored = await self._get_stored(key, fingerprint)
+            if stored is not None:
+                return stored
+
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise IdempotencyInProgress(key)
+                await asyncio.wait([inflight], timeout=remaining)
+                continue
+
+            # Future регистрируется до первого await: аренда своего процесса берётся повторно,
+            # поэтому дубликаты в процессе разводятся только через _inflight.
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[key] = future
+            leased = False
+            try:
+                leased = await asyncio.to_thread(self.store.acquire_lease, lease_name, self.lock_ttl)
+                if leased:
+                    # Первая попытка могла завершиться в другом процессе между проверкой и арендой.
+                    stored = await self._get_stored(key, fingerprint)
+                    if stored is not None:
+                        return stored
+                    status, body = await operation()
+                    await asyncio.to_thread(self.store.set, self.NAMESPACE, key,
+                                            {"fingerprint": fingerprint, "status": status, "body": body}, self.ttl)
+                    return status, body, False
+            finally:
+                del self._inflight[key]
+                future.set_result(None)
+                if leased:
+                    await asyncio.to_thread(self.store.release_lease, lease_name)
+
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress(key)
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    async def _get_stored(self, key: str, fingerprint: str):
+        record = await asyncio.to_thread(self.store.get, self.NAMESPACE, key)
+        if record is None:
+            return None
+        if record["fingerprint"] != fingerprint:
+            raise IdempotencyKeyReused(key)
+        logger.info(f"Запрос с ключом идемпотентности {key} повторён, отдан сохранённый результат")
+        return record["status"], record["body"], True
+
+
+idempotency_store = IdempotencyStore(state_store, settings.idempotency_ttl, settings.idempotency_lock_ttl,
+                                     settings.idempotency_wait_timeout)
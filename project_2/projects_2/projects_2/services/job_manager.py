@@ -0,0 +1,390 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from typing import Dict, List, Any, Optional, Set, Tuple
+
+from config import settings
+from utils.paths import data_path
+from services.multi_bank_service import multi_bank_service
+
+
+logger = logging.getLogger(__name__)
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_CANCELLED = "cancelled"
+
+ITEM_PENDING = "pending"
+ITEM_DONE = "done"
+ITEM_FAILED = "failed"
+
+ACTIVE_JOB_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+
+class JobNotFound(Exception):
+    pass
+
+
+class JobManagerStopped(Exception):
+    """Менеджер останавливается и не принимает новые задачи."""
+
+
+class JobStore:
+    """
+    Хранилище задач агрегации в SQLite.
+    Каждая задача разбита на единицы работы (банк, клиент) — по ним считается
+    прогресс, отдаются частичные результаты и продолжается работа после рестарта.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_database(self):
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                request TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_items (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                bank_name TEXT NOT NULL,
+                client_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                claimed_by TEXT,
+                claimed_at REAL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+        ''')
+        item_columns = {row["name"] for row in conn.execute("PRAGMA table_info(job_items)")}
+        for column, column_type in (("claimed_by", "TEXT"), ("claimed_at", "REAL")):
+            if column not in item_columns:
+                conn.execute(f"ALTER TABLE job_items ADD COLUMN {column} {column_type}")
+        conn.commit()
+        conn.close()
+
+    def create_job(self, bank_requests: List[Dict[str, Any]]) -> Tuple[str, List[int]]:
+        """Создаёт задачу и её единицы работы; задача без единиц работы сразу завершена."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        items = [
+            (job_id, seq, bank_name, client_id, ITEM_PENDING, now)
+            for seq, (bank_name, client_id) in enumerate(
+                (req["bank_name"], client_id) for req in bank_requests for client_id in req["client_ids"])
+        ]
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, request, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED if items else JOB_COMPLETED, json.dumps(bank_requests, ensure_ascii=False),
+                 len(items), now, now))
+            conn.executemany(
+                "INSERT INTO job_items (job_id, seq, bank_name, client_id, status, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                items)
+        conn.close()
+        return job_id, [item[1] for item in items]
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
+
+    def get_item(self, job_id: str, seq: int) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM job_items WHERE job_id = ? AND seq = ?", (job_id, seq)).fetchone()
+        conn.close()
+        return dict(row) if row else None
+
+    def set_status(self, job_id: str, status: str, only_if_active: bool = True) -> bool:
+        conn = self._connect()
+        with conn:
+            if only_if_active:
+                cursor = conn.execute(
+                    f"UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status IN ({','.join('?' * len(ACTIVE_JOB_STATUSES))})",
+                    (status, time.time(), job_id, *ACTIVE_JOB_STATUSES))
+            else:
+                cursor = conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                                      (status, time.time(), job_id))
+        conn.close()
+        return cursor.rowcount > 0
+
+    def claim_item(self, job_id: str, seq: int, owner: str, claim_ttl: float) -> bool:
+        """
+        Закрепляет единицу работы за процессом owner. Между процессами uvicorn
+        единица достаётся одному; захват упавшего процесса истекает через claim_ttl.
+        Действующий захват не выдаётся повторно и самому owner: единица, которую он
+        уже выполняет, не должна выполниться второй раз.
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE job_items SET claimed_by = ?, claimed_at = ? "
+                "WHERE job_id = ? AND seq = ? AND status = ? "
+                "AND (claimed_by IS NULL OR claimed_at < ?)",
+                (owner, now, job_id, seq, ITEM_PENDING, now - claim_ttl))
+        conn.close()
+        return cursor.rowcount > 0
+
+    def renew_claims(self, owner: str, items: List[Tuple[str, int]]):
+        """Продлевает захваты выполняющихся единиц работы, чтобы они не истекли за claim_ttl."""
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "UPDATE job_items SET claimed_at = ? WHERE job_id = ? AND seq = ? AND claimed_by = ? AND status = ?",
+                [(now, job_id, seq, owner, ITEM_PENDING) for job_id, seq in items])
+        conn.close()
+
+    def finish_item(self, job_id: str, seq: int, status: str, result: Optional[Any] = None,
+                    error: Optional[str] = None) -> Dict[str, Any]:
+        """Фиксирует результат единицы работы и обновляет прогресс задачи в одной транзакции."""
+        now = time.time()
+        counter = "done" if status == ITEM_DONE else "failed"
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE job_items SET status = ?, result = ?, error = ?, updated_at = ? "
+                "WHERE job_id = ? AND seq = ? AND status = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error, now,
+                 job_id, seq, ITEM_PENDING))
+            if cursor.rowcount:
+                conn.execute(f"UPDATE jobs SET {counter} = {counter} + 1, updated_at = ? WHERE id = ?", (now, job_id))
+                conn.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND done + failed >= total AND status = ?",
+                    (JOB_COMPLETED, now, job_id, JOB_RUNNING))
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        conn.close()
+        return dict(row)
+
+    def pending_items(self, claim_ttl: float) -> List[Tuple[str, int]]:
+        """
+        Незавершённые и никем не захваченные единицы работы активных задач —
+        для возобновления после рестарта и подхвата работы упавших процессов.
+        """
+        conn = self._connect()
+        rows = conn.execute(
+            f"SELECT i.job_id, i.seq FROM job_items i JOIN jobs j ON j.id = i.job_id "
+            f"WHERE i.status = ? AND j.status IN ({','.join('?' * len(ACTIVE_JOB_STATUSES))}) "
+            f"AND (i.claimed_by IS NULL OR i.claimed_at < ?) "
+            f"ORDER BY j.created_at, i.seq",
+            (ITEM_PENDING, *ACTIVE_JOB_STATUSES, time.time() - claim_ttl)).fetchall()
+        conn.close()
+        return [(row["job_id"], row["seq"]) for row in rows]
+
+    def results_page(self, job_id: str, cursor: int, limit: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Завершённые единицы работы с seq > cursor, не более limit штук (keyset-пагинация)."""
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT seq, bank_name, client_id, status, result, error FROM job_items "
+            "WHERE job_id = ? AND seq > ? AND status != ? ORDER BY seq LIMIT ?",
+            (job_id, cursor, ITEM_PENDING, limit + 1)).fetchall()
+        conn.close()
+        items = [dict(row) for row in rows[:limit]]
+        for item in items:
+            item["result"] = json.loads(item["result"]) if item["result"] else None
+        next_cursor = items[-1]["seq"] if len(rows) > limit else None
+        return items, next_cursor
+
+    def checkpoint(self):
+        """Переносит WAL в основной файл базы и усекает его (при остановке приложения)."""
+        conn = self._connect()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+
+
+class JobManager:
+    """
+    Выполняет задачи агрегации в фоне пулом из settings.job_workers воркеров.
+    Очередь состоит из единиц работы (банк, клиент); состояние хранится в JobStore,
+    поэтому незавершённые задачи продолжаются после перезапуска процесса.
+    При нескольких процессах uvicorn каждая единица работы выполняется тем процессом,
+    который первым её захватил; незахваченные единицы периодически подбираются из JobStore.
+    """
+
+    def __init__(self, store: JobStore, workers: int, claim_ttl: float):
+        self.store = store
+        self.workers = workers
+        self.claim_ttl = claim_ttl
+        self.owner_id = uuid.uuid4().hex
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._queued: Set[Tuple[str, int]] = set()
+        self._worker_tasks: List[asyncio.Task] = []
+        self._running: Dict[str, Set[asyncio.Task]] = {}
+        # Единицы работы, захваченные этим процессом и ещё выполняющиеся.
+        self._claimed: Set[Tuple[str, int]] = set()
+        self._cancelled: Set[str] = set()
+        self._accepting = True
+
+    async def start(self):
+        if self._worker_tasks:
+            return
+        self._accepting = True
+        resumed = await self._enqueue_pending()
+        if resumed:
+            logger.info(f"Возобновлено {resumed} незавершённых единиц работы задач агрегации")
+        self._worker_tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._worker_tasks.append(asyncio.create_task(self._sweeper()))
+        logger.info(f"Запущено {self.workers} воркеров задач агрегации")
+
+    def _enqueue(self, job_id: str, seq: int):
+        if (job_id, seq) not in self._queued and (job_id, seq) not in self._claimed:
+            self._queued.add((job_id, seq))
+            self._queue.put_nowait((job_id, seq))
+
+    async def _enqueue_pending(self) -> int:
+        pending = await asyncio.to_thread(self.store.pending_items, self.claim_ttl)
+        before = len(self._queued)
+        for job_id, seq in pending:
+            self._enqueue(job_id, seq)
+        return len(self._queued) - before
+
+    async def _sweeper(self):
+        """
+        Продлевает захваты выполняющихся единиц работы и подбирает единицы,
+        поставленные другими процессами или брошенные упавшими.
+        """
+        while True:
+            await asyncio.sleep(self.claim_ttl / 2)
+            try:
+                if self._claimed:
+                    await asyncio.to_thread(self.store.renew_claims, self.owner_id, list(self._claimed))
+                picked = await self._enqueue_pending()
+                if picked:
+                    logger.info(f"Подобрано {picked} единиц работы задач агрегации из общего хранилища")
+            except Exception as e:
+                logger.error(f"Ошибка при подборе единиц работы задач агрегации: {e}")
+
+    async def stop(self, timeout: float = 0):
+        """
+        Перестаёт принимать задачи и брать новые единицы работы, ждёт выполняющиеся
+        не дольше timeout, затем останавливает воркеры. Прерванные и невзятые единицы
+        остаются в JobStore и будут выполнены после перезапуска.
+        """
+        self._accepting = False
+        running = [task for tasks in self._running.values() for task in tasks]
+        if running and timeout > 0:
+            _, pending = await asyncio.wait(running, timeout=timeout)
+            if pending:
+                logger.warning(f"Не дождались {len(pending)} единиц работы задач агрегации, они будут возобновлены")
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        await asyncio.to_thread(self.store.checkpoint)
+
+    async def submit(self, bank_requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if not self._accepting:
+            raise JobManagerStopped()
+        job_id, seqs = await asyncio.to_thread(self.store.create_job, bank_requests)
+        for seq in seqs:
+            self._enqueue(job_id, seq)
+        logger.info(f"Задача агрегации {job_id} поставлена в очередь: {len(seqs)} единиц работы")
+        return await self.get(job_id)
+
+    async def get(self, job_id: str) -> Dict[str, Any]:
+        job = await asyncio.to_thread(self.store.get_job, job_id)
+        if job is None:
+            raise JobNotFound(job_id)
+        return job
+
+    async def results(self, job_id: str, cursor: int = -1, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        await self.get(job_id)
+        return await asyncio.to_thread(self.store.results_page, job_id, cursor, limit)
+
+    async def cancel(self, job_id: str) -> Dict[str, Any]:
+        await self.get(job_id)
+        if await asyncio.to_thread(self.store.set_status, job_id, JOB_CANCELLED):
+            self._cancelled.add(job_id)
+            for task in self._running.pop(job_id, set()):
+                task.cancel()
+            logger.info(f"Задача агрегации {job_id} отменена")
+        return await self.get(job_id)
+
+    async def _worker(self, index: int):
+        while True:
+            job_id, seq = await self._queue.get()
+            self._queued.discard((job_id, seq))
+            try:
+                await self._process_item(job_id, seq)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Воркер {index}: ошибка при обработке {job_id}#{seq}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _process_item(self, job_id: str, seq: int):
+        if job_id in self._cancelled or not self._accepting:
+            return
+        job = await asyncio.to_thread(self.store.get_job, job_id)
+        if job is None or job["status"] not in ACTIVE_JOB_STATUSES:
+            return
+        item = await asyncio.to_thread(self.store.get_item, job_id, seq)
+        if item is None or item["status"] != ITEM_PENDING:
+            return
+        if not await asyncio.to_thread(self.store.claim_item, job_id, seq, self.owner_id, self.claim_ttl):
+            return
+        self._claimed.add((job_id, seq))
+        try:
+            await self._run_item(job, item)
+        finally:
+            self._claimed.discard((job_id, seq))
+
+    async def _run_item(self, job: Dict[str, Any], item: Dict[str, Any]):
+        job_id, seq = job["id"], item["seq"]
+        if job["status"] == JOB_QUEUED:
+            await asyncio.to_thread(self.store.set_status, job_id, JOB_RUNNING)
+
+        task = asyncio.create_task(multi_bank_service.fetch_client_accounts(item["bank_name"], item["client_id"]))
+        self._running.setdefault(job_id, set()).add(task)
+        try:
+            accounts = await task
+            error = None
+        except asyncio.CancelledError:
+            if job_id in self._cancelled:
+                return
+            raise
+        except Exception as e:
+            accounts = None
+            error = str(e) or type(e).__name__
+            logger.error(f"Задача {job_id}: ошибка для клиента {item['client_id']} в банке {item['bank_name']}: {error}")
+        finally:
+            running = self._running.get(job_id)
+            if running is not None:
+                running.discard(task)
+                if not running:
+                    self._running.pop(job_id, None)
+
+        if error is not None:
+            await asyncio.to_thread(self.store.finish_item, job_id, seq, ITEM_FAILED, None, error)
+        else:
+            await asyncio.to_thread(self.store.finish_item, job_id, seq, ITEM_DONE, accounts)
+
+
+job_manager = JobManager(JobStore(str(data_path(settings.jobs_db_path))), settings.job_workers, settings.job_claim_ttl)
@@ -0,0 +1,487 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from utils.money import account_balance, normalize_account, signed_minor, to_minor
+from utils.paths import data_path
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalStore:
+    """
+    Последние успешно полученные от банков данные (last-known-good) в SQLite.
+    В отличие от кэша счетов, записи не истекают: если банк недоступен,
+    из них отдаются счета с балансами и транзакциями с пометкой source=cache.
+
+    Заодно ведётся журнал изменений для дельта-синхронизации: каждый счёт, баланс
+    и транзакция хранятся отдельной сущностью с номером seq последнего изменения.
+    Сущность получает новый seq, только когда её данные действительно изменились,
+    поэтому выборка seq > cursor растёт с объёмом изменений, а не истории.
+    """
+
+    # Поля записи счёта, которые не входят в сущность account: они хранятся
+    # отдельными сущностями или меняются при каждой синхронизации.
+    ACCOUNT_EXCLUDED_FIELDS = ("balances", "transactions", "as_of", "source", "balance_minor", "balance_currency")
+
+    UPSERT_TRANSACTION = (
+        "INSERT INTO transactions (bank_name, client_id, entity_id, account_id, search_owner, booked_at, amount_minor, "
+        "currency, category, counterparty, description) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (bank_name, client_id, entity_id) DO UPDATE SET booked_at = excluded.booked_at, "
+        "amount_minor = excluded.amount_minor, currency = excluded.currency, category = excluded.category, "
+        "counterparty = excluded.counterparty, description = excluded.description")
+
+    # Порядок выдачи поиска: от новых к старым или по релевантности (bm25: контрагент весит
+    # вдвое больше описания). bm25 считает частоту слов по всему индексу, поэтому для частых
+    # слов на миллионах транзакций заметно медленнее сортировки по дате.
+    SEARCH_ORDERS = {
+        "date": ("COALESCE(t.booked_at, 0)", "(sort_key, id) < (?, ?)", "sort_key DESC, id DESC"),
+        "relevance": ("bm25(transactions_fts, 0.0, 1.0, 2.0)", "(sort_key, id) > (?, ?)", "sort_key, id"),
+    }
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_database(self):
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        balances_existed = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'client_balances'").fetchone() is not None
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS client_syncs (
+                bank_name TEXT NOT NULL,
+                client_id TEXT NOT NULL,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (bank_name, client_id)
+            );
+            CREATE TABLE IF NOT EXISTS accounts (
+                bank_name TEXT NOT NULL,
+                client_id TEXT NOT NULL,
+                account_id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                as_of REAL NOT NULL,
+                PRIMARY KEY (bank_name, client_id, account_id)
+            );
+            CREATE TABLE IF NOT EXISTS entities (
+                bank_name TEXT NOT NULL,
+                client_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                entity_id TEXT NOT NULL,
+                data TEXT,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                seq INTEGER NOT NULL,
+                changed_at REAL NOT NULL,
+                PRIMARY KEY (bank_name, client_id, kind, entity_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_entities_seq ON entities (seq);
+            CREATE TABLE IF NOT EXISTS client_balances (
+                client_id TEXT NOT NULL,
+                bank_name TEXT NOT NULL,
+                currency TEXT NOT NULL,
+                total_minor INTEGER NOT NULL,
+                accounts INTEGER NOT NULL,
+                as_of REAL NOT NULL,
+                PRIMARY KEY (client_id, bank_name, currency)
+            );
+        ''')
+        # Транзакции в колоночном виде для аналитики и поиска: дата, сумма со знаком в минимальных
+        # единицах, категория, контрагент и описание уже извлечены из JSON. Обновляются вместе
+        # с сущностями transaction, полнотекстовый индекс transactions_fts — триггерами.
+        transaction_columns = {row["name"] for row in conn.execute("PRAGMA table_info(transactions)")}
+        if transaction_columns and "search_owner" not in transaction_columns:
+            # Таблица без полей поиска пересоздаётся из сущностей.
+            conn.execute("DROP TABLE transactions")
+            conn.execute("DROP TABLE IF EXISTS transactions_fts")
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY,
+                bank_name TEXT NOT NULL,
+                client_id TEXT NOT NULL,
+                entity_id TEXT NOT NULL,
+                account_id TEXT NOT NULL,
+                search_owner TEXT NOT NULL,
+                booked_at INTEGER,
+                amount_minor INTEGER NOT NULL,
+                currency TEXT NOT NULL,
+                category TEXT,
+                counterparty TEXT,
+                description TEXT,
+                UNIQUE (bank_name, client_id, entity_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_transactions_client ON transactions (client_id, booked_at);
+            CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+                search_owner, description, counterparty,
+                content='transactions', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+                INSERT INTO transactions_fts (rowid, search_owner, description, counterparty)
+                VALUES (new.id, new.search_owner, new.description, new.counterparty);
+            END;
+            CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+                INSERT INTO transactions_fts (transactions_fts, rowid, search_owner, description, counterparty)
+                VALUES ('delete', old.id, old.search_owner, old.description, old.counterparty);
+            END;
+            CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE ON transactions BEGIN
+                INSERT INTO transactions_fts (transactions_fts, rowid, search_owner, description, counterparty)
+                VALUES ('delete', old.id, old.search_owner, old.description, old.counterparty);
+                INSERT INTO transactions_fts (rowid, search_owner, description, counterparty)
+                VALUES (new.id, new.search_owner, new.description, new.counterparty);
+            END;
+        ''')
+        if "search_owner" not in transaction_columns:
+            rows = conn.execute("SELECT bank_name, client_id, entity_id, data FROM entities "
+                                "WHERE kind = 'transaction' AND deleted = 0").fetchall()
+            conn.executemany(self.UPSERT_TRANSACTION, [
+                self._transaction_row(row["bank_name"], row["client_id"], row["entity_id"], json.loads(row["data"]))
+                for row in rows])
+        # Текущий баланс в минимальных единицах валюты — для итогов и сортировки в SQL без разбора JSON.
+        account_columns = {row["name"] for row in conn.execute("PRAGMA table_info(accounts)")}
+        for column, column_type in (("balance_minor", "INTEGER"), ("currency", "TEXT")):
+            if column not in account_columns:
+                conn.execute(f"ALTER TABLE accounts ADD COLUMN {column} {column_type}")
+        if not balances_existed:
+            self._backfill_balances(conn)
+        # seq последнего изменения транзакций клиента в банке — водяной знак для кэша аналитики.
+        sync_columns = {row["name"] for row in conn.execute("PRAGMA table_info(client_syncs)")}
+        if "transactions_seq" not in sync_columns:
+            conn.execute("ALTER TABLE client_syncs ADD COLUMN transactions_seq INTEGER NOT NULL DEFAULT 0")
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def _backfill_balances(conn: sqlite3.Connection):
+        """
+        Заполняет только что созданную client_balances по уже сохранённым счетам, чтобы сводка
+        клиента была доступна до его следующей синхронизации. Счетам, записанным до появления
+        колонок balance_minor и currency, они заполняются из JSON счёта.
+        """
+        rows = conn.execute("SELECT rowid, data FROM accounts WHERE balance_minor IS NULL").fetchall()
+        updates = []
+        for row in rows:
+            money = account_balance(normalize_account(json.loads(row["data"])))
+            if money is not None:
+                updates.append((money.minor, money.currency, row["rowid"]))
+        conn.executemany("UPDATE accounts SET balance_minor = ?, currency = ? WHERE rowid = ?", updates)
+        conn.execute(
+            "INSERT INTO client_balances (client_id, bank_name, currency, total_minor, accounts, as_of) "
+            "SELECT client_id, bank_name, currency, SUM(balance_minor), COUNT(*), MAX(as_of) FROM accounts "
+            "WHERE balance_minor IS NOT NULL AND currency IS NOT NULL GROUP BY client_id, bank_name, currency")
+
+    def save_client_accounts(self, bank_name: str, client_id: str, accounts: List[Dict[str, Any]], as_of: float):
+        """Заменяет сохранённые счета клиента полученными от банка."""
+        rows = [(bank_name, client_id, account.get("accountId") or account.get("id"),
+                 json.dumps(account, ensure_ascii=False), as_of, account.get("balance_minor"),
+                 account.get("balance_currency"))
+                for account in accounts if account.get("accountId") or account.get("id")]
+        entities = self._split_entities(accounts)
+        conn = self._connect()
+        with conn:
+            # Номер seq выдаётся под блокировкой записи, чтобы процессы не выдали одинаковые.
+            conn.execute("BEGIN IMMEDIATE")
+            changes = self._record_changes(conn, bank_name, client_id, entities, as_of)
+            transactions_seq = self._save_transactions(conn, bank_name, client_id, accounts, changes)
+            conn.execute("DELETE FROM accounts WHERE bank_name = ? AND client_id = ?", (bank_name, client_id))
+            conn.executemany(
+                "INSERT INTO accounts (bank_name, client_id, account_id, data, as_of, balance_minor, currency) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute(
+                "INSERT INTO client_syncs (bank_name, client_id, synced_at, transactions_seq) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (bank_name, client_id) DO UPDATE SET synced_at = excluded.synced_at, "
+                "transactions_seq = MAX(transactions_seq, excluded.transactions_seq)",
+                (bank_name, client_id, as_of, transactions_seq))
+            # Итоги клиента по банку пересчитываются только из счетов этой синхронизации.
+            conn.execute("DELETE FROM client_balances WHERE bank_name = ? AND client_id = ?", (bank_name, client_id))
+            conn.executemany(
+                "INSERT INTO client_balances (client_id, bank_name, currency, total_minor, accounts, as_of) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(client_id, bank_name, currency, total, count, as_of)
+                 for currency, (total, count) in self._balance_totals(accounts).items()])
+        conn.close()
+
+    @staticmethod
+    def _balance_totals(accounts: List[Dict[str, Any]]) -> Dict[str, Tuple[int, int]]:
+        """Сумма текущих балансов (в минимальных единицах) и число счетов по валютам."""
+        totals: Dict[str, Tuple[int, int]] = {}
+        for account in accounts:
+            money = account_balance(account)
+            if money is None:
+                continue
+            total, count = totals.get(money.currency, (0, 0))
+            totals[money.currency] = (total + money.minor, count + 1)
+        return totals
+
+    def _save_transactions(self, conn: sqlite3.Connection, bank_name: str, client_id: str,
+                           accounts: List[Dict[str, Any]], changes: List[Tuple[str, str, int, bool]]) -> int:
+        """Переносит изменившиеся транзакции в колоночную таблицу; возвращает seq последнего такого изменения (или 0)."""
+        changed = [(entity_id, seq, deleted) for kind, entity_id, seq, deleted in changes if kind == "transaction"]
+        if not changed:
+            return 0
+        by_entity_id = {f"{account.get('accountId') or account.get('id')}:{transaction['transactionId']}": transaction
+                        for account in accounts for transaction in account.get("transactions") or []
+                        if transaction.get("transactionId")}
+        conn.executemany(self.UPSERT_TRANSACTION, [
+            self._transaction_row(bank_name, client_id, entity_id, by_entity_id[entity_id])
+            for entity_id, _, deleted in changed if not deleted])
+        conn.executemany("DELETE FROM transactions WHERE bank_name = ? AND client_id = ? AND entity_id = ?",
+                         [(bank_name, client_id, entity_id) for entity_id, _, deleted in changed if deleted])
+        return max(seq for _, seq, _ in changed)
+
+    @staticmethod
+    def search_owner(client_id: str) -> str:
+        """
+        Токен клиента в полнотекстовом индексе. Идентификатор клиента токенизатор разбил бы
+        на частые слова ("client", "1"); хэш — одно редкое слово, и пересечение с ним
+        сразу сужает поиск до транзакций клиента.
+        """
+        return "c" + hashlib.blake2b(client_id.encode("utf-8"), digest_size=8).hexdigest()
+
+    @classmethod
+    def _transaction_row(cls, bank_name: str, client_id: str, entity_id: str, transaction: Dict[str, Any]) -> Tuple:
+        """Строка для UPSERT_TRANSACTION."""
+        return (bank_name, client_id, entity_id, entity_id.split(":", 1)[0], cls.search_owner(client_id),
+                *cls._transaction_columns(transaction))
+
+    @staticmethod
+    def _transaction_columns(transaction: Dict[str, Any]) -> Tuple[Optional[int], int, str, Optional[str], Optional[str],
+                                                                   Optional[str]]:
+        """(booked_at в секундах UTC, сумма со знаком в минимальных единицах, валюта, категория, контрагент, описание)."""
+        amount = transaction.get("amount") or {}
+        currency = amount.get("currency") or "RUB"
+        minor = amount.get("minor")
+        if minor is None:
+            try:
+                minor = to_minor(amount.get("amount"), currency) or 0
+            except ValueError:
+                minor = 0
+        booked_at = None
+        booking_time = transaction.get("bookingDateTime") or transaction.get("valueDateTime")
+        if booking_time:
+            try:
+                booked_at = int(datetime.fromisoformat(booking_time.replace("Z", "+00:00")).timestamp())
+            except ValueError:
+                logger.warning(f"Некорректная дата транзакции {transaction.get('transactionId')}: {booking_time}")
+        merchant = transaction.get("merchantDetails") or {}
+        debit = (transaction.get("creditDebitIndicator") or "").lower() == "debit"
+        party_account = transaction.get("creditorAccount" if debit else "debtorAccount") or {}
+        category = merchant.get("merchantCategoryCode") or (transaction.get("bankTransactionCode") or {}).get("code")
+        counterparty = (merchant.get("merchantName") or transaction.get("creditorName" if debit else "debtorName")
+                        or party_account.get("name") or transaction.get("transactionInformation"))
+        return (booked_at, signed_minor(minor, transaction.get("creditDebitIndicator")), currency.upper(),
+                category, counterparty, transaction.get("transactionInformation"))
+
+    @classmethod
+    def _split_entities(cls, accounts: List[Dict[str, Any]]) -> Dict[Tuple[str, str], str]:
+        """Раскладывает записи счетов на сущности {(kind, entity_id): канонический JSON}."""
+        entities = {}
+        for account in accounts:
+            account_id = account.get("accountId") or account.get("id")
+            if not account_id:
+                continue
+            data = {key: value for key, value in account.items() if key not in cls.ACCOUNT_EXCLUDED_FIELDS}
+            entities[("account", account_id)] = data
+            for balance in account.get("balances") or []:
+                entities[("balance", f"{account_id}:{balance.get('type')}")] = balance
+            for transaction in account.get("transactions") or []:
+                if transaction.get("transactionId"):
+                    entities[("transaction", f"{account_id}:{transaction['transactionId']}")] = transaction
+        return {key: json.dumps(data, ensure_ascii=False, sort_keys=True) for key, data in entities.items()}
+
+    @staticmethod
+    def _next_seq(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM entities").fetchone()[0] + 1
+
+    def _record_changes(self, conn: sqlite3.Connection, bank_name: str, client_id: str,
+                        entities: Dict[Tuple[str, str], str], changed_at: float) -> List[Tuple[str, str, int, bool]]:
+        """
+        Обновляет сущности клиента и выдаёт новый seq изменившимся.
+        Пропавшие счета и балансы помечаются удалёнными; транзакции — только вместе
+        со своим счётом, а не когда выпадают из окна выдачи банка.
+        Возвращает изменения [(kind, entity_id, seq, удалена ли)].
+        """
+        existing = {(row["kind"], row["entity_id"]): (row["data"], row["deleted"]) for row in conn.execute(
+            "SELECT kind, entity_id, data, deleted FROM entities WHERE bank_name = ? AND client_id = ?",
+            (bank_name, client_id))}
+        seq = self._next_seq(conn)
+        upserts = []
+        for (kind, entity_id), data in entities.items():
+            if existing.get((kind, entity_id)) != (data, 0):
+                upserts.append((bank_name, client_id, kind, entity_id, data, seq, changed_at))
+                seq += 1
+        account_ids = {entity_id for kind, entity_id in entities if kind == "account"}
+        deletions = []
+        for (kind, entity_id), (_, deleted) in existing.items():
+            if deleted or (kind, entity_id) in entities:
+                continue
+            if kind != "transaction" or entity_id.split(":", 1)[0] not in account_ids:
+                deletions.append((bank_name, client_id, kind, entity_id, None, seq, changed_at))
+                seq += 1
+        conn.executemany(
+            "INSERT INTO entities (bank_name, client_id, kind, entity_id, data, deleted, seq, changed_at) "
+            "VALUES (?, ?, ?, ?, ?, 0, ?, ?) "
+            "ON CONFLICT (bank_name, client_id, kind, entity_id) DO UPDATE SET data = excluded.data, "
+            "deleted = 0, seq = excluded.seq, changed_at = excluded.changed_at", upserts)
+        conn.executemany(
+            "UPDATE entities SET data = ?, deleted = 1, seq = ?, changed_at = ? "
+            "WHERE bank_name = ? AND client_id = ? AND kind = ? AND entity_id = ?",
+            [(data, row_seq, at, bank, client, kind, entity_id)
+             for bank, client, kind, entity_id, data, row_seq, at in deletions])
+        return ([(kind, entity_id, row_seq, False) for _, _, kind, entity_id, _, row_seq, _ in upserts]
+                + [(kind, entity_id, row_seq, True) for _, _, kind, entity_id, _, row_seq, _ in deletions])
+
+    def changes_since(self, after_seq: int, limit: int, bank_names: Optional[List[str]] = None,
+                      client_ids: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], int, bool]:
+        """
+        Возвращает (изменения с seq > after_seq по возрастанию seq, seq для следующего запроса, есть ли ещё).
+        Для каждой сущности отдаётся только её последнее состояние.
+        """
+        query = "SELECT * FROM entities WHERE seq > ?"
+        params: List[Any] = [after_seq]
+        if bank_names:
+            query += f" AND bank_name IN ({','.join('?' * len(bank_names))})"
+            params.extend(bank_names)
+        if client_ids:
+            query += f" AND client_id IN ({','.join('?' * len(client_ids))})"
+            params.extend(client_ids)
+        query += " ORDER BY seq LIMIT ?"
+        params.append(limit + 1)
+
+        conn = self._connect()
+        # Изменения и текущий максимум seq читаются из одного снимка базы.
+        conn.execute("BEGIN")
+        rows = conn.execute(query, params).fetchall()
+        max_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM entities").fetchone()[0]
+        conn.rollback()
+        conn.close()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        changes = [{
+            "seq": row["seq"],
+            "bank_name": row["bank_name"],
+            "client_id": row["client_id"],
+            "kind": row["kind"],
+            "id": row["entity_id"],
+            "op": "delete" if row["deleted"] else "upsert",
+            "data": None if row["deleted"] else json.loads(row["data"]),
+            "changed_at": row["changed_at"],
+        } for row in rows]
+        next_seq = rows[-1]["seq"] if has_more else max(max_seq, after_seq)
+        return changes, next_seq, has_more
+
+    def clear_bank(self, bank_name: str):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Сущности не удаляются, а помечаются удалёнными, чтобы клиенты дельта-синхронизации узнали об этом.
+            seq = self._next_seq(conn)
+            rows = conn.execute("SELECT client_id, kind, entity_id FROM entities WHERE bank_name = ? AND deleted = 0 "
+                                "ORDER BY client_id, kind, entity_id", (bank_name,)).fetchall()
+            conn.executemany(
+                "UPDATE entities SET data = NULL, deleted = 1, seq = ?, changed_at = ? "
+                "WHERE bank_name = ? AND client_id = ? AND kind = ? AND entity_id = ?",
+                [(seq + i, time.time(), bank_name, row["client_id"], row["kind"], row["entity_id"])
+                 for i, row in enumerate(rows)])
+            conn.execute("DELETE FROM accounts WHERE bank_name = ?", (bank_name,))
+            conn.execute("DELETE FROM client_syncs WHERE bank_name = ?", (bank_name,))
+            conn.execute("DELETE FROM client_balances WHERE bank_name = ?", (bank_name,))
+            conn.execute("DELETE FROM transactions WHERE bank_name = ?", (bank_name,))
+        conn.close()
+
+    def load_client_accounts(self, bank_name: str, client_id: str) -> Optional[Tuple[float, List[Dict[str, Any]]]]:
+        """Возвращает (момент синхронизации, счета) или None, если клиент ни разу не синхронизировался."""
+        conn = self._connect()
+        sync = conn.execute("SELECT synced_at FROM client_syncs WHERE bank_name = ? AND client_id = ?",
+                            (bank_name, client_id)).fetchone()
+        rows = conn.execute("SELECT data FROM accounts WHERE bank_name = ? AND client_id = ? ORDER BY account_id",
+                            (bank_name, client_id)).fetchall() if sync else []
+        conn.close()
+        if sync is None:
+            return None
+        return sync["synced_at"], [json.loads(row["data"]) for row in rows]
+
+    def client_balances(self, client_id: str, bank_names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Итоги балансов клиента по банкам и валютам: [{"bank_name", "currency", "total_minor", "accounts", "as_of"}]."""
+        conn = self._connect()
+        rows = conn.execute("SELECT bank_name, currency, total_minor, accounts, as_of FROM client_balances "
+                            "WHERE client_id = ? ORDER BY bank_name, currency", (client_id,)).fetchall()
+        conn.close()
+        return [dict(row) for row in rows if bank_names is None or row["bank_name"] in bank_names]
+
+    def transactions_watermark(self, client_id: str, bank_names: Optional[List[str]] = None) -> Tuple[Tuple[str, int], ...]:
+        """
+        Водяной знак транзакций клиента: ((банк, seq последнего изменения транзакций), ...).
+        Меняется, только когда меняется набор или содержимое транзакций клиента.
+        """
+        conn = self._connect()
+        rows = conn.execute("SELECT bank_name, transactions_seq FROM client_syncs WHERE client_id = ? ORDER BY bank_name",
+                            (client_id,)).fetchall()
+        conn.close()
+        return tuple((row["bank_name"], row["transactions_seq"]) for row in rows
+                     if bank_names is None or row["bank_name"] in bank_names)
+
+    def client_transactions(self, client_id: str, bank_names: Optional[List[str]] = None) -> List[Tuple[Any, ...]]:
+        """Транзакции клиента кортежами (booked_at, amount_minor, currency, category, counterparty) по возрастанию даты."""
+        query = ("SELECT booked_at, amount_minor, currency, category, counterparty FROM transactions "
+                 "WHERE client_id = ? AND booked_at IS NOT NULL")
+        params: List[Any] = [client_id]
+        if bank_names is not None:
+            query += f" AND bank_name IN ({','.join('?' * len(bank_names))})"
+            params.extend(bank_names)
+        conn = self._connect()
+        rows = conn.execute(query + " ORDER BY booked_at", params).fetchall()
+        conn.close()
+        return [tuple(row) for row in rows]
+
+    def search_transactions(self, client_id: str, match: str, order: str, limit: int,
+                            after: Optional[Tuple[Any, int]] = None, bank_names: Optional[List[str]] = None,
+                            account_id: Optional[str] = None, booked_from: Optional[int] = None,
+                            booked_to: Optional[int] = None, amount_min: Optional[int] = None,
+                            amount_max: Optional[int] = None, currency: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Полнотекстовый поиск по описанию и контрагенту транзакций клиента (match — выражение FTS5).
+        Постраничная выдача по ключу (keyset): after — (sort_key, id) последней строки предыдущей
+        страницы, поэтому глубина страницы не влияет на время запроса. Суммы фильтруются по модулю.
+        """
+        score, keyset, order_by = self.SEARCH_ORDERS[order]
+        match = f"search_owner : {self.search_owner(client_id)} AND ({match})"
+        # CROSS JOIN закрепляет порядок: сначала совпадения из индекса, затем их строки по id,
+        # а не перебор всех транзакций клиента по idx_transactions_client.
+        query = (f"SELECT t.*, {score} AS sort_key FROM transactions_fts CROSS JOIN transactions t "
+                 "ON t.id = transactions_fts.rowid WHERE transactions_fts MATCH ? AND t.client_id = ?")
+        params: List[Any] = [match, client_id]
+        for condition, value in (("t.account_id = ?", account_id), ("t.booked_at >= ?", booked_from),
+                                 ("t.booked_at <= ?", booked_to), ("ABS(t.amount_minor) >= ?", amount_min),
+                                 ("ABS(t.amount_minor) <= ?", amount_max), ("t.currency = ?", currency)):
+            if value is not None:
+                query += f" AND {condition}"
+                params.append(value)
+        if bank_names is not None:
+            query += f" AND t.bank_name IN ({','.join('?' * len(bank_names))})"
+            params.extend(bank_names)
+        query = f"SELECT * FROM ({query})"
+        if after is not None:
+            query += f" WHERE {keyset}"
+            params.extend(after)
+        query += f" ORDER BY {order_by} LIMIT ?"
+        params.append(limit)
+        conn = self._connect()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+
+local_store = LocalStore(str(data_path(settings.local_store_path)))
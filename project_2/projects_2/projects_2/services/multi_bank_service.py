@@ -1,6 +1,13 @@
 import asyncio
-from typing import Dict, List, Any, Optional, Union
+import time
+from typing import Dict, List, Any, Optional, Tuple, Union
 from services.bank_service import BankService
+from services.deadline import Deadline
+from services.connection_registry import ConnectionRegistry
+from services.local_store import LocalStore, local_store
+from services.payment_consent_pool import PaymentConsentPool, payment_consent_pool
+from services.payment_store import PaymentStatusStore, payment_store
+from services.state_store import StateStore, state_store
 from config import settings
 import logging
 
@@ -17,40 +24,205 @@ from models.payment_consent import (
 )
 
 class MultiBankService:
-    def __init__(self):
+    def __init__(self, state_store: Optional[StateStore] = None, local_store: Optional[LocalStore] = None,
+                 payment_store: Optional[PaymentStatusStore] = None,
+                 payment_consent_pool: Optional[PaymentConsentPool] = None):
+        # Сервисы создаются лениво, при первом обращении к банку (см. get_service).
         self.bank_services: Dict[str, BankService] = {}
         self.active_connections: Dict[str, Dict[str, str]] = {}
-
-    def add_bank_connection(self, bank_config: Dict[str, str]):
+        # Общее хранилище воркеров: токены, согласия и кэши сервисов, реестр подключений.
+        self.state_store = state_store
+        self.registry: Optional[ConnectionRegistry] = ConnectionRegistry(state_store) if state_store else None
+        # Последние успешно полученные счета для ответа при недоступном банке.
+        self.local_store = local_store
+        # Созданные платежи для фонового опроса их статусов.
+        self.payment_store = payment_store
+        # Многоразовые и VRP-согласия на платежи с лимитами и счётчиками.
+        self.payment_consent_pool = payment_consent_pool
+        self._connections_synced_at = 0.0
+        self._connections_sync_task: Optional[asyncio.Task] = None
+        # Изменения подключений этим процессом (выполняющиеся и число завершённых):
+        # чтение реестра, пересёкшееся с изменением, не должно его откатить.
+        self._connections_changing = 0
+        self._connections_version = 0
+
+    async def add_bank_connection(self, bank_config: Dict[str, str]):
         """
-        Добавляет новое подключение к банку.
+        Добавляет новое подключение к банку или обновляет существующее.
         bank_config: {"name": "...", "api_base_url": "...", "client_id": "...", ...}
         """
         bank_name = bank_config['name']
+        if self.active_connections.get(bank_name) == bank_config:
+            logger.info(f"Подключение к банку {bank_name} уже существует с той же конфигурацией.")
+            return
         if bank_name in self.active_connections:
-            logger.warning(f"Подключение к банку {bank_name} уже существует. Перезаписываю.")
-
+            logger.warning(f"Подключение к банку {bank_name} уже существует. Обновляю конфигурацию.")
 
-        service = BankService(bank_config)
-        self.bank_services[bank_name] = service
-        self.active_connections[bank_name] = bank_config
+        self._connections_changing += 1
+        try:
+            await self._apply_connection(bank_config)
+            if self.registry:
+                await asyncio.to_thread(self.registry.put, bank_config)
+        finally:
+            self._connections_changing -= 1
+            self._connections_version += 1
         logger.info(f"Добавлено подключение к банку: {bank_name}")
 
-    def remove_bank_connection(self, bank_name: str):
+    async def _apply_connection(self, bank_config: Dict[str, str], reset_shared: bool = True):
+        """
+        Запоминает конфигурацию подключения. Уже созданный сервис не пересоздаётся:
+        он получает новую конфигурацию и сохраняет пул соединений, токен и кэши, если они ещё действительны.
+        """
+        bank_name = bank_config['name']
+        self.active_connections[bank_name] = bank_config
+        service = self.bank_services.get(bank_name)
+        if service:
+            await service.reconfigure(bank_config, reset_shared)
+
+    def _discard_connection(self, bank_name: str):
+        del self.active_connections[bank_name]
+        service = self.bank_services.pop(bank_name, None)
+        if service:
+            try:
+                asyncio.get_running_loop().create_task(service.aclose())
+            except RuntimeError:
+                pass
+
+    def _sync_connections(self):
+        """
+        Запускает сверку подключений процесса с реестром в общем хранилище
+        (не чаще settings.connections_sync_interval). Реестр читается в фоне, в потоке:
+        вызывающий не ждёт SQLite и работает с текущими подключениями, а изменения
+        из реестра применяются, как только чтение завершится.
+        """
+        if not self.registry:
+            return
+        if self._connections_sync_task is not None and not self._connections_sync_task.done():
+            return
+        now = time.monotonic()
+        if now - self._connections_synced_at < settings.connections_sync_interval:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._connections_synced_at = now
+        self._connections_sync_task = loop.create_task(self.sync_connections())
+
+    async def sync_connections(self):
+        """Приводит подключения процесса к реестру в общем хранилище."""
+        if not self.registry:
+            return
+        version = self._connections_version
+        try:
+            registered = await asyncio.to_thread(self.registry.all)
+        except Exception as e:
+            logger.error(f"Ошибка чтения реестра подключений: {e}")
+            return
+        if self._connections_changing or version != self._connections_version:
+            # Пока читали реестр, подключения изменились: сверка — при следующем обращении.
+            self._connections_synced_at = 0.0
+            return
+        for bank_name, bank_config in registered.items():
+            if self.active_connections.get(bank_name) != bank_config:
+                await self._apply_connection(bank_config, reset_shared=False)
+                logger.info(f"Подключение к банку {bank_name} получено из реестра")
+        for bank_name in set(self.active_connections) - set(registered):
+            self._discard_connection(bank_name)
+            logger.info(f"Подключение к банку {bank_name} удалено другим процессом")
+
+    def get_service(self, bank_name: str) -> Optional[BankService]:
+        """
+        Возвращает сервис подключенного банка или None.
+        """
+        self._sync_connections()
+        service = self.bank_services.get(bank_name)
+        if service is None and bank_name in self.active_connections:
+            service = BankService(self.active_connections[bank_name])
+            service.state_store = self.state_store
+            service.local_store = self.local_store
+            service.payment_store = self.payment_store
+            service.payment_consent_pool = self.payment_consent_pool
+            self.bank_services[bank_name] = service
+        return service
+
+    async def remove_bank_connection(self, bank_name: str):
         """
         Удаляет подключение к банку.
         """
-        if bank_name in self.bank_services:
-            del self.bank_services[bank_name]
-            del self.active_connections[bank_name]
+        await self.sync_connections()
+        if bank_name in self.active_connections:
+            self._connections_changing += 1
+            try:
+                self._discard_connection(bank_name)
+                if self.registry:
+                    await asyncio.to_thread(self.registry.remove, bank_name)
+            finally:
+                self._connections_changing -= 1
+                self._connections_version += 1
             logger.info(f"Удалено подключение к банку: {bank_name}")
         else:
             logger.warning(f"Подключение к банку {bank_name} не найдено для удаления.")
 
+    async def warm_up(self, timeout: float) -> Dict[str, str]:
+        """
+        Параллельно прогревает все подключенные банки (токен, пул соединений, согласия, кэш).
+        Возвращает статус по банкам: "ok", "failed: ..." или "timeout" — такие банки
+        продолжают прогреваться в фоне.
+        """
+        tasks = {}
+        for bank_name in self.list_connected_banks():
+            service = self.get_service(bank_name)
+            tasks[bank_name] = asyncio.create_task(service.warm_up())
+        if not tasks:
+            return {}
+        await asyncio.wait(tasks.values(), timeout=timeout)
+
+        statuses = {}
+        for bank_name, task in tasks.items():
+            if not task.done():
+                statuses[bank_name] = "timeout"
+            elif task.exception() is not None:
+                statuses[bank_name] = f"failed: {task.exception()}"
+                logger.error(f"Ошибка прогрева банка {bank_name}: {task.exception()}")
+            else:
+                statuses[bank_name] = "ok"
+        return statuses
+
+    def export_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Состояние созданных сервисов для снапшота, по банкам."""
+        return {bank_name: service.export_state() for bank_name, service in self.bank_services.items()}
+
+    def import_snapshot(self, banks_state: Dict[str, Dict[str, Any]]):
+        """Восстанавливает состояние сервисов из снапшота; банки, которых больше нет в подключениях, пропускаются."""
+        for bank_name, state in banks_state.items():
+            service = self.get_service(bank_name)
+            if service is None:
+                logger.info(f"Банк {bank_name} из снапшота не подключен, пропускаем")
+                continue
+            service.import_state(state)
+
+    async def drain(self, timeout: float) -> int:
+        """
+        Ждёт завершения фоновой работы всех сервисов не дольше timeout.
+        Возвращает число незавершённых обработок клиентов.
+        """
+        pending = await asyncio.gather(*(service.drain(timeout) for service in self.bank_services.values()))
+        return sum(pending)
+
+    async def flush(self):
+        """Записывает на диск накопленные изменения согласий всех сервисов."""
+        await asyncio.gather(*(service.flush() for service in self.bank_services.values()))
+
+    async def aclose(self):
+        """Закрывает пулы соединений всех созданных сервисов."""
+        await asyncio.gather(*(service.aclose() for service in self.bank_services.values()), return_exceptions=True)
+
     def list_connected_banks(self) -> List[str]:
         """
         Возвращает список имён подключенных банков.
         """
+        self._sync_connections()
         return list(self.active_connections.keys())
 
 
@@ -63,7 +235,7 @@ class MultiBankService:
         request_data - это объект Pydantic-модели (например, SingleUseConsentWithCreditorRequest), полученный из API.
         Возвращает X-Consent-Id или None в случае ошибки.
         """
-        service = self.bank_services.get(bank_name)
+        service = self.get_service(bank_name)
         if not service:
             logger.error(f"Сервис для банка {bank_name} не найден.")
             return None
@@ -87,7 +259,7 @@ class MultiBankService:
         Запрашивает *новое* согласие на доступ к данным клиента в указанном банке.
         Возвращает X-Consent-Id или None в случае ошибки.
         """
-        service = self.bank_services.get(bank_name)
+        service = self.get_service(bank_name)
         if not service:
             logger.error(f"Сервис для банка {bank_name} не найден.")
             return None
@@ -106,7 +278,7 @@ class MultiBankService:
         """
         Получает все счета для указанных клиентов указанного банка.
         """
-        service = self.bank_services.get(bank_name)
+        service = self.get_service(bank_name)
         if not service:
             logger.error(f"Сервис для банка {bank_name} не найден.")
             return None
@@ -120,6 +292,16 @@ class MultiBankService:
             logger.error(f"Ошибка при сборе данных для банка {bank_name}: {e}")
             return None
 
+    async def fetch_client_accounts(self, bank_name: str, client_id: str) -> List[Dict[str, Any]]:
+        """
+        Получает счета одного клиента в указанном банке.
+        В отличие от get_accounts_for_single_bank, ошибки пробрасываются вызывающему.
+        """
+        service = self.get_service(bank_name)
+        if not service:
+            raise KeyError(f"Сервис для банка {bank_name} не найден.")
+        return await service.fetch_client_accounts(client_id)
+
     async def execute_payment_for_specific_bank(self, bank_name: str, client_id: str, consent_id: str, payment_data: dict
 
     ) -> Optional[Dict[str, Any]]:
@@ -128,7 +310,7 @@ class MultiBankService:
         payment_data - это словарь (dict), полученный из model_dump() Pydantic-модели из API.
         Возвращает ответ от API банка или None в случае ошибки.
         """
-        service = self.bank_services.get(bank_name)
+        service = self.get_service(bank_name)
         if not service:
             logger.error(f"Сервис для банка {bank_name} не найден.")
             return None
@@ -191,8 +373,44 @@ class MultiBankService:
 
         return combined_results
 
+    async def get_accounts_for_multiple_banks_within_deadline(self, bank_requests: List[Dict[str, List[str]]],
+                                                              deadline: Optional[Deadline]) -> Tuple[
+        Dict[str, Optional[Dict[str, List[Dict[str, Any]]]]], Dict[str, Dict[str, Any]]]:
+        """
+        Получает данные для списка банков параллельно, но не дольше дедлайна (None — без ограничения).
+        Возвращает (результаты по банкам, полнота по банкам):
+        {"vbank": {"complete": False, "clients": {"team020-1": True, "team020-2": False}}}
+        """
+
+        async def fetch_bank(bank_name: str, client_ids: List[str]):
+            service = self.get_service(bank_name)
+            if not service:
+                logger.error(f"Сервис для банка {bank_name} не найден.")
+                return None, {client_id: False for client_id in client_ids}
+            return await service.get_accounts_for_client_list_within_deadline(client_ids, deadline)
+
+        results = await asyncio.gather(
+            *(fetch_bank(req["bank_name"], req["client_ids"]) for req in bank_requests), return_exceptions=True)
+
+        combined_results = {}
+        completeness = {}
+        for req, result in zip(bank_requests, results):
+            bank_name = req["bank_name"]
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка при сборе данных для банка {bank_name}: {result}")
+                combined_results[bank_name] = None
+                clients_complete = {client_id: False for client_id in req["client_ids"]}
+            else:
+                combined_results[bank_name], clients_complete = result
+            completeness[bank_name] = {
+                "complete": combined_results[bank_name] is not None and all(clients_complete.values()),
+                "clients": clients_complete,
+            }
+
+        return combined_results, completeness
+
 
-multi_bank_service = MultiBankService()
+multi_bank_service = MultiBankService(state_store, local_store, payment_store, payment_consent_pool)
 
 
 async def initialize_connections():
@@ -200,4 +418,7 @@ async def initialize_connections():
     Инициализирует подключения к банкам из конфига.
     """
     for bank_conf in settings.bank_configs:
-        multi_bank_service.add_bank_connection(bank_conf)
+        await multi_bank_service.add_bank_connection(bank_conf)
+    # Подключения, добавленные через /banks/connect до перезапуска, берутся из реестра.
+    await multi_bank_service.sync_connections()
+    logger.info(f"Подключено банков: {len(multi_bank_service.list_connected_banks())}")
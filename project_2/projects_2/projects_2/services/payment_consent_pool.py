@@ -0,0 +1,272 @@
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Union
+
+from config import settings
+from utils.money import to_minor
+from utils.paths import data_path
+from models.payment_consent import MultiUseConsentRequest, VRPConsentRequest
+
+
+logger = logging.getLogger(__name__)
+
+
+class ConsentLimitExceeded(Exception):
+    """Платёж не укладывается в лимиты согласия: отправлять его в банк бессмысленно."""
+
+
+# Валюта лимитов согласия: в запросе согласия на платёж валюты нет, банк считает лимиты в рублях.
+CONSENT_CURRENCY = "RUB"
+
+LIMIT_FIELDS = ("max_per_payment", "daily_limit", "monthly_limit")
+
+
+def payment_terms(payment_data: dict) -> Dict[str, Any]:
+    """Сумма (в минимальных единицах валюты), валюта, счёт списания и счёт получателя из тела платежа /payments/execute."""
+    data = payment_data.get("data", {})
+    initiation = data.get("initiation", data)
+    instructed = initiation.get("instructedAmount") or {}
+    currency = (instructed.get("currency") or CONSENT_CURRENCY).upper()
+    return {
+        "amount": to_minor(instructed.get("amount"), currency),
+        "currency": currency,
+        "debtor_account": (initiation.get("debtorAccount") or {}).get("identification"),
+        "creditor_account": (initiation.get("creditorAccount") or {}).get("identification"),
+    }
+
+
+def consent_terms(request_data: Union[MultiUseConsentRequest, VRPConsentRequest]) -> Dict[str, Any]:
+    """Условия запрошенного согласия в том виде, в каком пул хранит их у выданных: суммы в копейках."""
+    terms = dict.fromkeys(("allowed_creditors", "max_uses", "max_total") + LIMIT_FIELDS)
+    if isinstance(request_data, MultiUseConsentRequest):
+        terms.update(allowed_creditors=request_data.allowed_creditor_accounts, max_uses=request_data.max_uses,
+                     max_per_payment=to_minor(request_data.max_amount_per_payment, CONSENT_CURRENCY),
+                     max_total=to_minor(request_data.max_total_amount, CONSENT_CURRENCY))
+    else:
+        terms.update(max_per_payment=to_minor(request_data.vrp_max_individual_amount, CONSENT_CURRENCY),
+                     daily_limit=to_minor(request_data.vrp_daily_limit, CONSENT_CURRENCY),
+                     monthly_limit=to_minor(request_data.vrp_monthly_limit, CONSENT_CURRENCY))
+    terms["valid_until"] = request_data.valid_until.timestamp() if request_data.valid_until else None
+    return terms
+
+
+class PaymentConsentPool:
+    """
+    Многоразовые (multi_use) и VRP-согласия на платежи с их лимитами и счётчиками в SQLite.
+    Согласие выбирается по индексу (bank_name, client_id) среди согласий клиента,
+    поэтому повторный запрос согласия обходится без обращения к банку и без ожидания
+    consent_propagation_delay, пока у клиента есть действующее согласие, покрывающее
+    запрошенные условия (получателей, лимиты, число платежей и срок).
+    Списание по согласию (charge) проверяет лимиты и обновляет счётчики в одной
+    транзакции BEGIN IMMEDIATE, так что параллельные платежи из разных процессов
+    не превысят лимит; платёж, который банк точно не провёл, возвращается через refund.
+    Суммы хранятся в копейках. Дневной и месячный лимиты считаются по UTC.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_database(self):
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS payment_consents (
+                consent_id TEXT PRIMARY KEY,
+                bank_name TEXT NOT NULL,
+                client_id TEXT NOT NULL,
+                consent_type TEXT NOT NULL,
+                debtor_account TEXT NOT NULL,
+                allowed_creditors TEXT,
+                max_uses INTEGER,
+                uses INTEGER NOT NULL DEFAULT 0,
+                max_per_payment INTEGER,
+                max_total INTEGER,
+                total_spent INTEGER NOT NULL DEFAULT 0,
+                daily_limit INTEGER,
+                day TEXT,
+                day_spent INTEGER NOT NULL DEFAULT 0,
+                monthly_limit INTEGER,
+                month TEXT,
+                month_spent INTEGER NOT NULL DEFAULT 0,
+                valid_until REAL,
+                revoked INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                currency TEXT NOT NULL DEFAULT 'RUB'
+            );
+            CREATE INDEX IF NOT EXISTS idx_payment_consents_client ON payment_consents (bank_name, client_id);
+        ''')
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(payment_consents)")}
+        if "currency" not in columns:
+            conn.execute(f"ALTER TABLE payment_consents ADD COLUMN currency TEXT NOT NULL DEFAULT '{CONSENT_CURRENCY}'")
+        conn.close()
+
+    def register(self, bank_name: str, consent_id: str,
+                 request_data: Union[MultiUseConsentRequest, VRPConsentRequest],
+                 valid_until: Optional[datetime] = None):
+        """Добавляет в пул согласие, выданное банком по request_data."""
+        terms = consent_terms(request_data)
+        if valid_until:
+            terms["valid_until"] = valid_until.timestamp()
+        allowed_creditors = terms["allowed_creditors"]
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO payment_consents (consent_id, bank_name, client_id, consent_type, debtor_account, "
+            "allowed_creditors, max_uses, max_per_payment, max_total, daily_limit, monthly_limit, valid_until, "
+            "created_at, currency) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (consent_id, bank_name, request_data.client_id, request_data.consent_type, request_data.debtor_account,
+             json.dumps(allowed_creditors) if allowed_creditors is not None else None, terms["max_uses"],
+             terms["max_per_payment"], terms["max_total"], terms["daily_limit"], terms["monthly_limit"],
+             terms["valid_until"], time.time(), CONSENT_CURRENCY))
+        conn.close()
+
+    def _client_consents(self, conn: sqlite3.Connection, bank_name: str, client_id: str) -> List[sqlite3.Row]:
+        return conn.execute(
+            "SELECT * FROM payment_consents WHERE bank_name = ? AND client_id = ? AND revoked = 0 "
+            "ORDER BY created_at DESC", (bank_name, client_id)).fetchall()
+
+    @staticmethod
+    def _periods(now: float):
+        moment = datetime.fromtimestamp(now, tz=timezone.utc)
+        return moment.strftime("%Y-%m-%d"), moment.strftime("%Y-%m")
+
+    @staticmethod
+    def _rejection(row: sqlite3.Row, now: float, amount: Optional[int] = None,
+                   creditor_account: Optional[str] = None, currency: Optional[str] = None) -> Optional[str]:
+        """Причина, по которой согласие не подходит для платежа, или None."""
+        if row["valid_until"] is not None and row["valid_until"] <= now:
+            return "срок действия истёк"
+        if row["max_uses"] is not None and row["uses"] >= row["max_uses"]:
+            return "исчерпано число платежей"
+        if currency is not None and currency != row["currency"]:
+            return f"валюта платежа {currency} не совпадает с валютой лимитов {row['currency']}"
+        if creditor_account is not None and row["allowed_creditors"] is not None \
+                and creditor_account not in json.loads(row["allowed_creditors"]):
+            return f"получатель {creditor_account} не разрешён"
+        if amount is None:
+            if row["max_total"] is not None and row["total_spent"] >= row["max_total"]:
+                return "исчерпан общий лимит"
+            return None
+        day, month = PaymentConsentPool._periods(now)
+        day_spent = row["day_spent"] if row["day"] == day else 0
+        month_spent = row["month_spent"] if row["month"] == month else 0
+        if row["max_per_payment"] is not None and amount > row["max_per_payment"]:
+            return "превышен лимит одного платежа"
+        if row["max_total"] is not None and row["total_spent"] + amount > row["max_total"]:
+            return "превышен общий лимит"
+        if row["daily_limit"] is not None and day_spent + amount > row["daily_limit"]:
+            return "превышен дневной лимит"
+        if row["monthly_limit"] is not None and month_spent + amount > row["monthly_limit"]:
+            return "превышен месячный лимит"
+        return None
+
+    @staticmethod
+    def _shortfall(row: sqlite3.Row, terms: Dict[str, Any], now: float) -> Optional[str]:
+        """Какое из запрошенных условий terms (см. consent_terms) действующее согласие не покрывает, или None."""
+        reason = PaymentConsentPool._rejection(row, now)
+        if reason:
+            return reason
+        if terms["valid_until"] is not None and row["valid_until"] is not None and row["valid_until"] < terms["valid_until"]:
+            return "истекает раньше запрошенного срока"
+        if row["allowed_creditors"] is not None and (
+                terms["allowed_creditors"] is None
+                or not set(terms["allowed_creditors"]) <= set(json.loads(row["allowed_creditors"]))):
+            return "разрешены не все запрошенные получатели"
+        if row["max_uses"] is not None and (terms["max_uses"] is None or row["max_uses"] - row["uses"] < terms["max_uses"]):
+            return "осталось меньше платежей, чем запрошено"
+        for limit in LIMIT_FIELDS:
+            if row[limit] is not None and (terms[limit] is None or row[limit] < terms[limit]):
+                return f"лимит {limit} меньше запрошенного"
+        if row["max_total"] is not None:
+            requested_total = terms["max_total"]
+            if requested_total is None and terms["max_uses"] is not None and terms["max_per_payment"] is not None:
+                requested_total = terms["max_uses"] * terms["max_per_payment"]
+            if requested_total is None or row["max_total"] - row["total_spent"] < requested_total:
+                return "остаток общего лимита меньше запрошенного"
+        return None
+
+    def find(self, bank_name: str,
+             request_data: Union[MultiUseConsentRequest, VRPConsentRequest]) -> Optional[Dict[str, Any]]:
+        """
+        Самое новое действующее согласие клиента того же типа по тому же счёту списания,
+        которое покрывает все условия request_data; None — нужно запрашивать новое согласие.
+        """
+        terms = consent_terms(request_data)
+        now = time.time()
+        conn = self._connect()
+        rows = self._client_consents(conn, bank_name, request_data.client_id)
+        conn.close()
+        for row in rows:
+            if row["consent_type"] != request_data.consent_type or row["debtor_account"] != request_data.debtor_account:
+                continue
+            reason = self._shortfall(row, terms, now)
+            if reason is None:
+                return dict(row)
+            logger.info(f"[{bank_name}] Согласие {row['consent_id']} не переиспользуется: {reason}")
+        return None
+
+    def contains(self, consent_id: str) -> bool:
+        conn = self._connect()
+        row = conn.execute("SELECT 1 FROM payment_consents WHERE consent_id = ?", (consent_id,)).fetchone()
+        conn.close()
+        return row is not None
+
+    def charge(self, consent_id: str, amount: int, creditor_account: Optional[str] = None,
+               currency: Optional[str] = None) -> bool:
+        """
+        Атомарно проверяет лимиты согласия и списывает по нему платёж amount.
+        False — согласия нет в пуле (одноразовые согласия не отслеживаются);
+        ConsentLimitExceeded — платёж не укладывается в лимиты.
+        """
+        now = time.time()
+        day, month = self._periods(now)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT * FROM payment_consents WHERE consent_id = ?", (consent_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return False
+            reason = "согласие отозвано" if row["revoked"] else self._rejection(row, now, amount, creditor_account, currency)
+            if reason:
+                conn.execute("ROLLBACK")
+                raise ConsentLimitExceeded(f"Согласие {consent_id}: {reason}")
+            conn.execute(
+                "UPDATE payment_consents SET uses = uses + 1, total_spent = total_spent + ?, "
+                "day_spent = CASE WHEN day = ? THEN day_spent ELSE 0 END + ?, day = ?, "
+                "month_spent = CASE WHEN month = ? THEN month_spent ELSE 0 END + ?, month = ? "
+                "WHERE consent_id = ?",
+                (amount, day, amount, day, month, amount, month, consent_id))
+            conn.execute("COMMIT")
+            return True
+        finally:
+            conn.close()
+
+    def refund(self, consent_id: str, amount: int, charged_at: float):
+        """Возвращает списание charge, если банк точно не провёл платёж."""
+        day, month = self._periods(charged_at)
+        conn = self._connect()
+        conn.execute(
+            "UPDATE payment_consents SET uses = MAX(uses - 1, 0), total_spent = MAX(total_spent - ?, 0), "
+            "day_spent = CASE WHEN day = ? THEN MAX(day_spent - ?, 0) ELSE day_spent END, "
+            "month_spent = CASE WHEN month = ? THEN MAX(month_spent - ?, 0) ELSE month_spent END "
+            "WHERE consent_id = ?",
+            (amount, day, amount, month, amount, consent_id))
+        conn.close()
+
+    def revoke(self, consent_id: str):
+        """Исключает согласие из выбора (банк сообщил, что оно отозвано или недействительно)."""
+        conn = self._connect()
+        conn.execute("UPDATE payment_consents SET revoked = 1 WHERE consent_id = ?", (consent_id,))
+        conn.close()
+
+
+payment_consent_pool = PaymentConsentPool(str(data_path(settings.payments_db_path)))
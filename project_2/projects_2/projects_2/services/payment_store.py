@@ -0,0 +1,134 @@
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from utils.paths import data_path
+
+
+logger = logging.getLogger(__name__)
+
+
+# Конечные статусы платежа (Open Banking): после них статус больше не опрашивается.
+TERMINAL_PAYMENT_STATUSES = {
+    "AcceptedSettlementCompleted",
+    "AcceptedCreditSettlementCompleted",
+    "Rejected",
+    "Cancelled",
+}
+
+
+class PaymentStatusStore:
+    """
+    Статусы платежей, созданных через BankService.execute_payment, в SQLite.
+    Фоновый PaymentStatusTracker опрашивает банк по записям с наступившим
+    next_poll_at и обновляет их; /payments/status отвечает отсюда, без запросов к банку.
+    У платежа в конечном статусе (или брошенного по сроку) next_poll_at = NULL.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_database(self):
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS payments (
+                payment_id TEXT PRIMARY KEY,
+                bank_name TEXT NOT NULL,
+                client_id TEXT NOT NULL,
+                consent_id TEXT NOT NULL,
+                status TEXT,
+                data TEXT NOT NULL,
+                polls INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                next_poll_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_payments_next_poll ON payments (next_poll_at)
+                WHERE next_poll_at IS NOT NULL;
+        ''')
+        conn.commit()
+        conn.close()
+
+    def record(self, bank_name: str, client_id: str, consent_id: str, data: Dict[str, Any], first_poll_in: float):
+        """Запоминает созданный платёж; первый опрос статуса — через first_poll_in секунд."""
+        now = time.time()
+        status = data.get("status")
+        next_poll_at = None if status in TERMINAL_PAYMENT_STATUSES else now + first_poll_in
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO payments (payment_id, bank_name, client_id, consent_id, status, data, created_at, "
+                "updated_at, next_poll_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (payment_id) DO NOTHING",
+                (data["paymentId"], bank_name, client_id, consent_id, status, json.dumps(data, ensure_ascii=False),
+                 now, now, next_poll_at))
+        conn.close()
+
+    def get(self, payment_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM payments WHERE payment_id = ?", (payment_id,)).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        payment = dict(row)
+        payment["data"] = json.loads(payment["data"])
+        return payment
+
+    def claim_due(self, limit: int, claim_ttl: float) -> List[Dict[str, Any]]:
+        """
+        Забирает до limit платежей с наступившим next_poll_at и откладывает их опрос
+        на claim_ttl, чтобы другие процессы их не взяли. Результат опроса фиксирует reschedule.
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            rows = conn.execute(
+                "UPDATE payments SET next_poll_at = ? WHERE payment_id IN ("
+                "SELECT payment_id FROM payments WHERE next_poll_at IS NOT NULL AND next_poll_at <= ? "
+                "ORDER BY next_poll_at LIMIT ?) "
+                "RETURNING payment_id, bank_name, client_id, consent_id, status, polls, created_at",
+                (now + claim_ttl, now, limit)).fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def reschedule(self, payment_id: str, polls: int, next_poll_at: Optional[float],
+                   data: Optional[Dict[str, Any]] = None):
+        """Сохраняет результат опроса: новые данные платежа (если получены) и время следующего опроса."""
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            if data is None:
+                conn.execute("UPDATE payments SET polls = ?, next_poll_at = ? WHERE payment_id = ?",
+                             (polls, next_poll_at, payment_id))
+            else:
+                conn.execute(
+                    "UPDATE payments SET status = ?, data = ?, polls = ?, updated_at = ?, next_poll_at = ? "
+                    "WHERE payment_id = ?",
+                    (data.get("status"), json.dumps(data, ensure_ascii=False), polls, now, next_poll_at, payment_id))
+        conn.close()
+
+    def next_poll_at(self) -> Optional[float]:
+        conn = self._connect()
+        row = conn.execute("SELECT MIN(next_poll_at) AS next_poll_at FROM payments "
+                           "WHERE next_poll_at IS NOT NULL").fetchone()
+        conn.close()
+        return row["next_poll_at"]
+
+    def checkpoint(self):
+        """Переносит WAL в основной файл базы и усекает его (при остановке приложения)."""
+        conn = self._connect()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+
+
+payment_store = PaymentStatusStore(str(data_path(settings.payments_db_path)))
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from services.multi_bank_service import multi_bank_service
+from services.payment_store import PaymentStatusStore, TERMINAL_PAYMENT_STATUSES, payment_store
+
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentStatusTracker:
+    """
+    Фоновый опрос статусов платежей из PaymentStatusStore.
+    За один проход забирается до batch_size платежей с наступившим сроком, они
+    группируются по банкам и опрашиваются параллельно (не больше per_bank_limit
+    запросов на банк). Интервал между опросами платежа растёт от initial_interval
+    вдвое после каждого опроса до max_interval: свежий платёж обычно меняет статус
+    в первые секунды, а зависший не нагружает банк. Опрос прекращается на конечном
+    статусе или через give_up_after секунд после создания платежа.
+    """
+
+    def __init__(self, store: PaymentStatusStore, initial_interval: float, max_interval: float,
+                 batch_size: int, per_bank_limit: int, give_up_after: float):
+        self.store = store
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.batch_size = batch_size
+        self.per_bank_limit = per_bank_limit
+        self.give_up_after = give_up_after
+        self._task: Optional[asyncio.Task] = None
+
+    def poll_interval(self, polls: int) -> float:
+        return min(self.initial_interval * 2 ** polls, self.max_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.store.checkpoint)
+
+    async def _run(self):
+        while True:
+            try:
+                polled = await self.poll_due()
+                if polled >= self.batch_size:
+                    continue
+                next_poll_at = await asyncio.to_thread(self.store.next_poll_at)
+            except Exception as e:
+                logger.error(f"Ошибка опроса статусов платежей: {e}")
+                next_poll_at = None
+            # Новые платежи могут появиться в любой момент (в том числе в другом процессе),
+            # поэтому спим не дольше initial_interval.
+            delay = self.initial_interval if next_poll_at is None else next_poll_at - time.time()
+            await asyncio.sleep(min(max(delay, 0.05), self.initial_interval))
+
+    async def poll_due(self) -> int:
+        """Опрашивает одну пачку платежей с наступившим сроком; возвращает её размер."""
+        due = await asyncio.to_thread(self.store.claim_due, self.batch_size, self.max_interval)
+        if not due:
+            return 0
+        by_bank: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for payment in due:
+            by_bank[payment["bank_name"]].append(payment)
+        await asyncio.gather(*(self._poll_bank(bank_name, payments) for bank_name, payments in by_bank.items()))
+        return len(due)
+
+    async def _poll_bank(self, bank_name: str, payments: List[Dict[str, Any]]):
+        service = multi_bank_service.get_service(bank_name)
+        semaphore = asyncio.Semaphore(self.per_bank_limit)
+
+        async def poll(payment: Dict[str, Any]):
+            async with semaphore:
+                data = None
+                if service is not None:
+                    try:
+                        data = (await service.get_payment_status(payment["payment_id"], payment["client_id"],
+                                                                 payment["consent_id"])).data
+                    except Exception as e:
+                        logger.warning(f"[{bank_name}] Статус платежа {payment['payment_id']} не получен: {e}")
+                polls = payment["polls"] + 1
+                status = data.get("status") if data else payment["status"]
+                if status in TERMINAL_PAYMENT_STATUSES:
+                    next_poll_at = None
+                    logger.info(f"[{bank_name}] Платёж {payment['payment_id']} завершён со статусом {status}")
+                elif time.time() - payment["created_at"] >= self.give_up_after:
+                    next_poll_at = None
+                    logger.warning(f"[{bank_name}] Опрос платежа {payment['payment_id']} прекращён "
+                                   f"в статусе {status} после {polls} опросов")
+                else:
+                    next_poll_at = time.time() + self.poll_interval(polls)
+                await asyncio.to_thread(self.store.reschedule, payment["payment_id"], polls, next_poll_at, data)
+
+        await asyncio.gather(*(poll(payment) for payment in payments))
+
+
+payment_tracker = PaymentStatusTracker(payment_store, settings.payment_poll_initial, settings.payment_poll_max,
+                                       settings.payment_poll_batch, settings.payment_poll_per_bank,
+                                       settings.payment_poll_give_up)
@@ -0,0 +1,53 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """
+    Состояние прогрева процесса для /health/ready.
+    Процесс считается готовым, когда прогрев завершился или истёк его таймаут:
+    банки, не успевшие прогреться, дорабатывают в фоне и помечаются как "timeout".
+    """
+
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.banks: Dict[str, str] = {}
+        # Выставляется при остановке: балансировщик перестаёт направлять трафик.
+        self.draining = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None and not self.draining
+
+    def start(self, service, timeout: float):
+        """Запускает прогрев service (MultiBankService) в фоне, не задерживая старт сервера."""
+        self._task = asyncio.create_task(self._warm_up(service, timeout))
+
+    async def _warm_up(self, service, timeout: float):
+        self.started_at = time.time()
+        try:
+            self.banks = await service.warm_up(timeout)
+        except Exception as e:
+            logger.error(f"Ошибка прогрева: {e}")
+        finally:
+            self.finished_at = time.time()
+            logger.info(f"Прогрев завершён за {self.finished_at - self.started_at:.2f}s: {self.banks}")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "draining": self.draining,
+            "timed_out": "timeout" in self.banks.values(),
+            "warmup_seconds": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else None,
+            "banks": self.banks,
+        }
+
+
+readiness = Readiness()
@@ -0,0 +1,97 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from config import settings
+from utils.encoding import json_loads
+from utils.paths import data_path
+from services.multi_bank_service import multi_bank_service
+
+
+logger = logging.getLogger(__name__)
+
+
+SNAPSHOT_VERSION = 1
+
+
+def write_snapshot(path: Path, state: Dict[str, Any]):
+    """Атомарно записывает снапшот: компактный JSON в gzip через временный файл и os.replace."""
+    payload = json.dumps({"version": SNAPSHOT_VERSION, "created_at": time.time(), "banks": state},
+                         ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(gzip.compress(payload, compresslevel=1))
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: Path) -> Optional[Dict[str, Any]]:
+    """Читает снапшот одним чтением файла; None, если его нет, он повреждён или другой версии."""
+    try:
+        snapshot = json_loads(gzip.decompress(path.read_bytes()))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Снапшот {path} не прочитан: {e}")
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        logger.warning(f"Снапшот {path} версии {snapshot.get('version')} пропущен")
+        return None
+    return snapshot
+
+
+class SnapshotManager:
+    """
+    Периодически и при остановке сохраняет состояние MultiBankService (токены, кэш счетов,
+    метки синхронизации) в локальный снапшот и восстанавливает его при старте,
+    чтобы перезапущенный процесс сразу отвечал из прогретого кэша.
+    """
+
+    def __init__(self, service, path: str, interval: float):
+        self.service = service
+        self.path = Path(path)
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def restore(self):
+        started = time.perf_counter()
+        snapshot = await asyncio.to_thread(read_snapshot, self.path)
+        if snapshot is None:
+            logger.info(f"Снапшот {self.path} не найден, старт без прогретого кэша")
+            return
+        self.service.import_snapshot(snapshot["banks"])
+        logger.info(f"Снапшот {self.path} от {time.ctime(snapshot['created_at'])} восстановлен "
+                    f"за {time.perf_counter() - started:.3f}s")
+
+    async def save(self):
+        started = time.perf_counter()
+        state = self.service.export_snapshot()
+        try:
+            await asyncio.to_thread(write_snapshot, self.path, state)
+        except Exception as e:
+            logger.error(f"Ошибка записи снапшота {self.path}: {e}")
+            return
+        logger.info(f"Снапшот {self.path} записан за {time.perf_counter() - started:.3f}s")
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._periodic_save())
+
+    async def stop(self):
+        """Останавливает периодическую запись и сохраняет финальный снапшот."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.save()
+
+    async def _periodic_save(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.save()
+
+
+snapshot_manager = SnapshotManager(multi_bank_service, str(data_path(settings.snapshot_path)), settings.snapshot_interval)
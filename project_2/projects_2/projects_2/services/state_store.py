@@ -0,0 +1,151 @@
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from config import settings
+from utils.paths import data_path
+
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    """
+    Общее состояние воркеров uvicorn в SQLite (режим WAL).
+    Токены, согласия, подключения к банкам, кэши и счётчики лимитов хранятся
+    здесь, а не в памяти процесса, поэтому приложение можно запускать с --workers N.
+    Значения хранятся в JSON по паре (namespace, key), с необязательным сроком жизни.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        # Идентификатор процесса-владельца для аренд (leases).
+        self.owner_id = uuid.uuid4().hex
+        self._init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_database(self):
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS kv (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS rate_counters (
+                bucket TEXT NOT NULL,
+                window_start INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (bucket, window_start)
+            );
+        ''')
+        conn.commit()
+        conn.close()
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        conn = self._connect()
+        row = conn.execute("SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?",
+                           (namespace, key)).fetchone()
+        conn.close()
+        if row is None or (row["expires_at"] is not None and row["expires_at"] <= time.time()):
+            return None
+        return json.loads(row["value"])
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO kv (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, "
+                "expires_at = excluded.expires_at, updated_at = excluded.updated_at",
+                (namespace, key, json.dumps(value, ensure_ascii=False), now + ttl if ttl else None, now))
+        conn.close()
+
+    def delete(self, namespace: str, key: str):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+        conn.close()
+
+    def clear(self, namespace: str):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM kv WHERE namespace = ?", (namespace,))
+        conn.close()
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT key, value FROM kv WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, time.time())).fetchall()
+        conn.close()
+        return {row["key"]: json.loads(row["value"]) for row in rows}
+
+    def acquire_lease(self, name: str, ttl: float) -> bool:
+        """
+        Пытается взять аренду name на ttl секунд. Аренда достаётся одному процессу:
+        свободной считается отсутствующая, просроченная или уже своя аренда.
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.expires_at <= ? OR leases.owner = excluded.owner",
+                (name, self.owner_id, now + ttl, now))
+        conn.close()
+        return cursor.rowcount > 0
+
+    def release_lease(self, name: str):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.owner_id))
+        conn.close()
+
+    def hit(self, bucket: str, window: int) -> int:
+        """Увеличивает счётчик bucket в окне window и возвращает новое значение."""
+        conn = self._connect()
+        with conn:
+            row = conn.execute(
+                "INSERT INTO rate_counters (bucket, window_start, count) VALUES (?, ?, 1) "
+                "ON CONFLICT (bucket, window_start) DO UPDATE SET count = count + 1 RETURNING count",
+                (bucket, window)).fetchone()
+            conn.execute("DELETE FROM rate_counters WHERE bucket = ? AND window_start < ?", (bucket, window - 60))
+        conn.close()
+        return row["count"]
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+        conn.close()
+        return cursor.rowcount
+
+    def checkpoint(self):
+        """Переносит WAL в основной файл базы и усекает его (при остановке приложения)."""
+        conn = self._connect()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+
+
+state_store = StateStore(str(data_path(settings.state_db_path)))
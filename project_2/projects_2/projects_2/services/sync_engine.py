@@ -0,0 +1,70 @@
+import asyncio
+import base64
+import binascii
+import logging
+from typing import Any, Dict, List, Optional
+
+from services.local_store import LocalStore, local_store
+from services.multi_bank_service import MultiBankService, multi_bank_service
+
+
+logger = logging.getLogger(__name__)
+
+
+CURSOR_PREFIX = "v1:"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(seq: int) -> str:
+    return base64.urlsafe_b64encode(f"{CURSOR_PREFIX}{seq}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """Номер seq из курсора; пустой курсор — синхронизация с начала журнала."""
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor(f"Некорректный курсор: {cursor}")
+    if not raw.startswith(CURSOR_PREFIX) or not raw[len(CURSOR_PREFIX):].isdigit():
+        raise InvalidCursor(f"Некорректный курсор: {cursor}")
+    return int(raw[len(CURSOR_PREFIX):])
+
+
+class SyncEngine:
+    """
+    Дельта-синхронизация для мобильного клиента.
+    Счета обновляются из банков обычным путём (MultiBankService с его кэшами),
+    а LocalStore при каждой записи ведёт журнал изменившихся сущностей.
+    Клиент получает только изменения после своего курсора и новый курсор.
+    """
+
+    def __init__(self, service: MultiBankService, store: LocalStore):
+        self.service = service
+        self.store = store
+
+    async def refresh(self, bank_names: List[str], client_ids: List[str]):
+        """Обновляет счета клиентов в банках; изменения попадают в журнал LocalStore."""
+        await self.service.get_accounts_for_multiple_banks(
+            [{"bank_name": bank_name, "client_ids": client_ids} for bank_name in bank_names])
+
+    async def changes(self, cursor: Optional[str], limit: int, bank_names: Optional[List[str]] = None,
+                      client_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Возвращает изменения после cursor: {"changes": [...], "cursor": "...", "has_more": bool}.
+        Если переданы client_ids, их счета сначала обновляются из банков.
+        """
+        after_seq = decode_cursor(cursor)
+        if client_ids:
+            await self.refresh(bank_names or self.service.list_connected_banks(), client_ids)
+        changes, next_seq, has_more = await asyncio.to_thread(
+            self.store.changes_since, after_seq, limit, bank_names, client_ids)
+        logger.info(f"Дельта-синхронизация: {len(changes)} изменений после seq {after_seq}, следующий seq {next_seq}")
+        return {"changes": changes, "cursor": encode_cursor(next_seq), "has_more": has_more}
+
+
+sync_engine = SyncEngine(multi_bank_service, local_store)
@@ -0,0 +1,133 @@
+import asyncio
+import base64
+import binascii
+import json
+import logging
+import re
+import sqlite3
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.local_store import LocalStore, local_store
+from utils.money import format_minor
+
+
+logger = logging.getLogger(__name__)
+
+
+CURSOR_PREFIX = "s1:"
+
+# Слова запроса: буквы и цифры; необязательная * в конце — поиск по началу слова.
+QUERY_TERM = re.compile(r"(\w+)(\*?)")
+
+
+class InvalidSearch(ValueError):
+    pass
+
+
+def parse_terms(text: str) -> List[Tuple[str, bool]]:
+    """Слова запроса [(слово, по началу ли)]; кавычки, скобки и операторы FTS5 отбрасываются."""
+    terms = [(word, bool(star)) for word, star in QUERY_TERM.findall(text)]
+    if not terms:
+        raise InvalidSearch("Пустой поисковый запрос")
+    return terms
+
+
+def build_match(terms: List[Tuple[str, bool]]) -> str:
+    """Выражение FTS5: все слова должны встретиться в описании или контрагенте."""
+    return " AND ".join(f'"{word}"{"*" if prefix else ""}' for word, prefix in terms)
+
+
+def highlight_pattern(terms: List[Tuple[str, bool]]) -> re.Pattern:
+    """Регулярное выражение слов запроса для подсветки: целые слова, со * — по началу."""
+    suffix = {True: r"\w*\b", False: r"\b"}
+    return re.compile("|".join(r"\b" + re.escape(word) + suffix[prefix] for word, prefix in terms), re.IGNORECASE)
+
+
+def highlight(pattern: re.Pattern, *texts: Optional[str]) -> Optional[str]:
+    """
+    Первое из полей, где нашлись слова запроса, с найденными словами в [скобках].
+    Строится в Python для строк страницы: функция snippet() FTS5 заново выполняла бы
+    поиск для каждой строки, что для запросов по началу слова стоит десятки миллисекунд.
+    """
+    for text in texts:
+        if text and pattern.search(text):
+            return pattern.sub(lambda found: f"[{found.group(0)}]", text)
+    return None
+
+
+def encode_cursor(order: str, sort_key: Any, row_id: int) -> str:
+    raw = CURSOR_PREFIX + json.dumps([order, sort_key, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], order: str) -> Optional[Tuple[Any, int]]:
+    """(sort_key, id) последней строки предыдущей страницы; None — первая страница."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        if not raw.startswith(CURSOR_PREFIX):
+            raise ValueError(raw)
+        cursor_order, sort_key, row_id = json.loads(raw[len(CURSOR_PREFIX):])
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidSearch(f"Некорректный курсор: {cursor}")
+    if cursor_order != order or not isinstance(sort_key, (int, float)) or not isinstance(row_id, int):
+        raise InvalidSearch(f"Некорректный курсор: {cursor}")
+    return sort_key, row_id
+
+
+def _hit(row: Dict[str, Any], pattern: re.Pattern) -> Dict[str, Any]:
+    booked_at = row["booked_at"]
+    return {
+        "bank_name": row["bank_name"],
+        "account_id": row["account_id"],
+        "transaction_id": row["entity_id"].split(":", 1)[1],
+        "booked_at": datetime.fromtimestamp(booked_at, timezone.utc) if booked_at is not None else None,
+        "amount": {"minor": row["amount_minor"], "amount": format_minor(row["amount_minor"], row["currency"])},
+        "currency": row["currency"],
+        "description": row["description"],
+        "counterparty": row["counterparty"],
+        "category": row["category"],
+        "snippet": highlight(pattern, row["description"], row["counterparty"]),
+    }
+
+
+class TransactionSearch:
+    """
+    Поиск «где я платил X» по транзакциям клиента во всех банках через индекс FTS5
+    в локальном хранилище. Индекс пополняется при каждой записи счетов (синхронизации)
+    только изменившимися транзакциями, поэтому поиск не обращается к банкам.
+    """
+
+    def __init__(self, store: LocalStore):
+        self.store = store
+
+    async def search(self, client_id: str, text: str, order: str = "date", limit: int = 20,
+                     cursor: Optional[str] = None, bank_names: Optional[List[str]] = None,
+                     account_id: Optional[str] = None, date_from: Optional[date] = None,
+                     date_to: Optional[date] = None, amount_min: Optional[int] = None,
+                     amount_max: Optional[int] = None, currency: Optional[str] = None) -> Dict[str, Any]:
+        """{"items": [...], "cursor": курсор следующей страницы или None}."""
+        terms = parse_terms(text)
+        match = build_match(terms)
+        after = decode_cursor(cursor, order)
+        booked_from = int(datetime.combine(date_from, datetime.min.time(), timezone.utc).timestamp()) if date_from else None
+        booked_to = (int(datetime.combine(date_to + timedelta(days=1), datetime.min.time(), timezone.utc).timestamp()) - 1
+                     if date_to else None)
+        started = time.perf_counter()
+        try:
+            rows = await asyncio.to_thread(
+                self.store.search_transactions, client_id, match, order, limit + 1, after, bank_names, account_id,
+                booked_from, booked_to, amount_min, amount_max, currency)
+        except sqlite3.OperationalError as e:
+            raise InvalidSearch(f"Некорректный поисковый запрос: {e}")
+        logger.info(f"Поиск транзакций клиента {client_id} ({match}): {min(len(rows), limit)} за "
+                    f"{(time.perf_counter() - started) * 1000:.1f} ms")
+        next_cursor = encode_cursor(order, rows[limit - 1]["sort_key"], rows[limit - 1]["id"]) if len(rows) > limit else None
+        pattern = highlight_pattern(terms)
+        return {"items": [_hit(row, pattern) for row in rows[:limit]], "cursor": next_cursor}
+
+
+transaction_search = TransactionSearch(local_store)
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+
+# Сервисы открывают свои базы при импорте, поэтому каталог данных и настройки
+# задаются до первого импорта модулей приложения.
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="projects2-test-"))
+os.environ.setdefault("CONSENT_PROPAGATION_DELAY", "0")
+os.environ.setdefault("FX_SOURCE", "file")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
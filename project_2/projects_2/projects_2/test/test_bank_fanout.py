@@ -0,0 +1,107 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import Response
+
+import api.banks
+from config import settings
+from models.bulk_request import BankAccountRequest, PartialBulkAccountsResponse
+from services.bank_service import BankService
+from services.http_client import create_bank_client
+
+
+BANK_CONFIG = {"name": "testbank", "api_base_url": "http://bank.test", "client_id": "team", "client_secret": "secret"}
+
+
+class TestBankClient:
+    def test_limits_and_timeouts(self, monkeypatch):
+        """Размер пула и таймауты клиента банка берутся из настроек"""
+        monkeypatch.setattr(settings, "bank_http_mode", "live")
+        monkeypatch.setattr(settings, "bank_rate_limit", 0)
+        monkeypatch.setattr(settings, "bank_max_connections", 7)
+        monkeypatch.setattr(settings, "bank_max_keepalive_connections", 3)
+        monkeypatch.setattr(settings, "bank_pool_timeout", 12.0)
+        client = create_bank_client("testbank")
+        pool = client._transport._pool
+        assert (pool._max_connections, pool._max_keepalive_connections) == (7, 3)
+        assert client.timeout == httpx.Timeout(settings.bank_request_timeout, pool=12.0)
+        asyncio.run(client.aclose())
+
+
+class TestClientFanout:
+    @pytest.fixture(autouse=True)
+    def service(self, monkeypatch):
+        monkeypatch.setattr(settings, "accounts_cache_ttl", 0)
+        monkeypatch.setattr(settings, "bank_client_concurrency", 3)
+        self.service = BankService(BANK_CONFIG)
+        self.running = 0
+        self.max_running = 0
+        self.failing = set()
+
+        async def request_consent_if_needed(client_id):
+            return f"consent-{client_id}"
+
+        async def get_all_account_details(client_id, consent_id):
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            try:
+                await asyncio.sleep(0.01)
+                if client_id in self.failing:
+                    raise httpx.PoolTimeout("pool")
+                return [{"accountId": f"{client_id}-acc"}]
+            finally:
+                self.running -= 1
+
+        self.service.request_consent_if_needed = request_consent_if_needed
+        self.service.get_all_account_details = get_all_account_details
+
+    def test_concurrency_bounded(self):
+        """Одновременно обрабатывается не больше bank_client_concurrency клиентов банка, остальные ждут"""
+        client_ids = [f"c{i}" for i in range(20)]
+        accounts, complete = asyncio.run(self.service.get_accounts_for_client_list_within_deadline(client_ids, None))
+        assert self.max_running == 3
+        assert all(complete.values()) and len(accounts) == 20
+
+    def test_failed_clients_incomplete(self):
+        """Без дедлайна клиент, которого не удалось получить, помечается неполным, а не пустым успехом"""
+        self.failing = {"c1"}
+        accounts, complete = asyncio.run(self.service.get_accounts_for_client_list_within_deadline(["c0", "c1"], None))
+        assert complete == {"c0": True, "c1": False}
+        assert accounts["c1"] == []
+
+
+class TestBulkEndpoint:
+    @pytest.fixture(autouse=True)
+    def services(self, monkeypatch):
+        self.completeness = {}
+
+        async def within_deadline(bank_requests, deadline):
+            return ({req["bank_name"]: {client_id: [] for client_id in req["client_ids"]} for req in bank_requests},
+                    {req["bank_name"]: {"complete": all(self.completeness.get(c, True) for c in req["client_ids"]),
+                                        "clients": {c: self.completeness.get(c, True) for c in req["client_ids"]}}
+                     for req in bank_requests})
+
+        monkeypatch.setattr(api.banks.multi_bank_service, "list_connected_banks", lambda: ["vbank"])
+        monkeypatch.setattr(api.banks.multi_bank_service, "get_accounts_for_multiple_banks_within_deadline",
+                            within_deadline)
+
+    def bulk(self):
+        response = Response()
+        body = asyncio.run(api.banks.get_accounts_for_banks(
+            [BankAccountRequest(bank_name="vbank", client_ids=["c0", "c1"])], response, None, None, None, None))
+        return body, response
+
+    def test_complete(self):
+        """Полный ответ без дедлайна — прежний формат с ETag"""
+        body, response = self.bulk()
+        assert body == {"vbank": {"c0": [], "c1": []}}
+        assert "etag" in response.headers
+
+    def test_failed_client(self):
+        """Если клиента получить не удалось, ответ без дедлайна помечен complete=false и не кэшируется"""
+        self.completeness = {"c1": False}
+        body, response = self.bulk()
+        assert isinstance(body, PartialBulkAccountsResponse) and not body.complete
+        assert body.completeness["vbank"].clients == {"c0": True, "c1": False}
+        assert "etag" not in response.headers
@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+import httpx
+
+from services.bank_service import BankService
+
+
+BANK_CONFIG = {"name": "testbank", "api_base_url": "http://bank.test", "client_id": "team", "client_secret": "secret"}
+
+
+class TestBankToken:
+    def setup_method(self):
+        self.service = BankService(BANK_CONFIG)
+        self.service.consent_ids = {"c1": "consent-1"}
+        self.issued = []
+        self.revoked = set()
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/auth/bank-token":
+                token = f"token-{len(self.issued) + 1}"
+                self.issued.append(token)
+                return httpx.Response(200, json={"access_token": token, "expires_in": 3600})
+            if request.headers["Authorization"].removeprefix("Bearer ") in self.revoked:
+                return httpx.Response(401, json={"detail": "Invalid or expired token"})
+            return httpx.Response(200, json={"data": {"account": [{"accountId": "a1"}]}})
+
+        self.service._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    def test_expired_token_is_refreshed(self):
+        """Токен с истёкшим сроком заменяется новым до запроса"""
+        async def scenario():
+            await self.service.authenticate()
+            await self.service.authenticate()
+            self.service.token_expires_at = time.time() - 1
+            await self.service.authenticate()
+
+        asyncio.run(scenario())
+        assert self.issued == ["token-1", "token-2"]
+        assert self.service.token == "token-2" and self.service.token_expires_at > time.time()
+
+    def test_unauthorized_refreshes_token_and_keeps_consent(self):
+        """На 401 сбрасывается токен, а согласие клиента остаётся"""
+        async def scenario():
+            await self.service.authenticate()
+            self.revoked.add("token-1")
+            return await self.service.get_account_list("c1", "consent-1")
+
+        accounts = asyncio.run(scenario())
+        assert accounts == [{"accountId": "a1"}]
+        assert self.issued == ["token-1", "token-2"]
+        assert self.service.consent_ids == {"c1": "consent-1"}
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+from models.bulk_payment import PaymentInstruction
+from services.bank_service import PaymentOutcomeUnknownError
+from services.bulk_payments import BulkPaymentError, BulkPaymentExecutor
+from services.idempotency import IdempotencyStore
+from services.payment_consent_pool import ConsentLimitExceeded
+from services.state_store import StateStore
+
+
+class PaymentResponse:
+    def __init__(self, payment_id: str):
+        self.payment_id = payment_id
+
+    def model_dump(self, mode=None):
+        return {"paymentId": self.payment_id}
+
+
+class FakeBank:
+    """Банк, который проводит платежи за delay секунд и считает одновременные платежи."""
+
+    def __init__(self, delay: float = 0.0, errors=None):
+        self.delay = delay
+        self.errors = errors or {}
+        self.paid = []
+        self.running = 0
+        self.max_running = 0
+
+    async def execute_payment(self, client_id, consent_id, payment_data):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+            error = self.errors.get(payment_data["ref"])
+            if error is not None:
+                raise error
+            self.paid.append(payment_data["ref"])
+            return PaymentResponse(f"{client_id}-{payment_data['ref']}")
+        finally:
+            self.running -= 1
+
+
+def instruction(bank_name: str, ref: str, client_id: str = "client-1", key=None):
+    return PaymentInstruction(bank_name=bank_name, client_id=client_id, consent_id="consent",
+                              payment_data={"ref": ref}, idempotency_key=key)
+
+
+class TestBulkPayments:
+    def setup_method(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.idempotency = IdempotencyStore(StateStore(os.path.join(self.tmp.name, "state.db")),
+                                            ttl=60, lock_ttl=5, wait_timeout=2)
+        self.executor = BulkPaymentExecutor(self.idempotency, max_payments=5, per_bank_limit=2)
+        self.services = {"vbank": FakeBank(0.02), "abank": FakeBank(0.02)}
+
+    def teardown_method(self):
+        self.tmp.cleanup()
+
+    def run(self, batch_id, payments, services=None):
+        services = services or self.services
+
+        async def scenario():
+            keys = self.executor.prepare(batch_id, payments, services)
+            return [result async for result in self.executor.execute(batch_id, payments, keys, services)]
+
+        return sorted(asyncio.run(scenario()), key=lambda result: result["index"])
+
+    @pytest.mark.parametrize("payments, message", [
+        ([], "пуст"),
+        ([instruction("vbank", str(i)) for i in range(6)], "больше 5"),
+        ([instruction("vbank", "1"), instruction("sbank", "2")], "sbank"),
+        ([instruction("vbank", "1", key="k"), instruction("vbank", "2", key="k")], "idempotency_key"),
+    ])
+    def test_prepare_rejects(self, payments, message):
+        """Пустой, слишком большой пакет, неизвестный банк и повтор ключа отклоняются до платежей"""
+        with pytest.raises(BulkPaymentError, match=message):
+            self.executor.prepare("batch", payments, self.services)
+
+    def test_prepare_keys(self):
+        """Ключ по умолчанию строится из batch_id и номера; одинаковый ключ у разных клиентов и банков допустим"""
+        keys = self.executor.prepare("batch", [
+            instruction("vbank", "1", key="k"), instruction("abank", "2", key="k"),
+            instruction("vbank", "3", client_id="client-2", key="k"), instruction("vbank", "4")], self.services)
+        assert keys == ["k", "k", "k", "bulk:batch:3"]
+
+    def test_execute(self):
+        """Платежи идут параллельно, не больше per_bank_limit на банк; ошибки не прерывают пакет"""
+        self.services["vbank"].errors = {"2": PaymentOutcomeUnknownError("timeout"),
+                                         "3": ConsentLimitExceeded("limit"), "4": RuntimeError("boom")}
+        results = self.run("batch", [instruction("vbank", ref) for ref in "01234"])
+        assert [result["status"] for result in results] == [200, 200, 502, 422, 500]
+        assert results[0]["body"] == {"paymentId": "client-1-0"} and not results[0]["replayed"]
+        assert self.services["vbank"].max_running == 2
+
+    def test_resume(self):
+        """Повтор пакета с тем же batch_id не платит повторно, а доводит непроведённые платежи"""
+        self.services["vbank"].errors = {"1": RuntimeError("boom")}
+        payments = [instruction("vbank", "0"), instruction("vbank", "1"), instruction("abank", "2")]
+        first = self.run("batch", payments)
+        assert [result["status"] for result in first] == [200, 500, 200]
+
+        self.services["vbank"].errors = {}
+        second = self.run("batch", payments)
+        assert [(result["status"], result["replayed"]) for result in second] == [(200, True), (200, False), (200, True)]
+        assert second[0]["body"] == first[0]["body"]
+        assert self.services["vbank"].paid == ["0", "1"] and self.services["abank"].paid == ["2"]
+
+    def test_key_reused(self):
+        """Тот же ключ пакета с другими параметрами платежа — 422 без обращения к банку"""
+        self.run("batch", [instruction("vbank", "0")])
+        results = self.run("batch", [instruction("vbank", "changed")])
+        assert results[0]["status"] == 422
+        assert self.services["vbank"].paid == ["0"]
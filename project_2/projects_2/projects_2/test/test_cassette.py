@@ -0,0 +1,79 @@
+import asyncio
+import gzip
+import tempfile
+from pathlib import Path
+
+import httpx
+import pytest
+
+import services.http_client
+from config import settings
+from services.cassette import REDACTED, Cassette, CassetteMissError, RecordingTransport, ReplayTransport
+from services.http_client import get_cassette
+
+
+class TestCassette:
+    def setup_method(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "cassettes" / "testbank.jsonl.gz"
+        self.balance = 0
+
+        def bank(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/auth/bank-token":
+                return httpx.Response(200, json={"access_token": "live-token", "token_type": "bearer",
+                                                 "expires_in": 3600})
+            self.balance += 100
+            return httpx.Response(200, json={"data": {"balance": self.balance}}, headers={"X-Bank": "test"})
+
+        self.bank = httpx.MockTransport(bank)
+
+    def teardown_method(self):
+        self.tmp.cleanup()
+
+    def calls(self, transport):
+        async def scenario():
+            async with httpx.AsyncClient(transport=transport, base_url="http://bank.test") as client:
+                token = await client.post("/auth/bank-token", params={"client_id": "team", "client_secret": "secret"})
+                balances = [await client.get("/accounts/a1/balances") for _ in range(3)]
+                return token, balances
+
+        return asyncio.run(scenario())
+
+    def test_record_replay(self):
+        """Записанные ответы воспроизводятся без сети по порядку; токены в кассете заменены"""
+        cassette = Cassette.load(self.path)
+        token, balances = self.calls(RecordingTransport(cassette, self.bank))
+        assert token.json()["access_token"] == "live-token"
+        cassette.save()
+        assert b"live-token" not in gzip.decompress(self.path.read_bytes())
+        assert b"secret" not in gzip.decompress(self.path.read_bytes())
+
+        replay = ReplayTransport(Cassette.load(self.path), replay_latency=False)
+        replayed_token, replayed = self.calls(replay)
+        assert replayed_token.json() == {"access_token": REDACTED, "token_type": "bearer", "expires_in": 3600}
+        assert [r.json() for r in replayed] == [r.json() for r in balances] == [
+            {"data": {"balance": 100}}, {"data": {"balance": 200}}, {"data": {"balance": 300}}]
+        assert replayed[0].headers["X-Bank"] == "test"
+
+    def test_last_response_repeats(self):
+        """Для запроса, записанного меньше раз, чем повторён, повторяется последний ответ"""
+        cassette = Cassette.load(self.path)
+        self.calls(RecordingTransport(cassette, self.bank))
+        cassette.save()
+        replay = ReplayTransport(Cassette.load(self.path), replay_latency=False)
+        self.calls(replay)
+        _, again = self.calls(replay)
+        assert [r.json()["data"]["balance"] for r in again] == [300, 300, 300]
+
+    def test_miss(self):
+        """Запрос, которого нет в кассете, — CassetteMissError"""
+        replay = ReplayTransport(Cassette.load(self.path), replay_latency=False)
+        with pytest.raises(CassetteMissError):
+            self.calls(replay)
+
+    def test_cassette_in_data_dir(self, monkeypatch):
+        """Относительный cassette_dir отсчитывается от data_dir, а не от текущего каталога"""
+        monkeypatch.setattr(settings, "data_dir", self.tmp.name)
+        monkeypatch.setattr(settings, "cassette_dir", "cassettes")
+        monkeypatch.setattr(services.http_client, "_cassettes", {})
+        assert get_cassette("testbank").path == self.path
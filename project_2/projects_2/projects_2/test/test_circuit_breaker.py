@@ -0,0 +1,116 @@
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+import pytest
+
+from services.bank_service import BankService
+from services.circuit_breaker import CircuitBreaker, CircuitBreakerTransport, CircuitOpenError
+from services.local_store import LocalStore
+
+
+BANK_CONFIG = {"name": "testbank", "api_base_url": "http://bank.test", "client_id": "team", "client_secret": "secret"}
+
+
+class TestCircuitBreakerTransport:
+    def setup_method(self):
+        self.breaker = CircuitBreaker("testbank", failure_threshold=3, reset_timeout=0.05)
+        self.outcomes = []
+        self.calls = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.calls += 1
+            outcome = self.outcomes.pop(0) if self.outcomes else 200
+            if isinstance(outcome, Exception):
+                raise outcome
+            return httpx.Response(outcome, json={})
+
+        self.transport = CircuitBreakerTransport(httpx.MockTransport(handler), self.breaker)
+
+    def send(self, *outcomes):
+        """Отправляет по запросу на каждый исход; возвращает статусы или имена исключений."""
+        self.outcomes = list(outcomes)
+
+        async def scenario():
+            results = []
+            async with httpx.AsyncClient(transport=self.transport) as client:
+                for _ in outcomes:
+                    try:
+                        results.append((await client.get("http://bank.test/accounts")).status_code)
+                    except httpx.TransportError as e:
+                        results.append(type(e).__name__)
+            return results
+
+        return asyncio.run(scenario())
+
+    def test_opens_after_threshold(self):
+        """Серия сетевых ошибок и 5xx размыкает цепь; дальше запросы не доходят до банка"""
+        assert self.send(httpx.ConnectError("down"), 503, httpx.ReadTimeout("slow"), 200) == [
+            "ConnectError", 503, "ReadTimeout", "CircuitOpenError"]
+        assert self.breaker.state == CircuitBreaker.OPEN and self.calls == 3
+
+    def test_success_resets_counter(self):
+        """Успешный ответ и 4xx обнуляют счётчик отказов подряд"""
+        self.send(503, 503, 404, 503, 503)
+        assert self.breaker.state == CircuitBreaker.CLOSED
+
+    def test_client_side_errors_ignored(self):
+        """Переполненный пул соединений — не отказ банка, цепь остаётся замкнутой"""
+        self.send(*[httpx.PoolTimeout("pool") for _ in range(10)])
+        assert self.breaker.state == CircuitBreaker.CLOSED and self.calls == 10
+
+    def test_half_open_probe(self):
+        """После reset_timeout проходит один пробный запрос: отказ снова размыкает, успех замыкает"""
+        self.send(503, 503, 503)
+        time.sleep(0.06)
+        assert self.breaker.state == CircuitBreaker.HALF_OPEN
+        assert self.send(503, 200) == [503, "CircuitOpenError"]
+        assert self.breaker.state == CircuitBreaker.OPEN
+        time.sleep(0.06)
+        assert self.send(200, 200) == [200, 200]
+        assert self.breaker.state == CircuitBreaker.CLOSED
+
+    def test_probe_client_side_error(self):
+        """Пробный запрос, упавший на нашей стороне, не размыкает цепь и освобождает пробу"""
+        self.send(503, 503, 503)
+        time.sleep(0.06)
+        assert self.send(httpx.PoolTimeout("pool"), 200) == ["PoolTimeout", 200]
+        assert self.breaker.state == CircuitBreaker.CLOSED
+
+
+class TestStaleFallback:
+    def setup_method(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.service = BankService(BANK_CONFIG)
+        self.service.local_store = LocalStore(os.path.join(self.tmp.name, "local.db"))
+        self.service.local_store.save_client_accounts("testbank", "c1", [{"accountId": "a1", "currency": "RUB"}],
+                                                      1000.0)
+        self.service.circuit = CircuitBreaker("testbank", failure_threshold=1, reset_timeout=60)
+        self.calls = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.calls += 1
+            raise httpx.ConnectError("down", request=request)
+
+        self.service._http = httpx.AsyncClient(
+            transport=CircuitBreakerTransport(httpx.MockTransport(handler), self.service.circuit))
+
+    def teardown_method(self):
+        self.tmp.cleanup()
+
+    def test_open_circuit_serves_stale(self):
+        """Недоступный банк размыкает цепь, клиенту отдаются сохранённые счета с source=cache"""
+        first = asyncio.run(self.service.fetch_client_accounts("c1"))
+        assert self.service.circuit.state == CircuitBreaker.OPEN
+        calls = self.calls
+        second = asyncio.run(self.service.fetch_client_accounts("c1"))
+        assert first == second == [{"accountId": "a1", "currency": "RUB", "source": "cache"}]
+        assert self.calls == calls
+
+    def test_no_stale_data(self):
+        """Без сохранённых данных ошибка разомкнутой цепи пробрасывается"""
+        asyncio.run(self.service.fetch_client_accounts("c1"))
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(self.service.fetch_client_accounts("c2"))
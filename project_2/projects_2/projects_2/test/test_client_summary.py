@@ -0,0 +1,74 @@
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+import api.clients
+from services.fx import FileRateSource, FxRates
+from services.local_store import LocalStore
+from services.state_store import StateStore
+
+
+def account(account_id: str, amount: str, currency: str):
+    return {"accountId": account_id, "currency": currency,
+            "balances": [{"type": "InterimAvailable", "creditDebitIndicator": "Credit",
+                          "amount": {"amount": amount, "currency": currency}}]}
+
+
+class TestClientSummary:
+    def setup_method(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = LocalStore(os.path.join(self.tmp.name, "local.db"))
+        rates_path = os.path.join(self.tmp.name, "rates.json")
+        with open(rates_path, "w") as f:
+            json.dump({"base": "RUB", "as_of": "2026-10-01", "rates": {"USD": "90"}}, f)
+        self.fx = FxRates(FileRateSource(rates_path), StateStore(os.path.join(self.tmp.name, "state.db")), 3600, "RUB")
+
+    def teardown_method(self):
+        self.tmp.cleanup()
+
+    @pytest.fixture(autouse=True)
+    def services(self, monkeypatch):
+        monkeypatch.setattr(api.clients, "local_store", self.store)
+        monkeypatch.setattr(api.clients, "fx_rates", self.fx)
+        monkeypatch.setattr(api.clients.multi_bank_service, "list_connected_banks", lambda: ["vbank", "abank"])
+
+    def summary(self, currency=None):
+        async def scenario():
+            await self.fx.refresh()
+            return await api.clients.client_summary("c1", currency)
+        return asyncio.run(scenario())
+
+    def save(self, bank_name, accounts):
+        from utils.money import normalize_account
+        self.store.save_client_accounts(bank_name, "c1", [normalize_account(a) for a in accounts], 1_700_000_000)
+
+    def test_converted_total(self):
+        self.save("vbank", [account("a1", "100.50", "RUB"), account("a2", "10", "USD")])
+        self.save("abank", [account("b1", "99.50", "RUB")])
+        summary = self.summary()
+        assert [(t.currency, t.minor, t.accounts) for t in summary.totals] == [("RUB", 20000, 2), ("USD", 1000, 1)]
+        assert (summary.converted.minor, summary.converted.amount, summary.converted.missing_rates) == (110000, "1100.00", [])
+
+    def test_missing_rate_gives_no_total(self):
+        """Без курса одной из валют общий итог не считается, а не выдаётся частичным"""
+        self.save("vbank", [account("a1", "100.00", "RUB"), account("a2", "10", "CHF")])
+        converted = self.summary().converted
+        assert (converted.minor, converted.amount, converted.missing_rates) == (None, None, ["CHF"])
+
+    def test_balances_backfilled_for_existing_accounts(self):
+        """Счета, сохранённые до появления client_balances, попадают в сводку без новой синхронизации"""
+        self.save("vbank", [account("a1", "100.00", "RUB"), account("a2", "5.25", "RUB")])
+        conn = sqlite3.connect(self.store.db_path)
+        with conn:
+            conn.execute("DROP TABLE client_balances")
+            conn.execute("UPDATE accounts SET balance_minor = NULL, currency = NULL, "
+                         "data = json_remove(data, '$.balance_minor', '$.balance_currency') WHERE account_id = 'a2'")
+        conn.close()
+
+        self.store = LocalStore(self.store.db_path)
+        rows = self.store.client_balances("c1", ["vbank"])
+        assert [(row["currency"], row["total_minor"], row["accounts"]) for row in rows] == [("RUB", 10525, 2)]
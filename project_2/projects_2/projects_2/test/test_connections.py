@@ -0,0 +1,67 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+from config import settings
+from services.multi_bank_service import MultiBankService
+from services.state_store import StateStore
+
+
+def bank_config(name: str, secret: str = "secret"):
+    return {"name": name, "api_base_url": f"http://{name}.test", "client_id": "team", "client_secret": secret}
+
+
+class TestConnectionRegistrySync:
+    def setup_method(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = StateStore(os.path.join(self.tmp.name, "state.db"))
+
+    def teardown_method(self):
+        self.tmp.cleanup()
+
+    @pytest.fixture(autouse=True)
+    def no_sync_interval(self, monkeypatch):
+        monkeypatch.setattr(settings, "connections_sync_interval", 0.0)
+
+    def test_sync_runs_in_background(self):
+        """Подключение другого процесса появляется после фоновой сверки, а не блокирует вызов"""
+        async def scenario():
+            first, second = MultiBankService(self.store), MultiBankService(self.store)
+            await first.add_bank_connection(bank_config("vbank"))
+            before = second.list_connected_banks()
+            await second._connections_sync_task
+            after = second.list_connected_banks()
+            await second._connections_sync_task
+
+            await second.remove_bank_connection("vbank")
+            first.list_connected_banks()
+            await first._connections_sync_task
+            return before, after, first.list_connected_banks()
+
+        before, after, removed = asyncio.run(scenario())
+        assert before == [] and after == ["vbank"] and removed == []
+
+    def test_local_change_wins_over_stale_read(self):
+        """Чтение реестра, начатое до локального подключения, не откатывает его"""
+        async def scenario():
+            service = MultiBankService(self.store)
+            service.list_connected_banks()
+            await service.add_bank_connection(bank_config("abank"))
+            await service._connections_sync_task
+            return service.list_connected_banks()
+
+        assert asyncio.run(scenario()) == ["abank"]
+
+    def test_reconfigure_resets_shared_token(self):
+        """Смена учётных данных сбрасывает общий токен банка"""
+        async def scenario():
+            service = MultiBankService(self.store)
+            await service.add_bank_connection(bank_config("vbank"))
+            service.get_service("vbank")
+            await asyncio.to_thread(self.store.set, "tokens", "vbank", {"access_token": "t", "expires_at": 1e12})
+            await service.add_bank_connection(bank_config("vbank", secret="rotated"))
+            return await asyncio.to_thread(self.store.get, "tokens", "vbank")
+
+        assert asyncio.run(scenario()) is None
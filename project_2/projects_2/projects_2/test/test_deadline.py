@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import httpx
+
+from services.bank_service import BankService
+from services.deadline import Deadline, current_deadline, deadline_scope, sleep_within_deadline
+
+
+BANK_CONFIG = {"name": "testbank", "api_base_url": "http://bank.test", "client_id": "team", "client_secret": "secret"}
+
+
+class TestAccountsWithinDeadline:
+    def setup_method(self):
+        self.service = BankService(BANK_CONFIG)
+        self.delays = {"fast": 0.0, "slow": 0.2}
+        self.deadlines = []
+
+        async def request_consent_if_needed(client_id):
+            return f"consent-{client_id}"
+
+        async def get_all_account_details(client_id, consent_id):
+            self.deadlines.append(current_deadline())
+            await sleep_within_deadline(self.delays[client_id], "test")
+            return [{"accountId": f"{client_id}-acc"}]
+
+        self.service.request_consent_if_needed = request_consent_if_needed
+        self.service.get_all_account_details = get_all_account_details
+
+    def test_partial_result(self):
+        """Незавершённый к дедлайну клиент получает пустой список и признак неполноты"""
+        async def scenario():
+            accounts, complete = await self.service.get_accounts_for_client_list_within_deadline(
+                ["fast", "slow"], Deadline(0.05))
+            await asyncio.gather(*self.service._inflight_clients.values())
+            return accounts, complete
+
+        accounts, complete = asyncio.run(scenario())
+        assert accounts == {"fast": [{"accountId": "fast-acc", "as_of": accounts["fast"][0]["as_of"], "source": "live"}],
+                            "slow": []}
+        assert complete == {"fast": True, "slow": False}
+
+    def test_background_task_fills_cache(self):
+        """Прерванный дедлайном клиент дообрабатывается в фоне без дедлайна и попадает в кэш"""
+        deadline = Deadline(0.05)
+
+        async def scenario():
+            _, complete = await self.service.get_accounts_for_client_list_within_deadline(["slow"], deadline)
+            assert complete == {"slow": False}
+            await asyncio.gather(*self.service._inflight_clients.values())
+
+        asyncio.run(scenario())
+        assert self.deadlines == [deadline, None]
+        assert self.service.accounts_cache["slow"][1] == [
+            {"accountId": "slow-acc", "as_of": self.service.accounts_cache["slow"][1][0]["as_of"], "source": "live"}]
+
+    def test_inflight_task_reused(self):
+        """Повторный запрос во время фоновой дообработки получает ту же задачу, а не новую"""
+        async def scenario():
+            await self.service.get_accounts_for_client_list_within_deadline(["slow"], Deadline(0.05))
+            first = self.service._inflight_clients["slow"]
+            accounts, complete = await self.service.get_accounts_for_client_list_within_deadline(["slow"], Deadline(1.0))
+            return first, accounts, complete
+
+        first, accounts, complete = asyncio.run(scenario())
+        assert first.done() and complete == {"slow": True}
+        assert accounts["slow"][0]["accountId"] == "slow-acc"
+        assert len(self.deadlines) == 2 and self.deadlines[1] is None
+
+
+class TestBackoffWithinDeadline:
+    def setup_method(self):
+        self.service = BankService(BANK_CONFIG)
+        self.consent_requests = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/auth/bank-token":
+                return httpx.Response(200, json={"access_token": "token", "expires_in": 3600})
+            self.consent_requests += 1
+            return httpx.Response(503, json={"detail": "unavailable"})
+
+        self.service._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    def test_backoff_cut_short(self):
+        """Backoff длиннее оставшегося бюджета не ждётся: клиент сразу отдаётся фоновой дообработке"""
+        async def scenario():
+            started = time.perf_counter()
+            _, complete = await self.service.get_accounts_for_client_list_within_deadline(["c1"], Deadline(0.5))
+            return time.perf_counter() - started, complete, self.consent_requests, "c1" in self.service._inflight_clients
+
+        elapsed, complete, requests, background = asyncio.run(scenario())
+        assert complete == {"c1": False}
+        # Одна попытка задачи запроса и первая попытка фоновой задачи; ожидания backoff не было.
+        assert elapsed < 0.4 and requests == 2
+        assert background
+
+    def test_backoff_without_deadline(self):
+        """Без дедлайна backoff не прерывается"""
+        async def scenario():
+            with deadline_scope(None):
+                task = asyncio.create_task(self.service.request_consent_if_needed("c1"))
+                await asyncio.sleep(1.2)
+                task.cancel()
+            return self.consent_requests
+
+        assert asyncio.run(scenario()) == 2
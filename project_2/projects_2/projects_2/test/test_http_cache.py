@@ -0,0 +1,20 @@
+from utils.http_cache import etag_matches, make_etag
+
+
+class TestEtag:
+    def test_weak(self):
+        """ETag слабый: одна версия данных отдаётся и сжатой gzip, и без сжатия"""
+        etag = make_etag("vbank", "c1", 3)
+        assert etag.startswith('W/"') and etag.endswith('"')
+        assert etag == make_etag("vbank", "c1", 3) != make_etag("vbank", "c1", 4)
+
+    def test_matches(self):
+        """If-None-Match сравнивается слабо: с префиксом W/ и без, в списке и через *"""
+        etag = make_etag("v1")
+        opaque = etag.removeprefix("W/")
+        assert etag_matches(etag, etag)
+        assert etag_matches(opaque, etag)
+        assert etag_matches(f'"other", {opaque}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches(None, etag)
+        assert not etag_matches(make_etag("v2"), etag)
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+from services.idempotency import IdempotencyInProgress, IdempotencyKeyReused, IdempotencyStore, request_fingerprint
+from services.state_store import StateStore
+
+
+class TestIdempotencyStore:
+    def setup_method(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "state.db")
+        self.store = IdempotencyStore(StateStore(self.db_path), ttl=60, lock_ttl=5, wait_timeout=2)
+        self.calls = 0
+
+    def teardown_method(self):
+        self.tmp.cleanup()
+
+    def operation(self, delay: float = 0.0, fail: bool = False):
+        async def run():
+            self.calls += 1
+            await asyncio.sleep(delay)
+            if fail:
+                raise RuntimeError("bank down")
+            return 201, {"paymentId": f"p{self.calls}"}
+        return run
+
+    def test_replay(self):
+        """Повтор с тем же ключом и параметрами отдаёт сохранённый результат, не выполняя операцию"""
+        fingerprint = request_fingerprint("vbank", "c1", {"amount": "10"})
+
+        async def scenario():
+            first = await self.store.execute("vbank", "c1", "key-1", fingerprint, self.operation())
+            second = await self.store.execute("vbank", "c1", "key-1", fingerprint, self.operation())
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        assert first == (201, {"paymentId": "p1"}, False)
+        assert second == (201, {"paymentId": "p1"}, True)
+        assert self.calls == 1
+
+    def test_fingerprint_mismatch(self):
+        """Тот же ключ с другими параметрами — IdempotencyKeyReused"""
+        async def scenario():
+            await self.store.execute("vbank", "c1", "key-1", request_fingerprint(1), self.operation())
+            await self.store.execute("vbank", "c1", "key-1", request_fingerprint(2), self.operation())
+
+        with pytest.raises(IdempotencyKeyReused):
+            asyncio.run(scenario())
+        assert self.calls == 1
+
+    def test_keys_scoped_by_bank_and_client(self):
+        """Одинаковый ключ у разных клиентов или банков — разные платежи"""
+        async def scenario():
+            return [await self.store.execute(bank_name, client_id, "key-1", request_fingerprint(bank_name, client_id),
+                                             self.operation())
+                    for bank_name, client_id in (("vbank", "c1"), ("vbank", "c2"), ("abank", "c1"))]
+
+        results = asyncio.run(scenario())
+        assert [replayed for _, _, replayed in results] == [False, False, False]
+        assert self.calls == 3
+
+    def test_failure_releases_key(self):
+        """Если операция упала, результат не сохраняется и ключ можно повторить"""
+        async def scenario():
+            with pytest.raises(RuntimeError):
+                await self.store.execute("vbank", "c1", "key-1", "f", self.operation(fail=True))
+            return await self.store.execute("vbank", "c1", "key-1", "f", self.operation())
+
+        assert asyncio.run(scenario()) == (201, {"paymentId": "p2"}, False)
+
+    def test_concurrent_duplicates_in_process(self):
+        """Одновременные дубликаты в процессе ждут первую попытку и получают её результат"""
+        async def scenario():
+            return await asyncio.gather(*(self.store.execute("vbank", "c1", "key-1", "f", self.operation(0.1))
+                                          for _ in range(5)))
+
+        results = asyncio.run(scenario())
+        assert self.calls == 1
+        assert sorted(replayed for _, _, replayed in results) == [False, True, True, True, True]
+        assert {body["paymentId"] for _, body, _ in results} == {"p1"}
+
+    def test_concurrent_duplicates_across_processes(self):
+        """Дубликат из другого процесса ждёт аренду ключа и получает сохранённый результат"""
+        other = IdempotencyStore(StateStore(self.db_path), ttl=60, lock_ttl=5, wait_timeout=2)
+
+        async def scenario():
+            return await asyncio.gather(self.store.execute("vbank", "c1", "key-1", "f", self.operation(0.3)),
+                                        other.execute("vbank", "c1", "key-1", "f", self.operation(0.3)))
+
+        results = asyncio.run(scenario())
+        assert self.calls == 1
+        assert sorted(replayed for _, _, replayed in results) == [False, True]
+
+    def test_wait_timeout(self):
+        """Дубликат, не дождавшийся первой попытки за wait_timeout, получает IdempotencyInProgress"""
+        self.store.wait_timeout = 0.1
+
+        async def scenario():
+            first = asyncio.create_task(self.store.execute("vbank", "c1", "key-1", "f", self.operation(0.5)))
+            await asyncio.sleep(0.01)
+            with pytest.raises(IdempotencyInProgress):
+                await self.store.execute("vbank", "c1", "key-1", "f", self.operation())
+            return await first
+
+        assert asyncio.run(scenario())[2] is False
+        assert self.calls == 1
@@ -0,0 +1,169 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+from services import job_manager as job_manager_module
+from services.job_manager import (JobManager, JobStore, ITEM_DONE, ITEM_FAILED, ITEM_PENDING, JOB_CANCELLED,
+                                  JOB_COMPLETED, JOB_QUEUED)
+
+
+class TestJobClaims:
+    def setup_method(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = JobStore(os.path.join(self.tmp.name, "jobs.db"))
+
+    def teardown_method(self):
+        self.tmp.cleanup()
+
+    def test_claim_is_exclusive(self):
+        """Действующий захват не выдаётся ни другому процессу, ни повторно самому владельцу"""
+        job_id, _ = self.store.create_job([{"bank_name": "vbank", "client_ids": ["c1"]}])
+        assert self.store.claim_item(job_id, 0, "worker-a", claim_ttl=60)
+        assert not self.store.claim_item(job_id, 0, "worker-b", claim_ttl=60)
+        assert not self.store.claim_item(job_id, 0, "worker-a", claim_ttl=60)
+        assert self.store.pending_items(claim_ttl=60) == []
+
+    def test_expired_claim_is_released(self):
+        """Захват упавшего процесса истекает через claim_ttl"""
+        job_id, _ = self.store.create_job([{"bank_name": "vbank", "client_ids": ["c1"]}])
+        assert self.store.claim_item(job_id, 0, "worker-a", claim_ttl=60)
+        assert self.store.pending_items(claim_ttl=0) == [(job_id, 0)]
+        assert self.store.claim_item(job_id, 0, "worker-b", claim_ttl=0)
+
+    def test_renew_claims(self):
+        """Продление обновляет только захваты владельца у незавершённых единиц"""
+        job_id, _ = self.store.create_job([{"bank_name": "vbank", "client_ids": ["c1", "c2"]}])
+        self.store.claim_item(job_id, 0, "worker-a", claim_ttl=60)
+        self.store.claim_item(job_id, 1, "worker-b", claim_ttl=60)
+        before = [self.store.get_item(job_id, seq)["claimed_at"] for seq in (0, 1)]
+        self.store.renew_claims("worker-a", [(job_id, 0), (job_id, 1)])
+        after = [self.store.get_item(job_id, seq)["claimed_at"] for seq in (0, 1)]
+        assert after[0] > before[0] and after[1] == before[1]
+
+
+class TestJobManager:
+    def setup_method(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = JobStore(os.path.join(self.tmp.name, "jobs.db"))
+        self.calls = []
+        self.delay = 0.0
+
+    def teardown_method(self):
+        self.tmp.cleanup()
+
+    @pytest.fixture(autouse=True)
+    def fake_fetch(self, monkeypatch):
+        async def fetch_client_accounts(bank_name, client_id):
+            self.calls.append((bank_name, client_id))
+            await asyncio.sleep(self.delay)
+            if client_id.startswith("broken"):
+                raise RuntimeError("bank down")
+            return [{"accountId": f"{client_id}-acc"}]
+
+        monkeypatch.setattr(job_manager_module.multi_bank_service, "fetch_client_accounts", fetch_client_accounts)
+
+    async def _wait_finished(self, job_id: str, timeout: float = 5.0):
+        for _ in range(int(timeout / 0.02)):
+            job = self.store.get_job(job_id)
+            if job["status"] not in (JOB_QUEUED, "running"):
+                return job
+            await asyncio.sleep(0.02)
+        raise AssertionError(f"Задача {job_id} не завершилась")
+
+    def test_long_item_runs_once(self):
+        """Единица работы дольше claim_ttl не перезапускается: захват продлевается, пока она выполняется"""
+        self.delay = 0.5
+
+        async def scenario():
+            manager = JobManager(self.store, workers=2, claim_ttl=0.2)
+            await manager.start()
+            try:
+                job = await manager.submit([{"bank_name": "vbank", "client_ids": ["c1"]}])
+                return await self._wait_finished(job["id"])
+            finally:
+                await manager.stop()
+
+        job = asyncio.run(scenario())
+        assert job["status"] == JOB_COMPLETED and job["done"] == 1
+        assert self.calls == [("vbank", "c1")]
+
+    def test_job_lifecycle(self):
+        """Задача проходит все единицы работы, ошибки клиента не прерывают остальные"""
+        async def scenario():
+            manager = JobManager(self.store, workers=2, claim_ttl=60)
+            await manager.start()
+            try:
+                job = await manager.submit([{"bank_name": "vbank", "client_ids": ["c1", "broken"]},
+                                            {"bank_name": "abank", "client_ids": ["c2"]}])
+                assert job["status"] == JOB_QUEUED and job["total"] == 3
+                await self._wait_finished(job["id"])
+                return await manager.get(job["id"]), await manager.results(job["id"])
+            finally:
+                await manager.stop()
+
+        job, (items, next_cursor) = asyncio.run(scenario())
+        assert (job["status"], job["done"], job["failed"]) == (JOB_COMPLETED, 2, 1)
+        assert [(item["client_id"], item["status"]) for item in items] == [
+            ("c1", ITEM_DONE), ("broken", ITEM_FAILED), ("c2", ITEM_DONE)]
+        assert items[0]["result"] == [{"accountId": "c1-acc"}] and items[1]["error"] == "bank down"
+        assert next_cursor is None
+
+    def test_empty_job_is_completed(self):
+        """Задача без клиентов сразу завершена, а не висит в очереди"""
+        async def scenario():
+            manager = JobManager(self.store, workers=1, claim_ttl=60)
+            return await manager.submit([{"bank_name": "vbank", "client_ids": []}]), await manager.submit([])
+
+        for job in asyncio.run(scenario()):
+            assert (job["status"], job["total"]) == (JOB_COMPLETED, 0)
+
+    def test_results_pagination(self):
+        """Результаты отдаются страницами по seq"""
+        job_id, seqs = self.store.create_job([{"bank_name": "vbank", "client_ids": [f"c{i}" for i in range(5)]}])
+        for seq in seqs:
+            self.store.finish_item(job_id, seq, ITEM_DONE, [])
+        first, cursor = self.store.results_page(job_id, -1, 2)
+        second, cursor = self.store.results_page(job_id, cursor, 2)
+        third, cursor = self.store.results_page(job_id, cursor, 2)
+        assert [item["seq"] for item in first + second + third] == [0, 1, 2, 3, 4]
+        assert cursor is None
+
+    def test_resume_after_restart(self):
+        """Новый процесс продолжает незавершённые единицы работы, выполненные не повторяет"""
+        job_id, _ = self.store.create_job([{"bank_name": "vbank", "client_ids": ["c1", "c2", "c3"]}])
+        self.store.set_status(job_id, "running")
+        self.store.finish_item(job_id, 0, ITEM_DONE, [])
+        self.store.claim_item(job_id, 1, "crashed-worker", claim_ttl=60)
+
+        async def scenario():
+            manager = JobManager(self.store, workers=2, claim_ttl=0.2)
+            await manager.start()
+            try:
+                return await self._wait_finished(job_id)
+            finally:
+                await manager.stop()
+
+        job = asyncio.run(scenario())
+        assert (job["status"], job["done"]) == (JOB_COMPLETED, 3)
+        assert sorted(self.calls) == [("vbank", "c2"), ("vbank", "c3")]
+
+    def test_cancel(self):
+        """Отменённая задача прерывает выполняющиеся единицы и не берёт новые"""
+        self.delay = 1.0
+
+        async def scenario():
+            manager = JobManager(self.store, workers=1, claim_ttl=60)
+            await manager.start()
+            try:
+                job = await manager.submit([{"bank_name": "vbank", "client_ids": ["c1", "c2"]}])
+                await asyncio.sleep(0.1)
+                return await manager.cancel(job["id"])
+            finally:
+                await manager.stop()
+
+        job = asyncio.run(scenario())
+        assert job["status"] == JOB_CANCELLED and job["done"] == 0
+        assert self.calls == [("vbank", "c1")]
+        assert [self.store.get_item(job["id"], seq)["status"] for seq in (0, 1)] == [ITEM_PENDING, ITEM_PENDING]
@@ -0,0 +1,90 @@
+import os
+import tempfile
+
+from services.local_store import LocalStore
+
+
+def account(account_id: str, amount: str, transactions=()):
+    return {"accountId": account_id, "currency": "RUB",
+            "balances": [{"type": "InterimAvailable", "amount": {"amount": amount, "currency": "RUB"}}],
+            "transactions": [{"transactionId": tx, "amount": {"amount": "1.00", "currency": "RUB"},
+                              "bookingDateTime": "2026-10-01T10:00:00Z"} for tx in transactions]}
+
+
+class TestChangesSince:
+    def setup_method(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = LocalStore(os.path.join(self.tmp.name, "local.db"))
+
+    def teardown_method(self):
+        self.tmp.cleanup()
+
+    def read_all(self, after_seq=0, limit=2, **filters):
+        """Все изменения постранично: (изменения, итоговый seq, число страниц)."""
+        changes, pages = [], 0
+        while True:
+            page, after_seq, has_more = self.store.changes_since(after_seq, limit, **filters)
+            changes += page
+            pages += 1
+            if not has_more:
+                return changes, after_seq, pages
+
+    def test_empty(self):
+        """Пустое хранилище: нет изменений, курсор 0"""
+        assert self.store.changes_since(0, 10) == ([], 0, False)
+
+    def test_pages_cover_all_changes(self):
+        """Страницы по курсору идут по возрастанию seq без пропусков и повторов"""
+        self.store.save_client_accounts("vbank", "client-1", [account("a1", "10.00", ["t1", "t2"]),
+                                                              account("a2", "5.00")], 1000.0)
+        changes, next_seq, pages = self.read_all(limit=2)
+        seqs = [change["seq"] for change in changes]
+        assert seqs == sorted(set(seqs)) and len(seqs) == 6 and pages == 3
+        assert {(change["kind"], change["id"]) for change in changes} == {
+            ("account", "a1"), ("account", "a2"), ("balance", "a1:InterimAvailable"),
+            ("balance", "a2:InterimAvailable"), ("transaction", "a1:t1"), ("transaction", "a1:t2")}
+        assert next_seq == seqs[-1]
+        assert self.store.changes_since(next_seq, 10) == ([], next_seq, False)
+
+    def test_only_changed_entities(self):
+        """Повторная синхронизация отдаёт только изменившиеся сущности, в последнем состоянии"""
+        self.store.save_client_accounts("vbank", "client-1", [account("a1", "10.00", ["t1"])], 1000.0)
+        _, cursor, _ = self.read_all()
+        self.store.save_client_accounts("vbank", "client-1", [account("a1", "10.00", ["t1"])], 1001.0)
+        assert self.store.changes_since(cursor, 10) == ([], cursor, False)
+
+        self.store.save_client_accounts("vbank", "client-1", [account("a1", "12.00", ["t1"])], 1002.0)
+        self.store.save_client_accounts("vbank", "client-1", [account("a1", "15.00", ["t1"])], 1003.0)
+        changes, _, _ = self.read_all(cursor)
+        assert [(change["kind"], change["op"]) for change in changes] == [("balance", "upsert")]
+        assert changes[0]["data"]["amount"]["amount"] == "15.00" and changes[0]["changed_at"] == 1003.0
+
+    def test_deletions(self):
+        """Пропавший счёт удаляется вместе с балансами и транзакциями; отключение банка удаляет всё"""
+        self.store.save_client_accounts("vbank", "client-1", [account("a1", "10.00", ["t1"]), account("a2", "1.00")],
+                                        1000.0)
+        _, cursor, _ = self.read_all()
+        self.store.save_client_accounts("vbank", "client-1", [account("a2", "1.00")], 1001.0)
+        changes, cursor, _ = self.read_all(cursor)
+        assert {(change["kind"], change["id"], change["op"], change["data"]) for change in changes} == {
+            ("account", "a1", "delete", None), ("balance", "a1:InterimAvailable", "delete", None),
+            ("transaction", "a1:t1", "delete", None)}
+
+        self.store.clear_bank("vbank")
+        changes, _, _ = self.read_all(cursor)
+        assert {(change["id"], change["op"]) for change in changes} == {("a2", "delete"),
+                                                                        ("a2:InterimAvailable", "delete")}
+
+    def test_filters_advance_cursor(self):
+        """С фильтром отдаются только свои изменения, но курсор доходит до общего максимума seq"""
+        self.store.save_client_accounts("vbank", "client-1", [account("a1", "10.00")], 1000.0)
+        self.store.save_client_accounts("abank", "client-1", [account("b1", "10.00")], 1000.0)
+        self.store.save_client_accounts("vbank", "client-2", [account("c1", "10.00")], 1000.0)
+        _, max_seq, _ = self.read_all()
+
+        changes, next_seq, has_more = self.store.changes_since(0, 10, bank_names=["vbank"], client_ids=["client-1"])
+        assert {change["id"] for change in changes} == {"a1", "a1:InterimAvailable"}
+        assert (next_seq, has_more) == (max_seq, False)
+
+        changes, _, _ = self.read_all(client_ids=["client-2"])
+        assert {(change["bank_name"], change["client_id"]) for change in changes} == {("vbank", "client-2")}
@@ -0,0 +1,106 @@
+from decimal import Decimal
+
+import pytest
+
+from utils.money import Money, account_balance, format_minor, normalize_account, sum_by_currency, to_minor
+
+
+class TestToMinor:
+    @pytest.mark.parametrize("amount, currency, minor", [
+        ("1234.56", "RUB", 123456),
+        ("-7", "RUB", -700),
+        ("0.5", "RUB", 50),
+        ("-0.05", "RUB", -5),
+        ("1.", "RUB", 100),
+        (".5", "RUB", 50),
+        ("1234,56", "RUB", 123456),
+        (" 12.30 ", "RUB", 1230),
+        ("1500", "JPY", 1500),
+        ("1.234", "KWD", 1234),
+        ("1.5", "kwd", 1500),
+        ("10.00", None, 1000),
+        (12, "RUB", 1200),
+        (0.1, "RUB", 10),
+        (Decimal("2.5"), "JPY", 2),
+    ])
+    def test_values(self, amount, currency, minor):
+        """Строки банка, запятая, экспоненты валют и нестроковые суммы"""
+        assert to_minor(amount, currency) == minor
+
+    @pytest.mark.parametrize("amount, minor", [
+        ("0.125", 12), ("0.135", 14), ("-0.125", -12), ("2.675", 268), ("1.005", 100),
+    ])
+    def test_half_even(self, amount, minor):
+        """Лишние знаки округляются банковским округлением"""
+        assert to_minor(amount, "RUB") == minor
+
+    @pytest.mark.parametrize("amount", ["abc", "-", "--5", "1.2.3", "NaN", "nan", "inf", "-Infinity",
+                                        float("nan"), float("inf")])
+    def test_invalid(self, amount):
+        """Некорректная, бесконечная и NaN-сумма — ValueError"""
+        with pytest.raises(ValueError):
+            to_minor(amount, "RUB")
+
+    @pytest.mark.parametrize("amount", [None, ""])
+    def test_empty(self, amount):
+        """Отсутствующая сумма — None"""
+        assert to_minor(amount, "RUB") is None
+
+
+class TestFormatMinor:
+    @pytest.mark.parametrize("minor, currency, text", [
+        (123456, "RUB", "1234.56"),
+        (5, "RUB", "0.05"),
+        (-5, "RUB", "-0.05"),
+        (-123456, "RUB", "-1234.56"),
+        (0, "RUB", "0.00"),
+        (1500, "JPY", "1500"),
+        (-1500, "JPY", "-1500"),
+        (1234, "KWD", "1.234"),
+        (-1, "KWD", "-0.001"),
+        (100, None, "1.00"),
+    ])
+    def test_values(self, minor, currency, text):
+        """Знак, ведущие нули дробной части и валюты без дробной части"""
+        assert format_minor(minor, currency) == text
+
+    @pytest.mark.parametrize("amount, currency", [("-0.01", "RUB"), ("1234.56", "RUB"), ("-7", "JPY"), ("0.001", "KWD")])
+    def test_round_trip(self, amount, currency):
+        """format_minor обратно to_minor"""
+        assert to_minor(format_minor(to_minor(amount, currency), currency), currency) == to_minor(amount, currency)
+
+
+class TestNormalizeAccount:
+    def test_preferred_balance(self):
+        """Текущий баланс — по порядку предпочтения типов, Debit со знаком минус"""
+        record = normalize_account({
+            "balances": [
+                {"type": "ClosingBooked", "amount": {"amount": "10.00", "currency": "RUB"}},
+                {"type": "InterimAvailable", "creditDebitIndicator": "Debit",
+                 "amount": {"amount": "1500", "currency": "JPY"}},
+            ],
+            "transactions": [{"amount": {"amount": "-3.5", "currency": "RUB"}},
+                             {"amount": {"amount": "oops", "currency": "RUB"}}],
+        })
+        assert (record["balance_minor"], record["balance_currency"]) == (-1500, "JPY")
+        assert record["balances"][0]["amount"]["minor"] == 1000
+        assert [t["amount"]["minor"] for t in record["transactions"]] == [-350, None]
+        assert account_balance(record) == Money(-1500, "JPY")
+
+    def test_unknown_type_and_missing_balance(self):
+        """Без известных типов берётся первый баланс; без балансов — None"""
+        record = normalize_account({"balances": [{"type": "Other", "amount": {"amount": "1", "currency": "USD"}}]})
+        assert account_balance(record) == Money(100, "USD")
+        empty = normalize_account({"balances": [{"type": "ClosingBooked", "amount": {"amount": "x"}}]})
+        assert empty["balance_minor"] is None and account_balance(empty) is None
+
+    def test_normalized_once(self):
+        """Уже нормализованная запись не разбирается повторно"""
+        record = normalize_account({"balances": [{"type": "ClosingBooked", "amount": {"amount": "1.00", "currency": "RUB"}}]})
+        record["balances"][0]["amount"]["amount"] = "999.00"
+        assert normalize_account(record)["balance_minor"] == 100
+
+    def test_sum_by_currency(self):
+        """Итоги по валютам точные, в минимальных единицах"""
+        amounts = [Money(to_minor("0.1"), "RUB")] * 3 + [Money(5, "USD")]
+        assert sum_by_currency(amounts) == {"RUB": 30, "USD": 5}
@@ -0,0 +1,189 @@
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from models.payment_consent import MultiUseConsentRequest, VRPConsentRequest
+from services.payment_consent_pool import ConsentLimitExceeded, PaymentConsentPool, payment_terms
+
+
+def multi_use(**overrides) -> MultiUseConsentRequest:
+    fields = {"requesting_bank": "team", "client_id": "c1", "debtor_account": "40817810000000000001",
+              "max_uses": 5, "max_amount_per_payment": "1000.00", "max_total_amount": "3000.00",
+              "allowed_creditor_accounts": ["40817810000000000002", "40817810000000000003"]}
+    fields.update(overrides)
+    return MultiUseConsentRequest(**fields)
+
+
+def vrp(**overrides) -> VRPConsentRequest:
+    fields = {"requesting_bank": "team", "client_id": "c1", "debtor_account": "40817810000000000001",
+              "vrp_max_individual_amount": "500.00", "vrp_daily_limit": "1000.00", "vrp_monthly_limit": "5000.00"}
+    fields.update(overrides)
+    return VRPConsentRequest(**fields)
+
+
+class TestPaymentTerms:
+    def test_amount_in_minor_units_of_payment_currency(self):
+        """Сумма платежа переводится в минимальные единицы его валюты"""
+        terms = payment_terms({"data": {"initiation": {
+            "instructedAmount": {"amount": "1234.5", "currency": "rub"},
+            "debtorAccount": {"identification": "d"}, "creditorAccount": {"identification": "c"}}}})
+        assert terms == {"amount": 123450, "currency": "RUB", "debtor_account": "d", "creditor_account": "c"}
+        assert payment_terms({"data": {"instructedAmount": {"amount": "1500", "currency": "JPY"}}})["amount"] == 1500
+
+    def test_invalid_amount(self):
+        with pytest.raises(ValueError):
+            payment_terms({"data": {"instructedAmount": {"amount": "12,34.5"}}})
+
+
+class TestConsentReuse:
+    def setup_method(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = PaymentConsentPool(os.path.join(self.tmp.name, "payments.db"))
+
+    def teardown_method(self):
+        self.tmp.cleanup()
+
+    def test_same_terms_reused(self):
+        """Согласие с теми же условиями переиспользуется, с другим счётом списания или типом — нет"""
+        self.pool.register("vbank", "consent-1", multi_use())
+        assert self.pool.find("vbank", multi_use())["consent_id"] == "consent-1"
+        assert self.pool.find("vbank", multi_use(debtor_account="40817810000000000009")) is None
+        assert self.pool.find("vbank", vrp()) is None
+        assert self.pool.find("abank", multi_use()) is None
+
+    def test_narrower_terms_reused(self):
+        """Запрос с более узкими условиями покрывается действующим согласием"""
+        self.pool.register("vbank", "consent-1", multi_use())
+        narrower = multi_use(max_uses=2, max_amount_per_payment="500", max_total_amount="1000",
+                             allowed_creditor_accounts=["40817810000000000002"])
+        assert self.pool.find("vbank", narrower)["consent_id"] == "consent-1"
+
+    @pytest.mark.parametrize("overrides", [
+        {"allowed_creditor_accounts": ["40817810000000000004"]},
+        {"allowed_creditor_accounts": None},
+        {"max_amount_per_payment": "1000.01"},
+        {"max_total_amount": "5000.00"},
+        {"max_uses": 6},
+        {"valid_until": datetime.now(timezone.utc) + timedelta(days=30)},
+    ])
+    def test_wider_terms_not_reused(self, overrides):
+        """Запрос, который действующее согласие не покрывает, ведёт к новому согласию"""
+        self.pool.register("vbank", "consent-1", multi_use(valid_until=datetime.now(timezone.utc) + timedelta(days=1)))
+        assert self.pool.find("vbank", multi_use(**overrides)) is None
+
+    def test_spent_capacity_counts(self):
+        """Переиспользуется только остаток: уже сделанные платежи уменьшают число платежей и общий лимит"""
+        self.pool.register("vbank", "consent-1", multi_use())
+        self.pool.charge("consent-1", 100000, "40817810000000000002")
+        assert self.pool.find("vbank", multi_use(max_uses=4, max_total_amount="2000.00")) is not None
+        assert self.pool.find("vbank", multi_use(max_uses=5, max_total_amount="2000.00")) is None
+        assert self.pool.find("vbank", multi_use(max_uses=4, max_total_amount="2000.01")) is None
+
+    def test_vrp_limits(self):
+        """VRP-согласие переиспользуется, только если все три лимита не меньше запрошенных"""
+        self.pool.register("vbank", "consent-1", vrp())
+        assert self.pool.find("vbank", vrp(vrp_daily_limit="800.00"))["consent_id"] == "consent-1"
+        assert self.pool.find("vbank", vrp(vrp_monthly_limit="5000.01")) is None
+        assert self.pool.find("vbank", vrp(vrp_max_individual_amount="600")) is None
+
+    def test_expired_and_revoked_skipped(self):
+        self.pool.register("vbank", "expired", multi_use(), valid_until=datetime.now(timezone.utc) - timedelta(seconds=1))
+        self.pool.register("vbank", "revoked", multi_use())
+        self.pool.revoke("revoked")
+        assert self.pool.find("vbank", multi_use()) is None
+
+    def test_newest_covering_consent_chosen(self):
+        self.pool.register("vbank", "old", multi_use())
+        time.sleep(0.01)
+        self.pool.register("vbank", "new", multi_use(max_uses=1))
+        assert self.pool.find("vbank", multi_use(max_uses=1))["consent_id"] == "new"
+        assert self.pool.find("vbank", multi_use(max_uses=3))["consent_id"] == "old"
+
+    def test_payment_in_other_currency_rejected(self):
+        self.pool.register("vbank", "consent-1", multi_use())
+        with pytest.raises(ConsentLimitExceeded):
+            self.pool.charge("consent-1", 1000, "40817810000000000002", "USD")
+
+
+class TestConsentLimits:
+    def setup_method(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = PaymentConsentPool(os.path.join(self.tmp.name, "payments.db"))
+        self.creditor = "40817810000000000002"
+
+    def teardown_method(self):
+        self.tmp.cleanup()
+
+    def test_untracked_consent(self):
+        """Одноразовые согласия пул не отслеживает: charge возвращает False"""
+        assert self.pool.charge("single-use", 1000) is False
+
+    def test_per_payment_and_creditor(self):
+        self.pool.register("vbank", "consent-1", multi_use())
+        assert self.pool.charge("consent-1", 100000, self.creditor)
+        with pytest.raises(ConsentLimitExceeded, match="одного платежа"):
+            self.pool.charge("consent-1", 100001, self.creditor)
+        with pytest.raises(ConsentLimitExceeded, match="не разрешён"):
+            self.pool.charge("consent-1", 100, "40817810000000000004")
+
+    def test_total_and_uses(self):
+        self.pool.register("vbank", "consent-1", multi_use(max_uses=3, max_total_amount="2500.00"))
+        assert self.pool.charge("consent-1", 100000, self.creditor)
+        assert self.pool.charge("consent-1", 100000, self.creditor)
+        with pytest.raises(ConsentLimitExceeded, match="общий лимит"):
+            self.pool.charge("consent-1", 50001, self.creditor)
+        assert self.pool.charge("consent-1", 50000, self.creditor)
+        with pytest.raises(ConsentLimitExceeded, match="число платежей"):
+            self.pool.charge("consent-1", 1, self.creditor)
+
+    def test_vrp_daily_and_monthly(self):
+        self.pool.register("vbank", "consent-1", vrp(vrp_daily_limit="800.00", vrp_monthly_limit="1000.00"))
+        assert self.pool.charge("consent-1", 50000)
+        with pytest.raises(ConsentLimitExceeded, match="дневной"):
+            self.pool.charge("consent-1", 30001)
+        assert self.pool.charge("consent-1", 30000)
+        with pytest.raises(ConsentLimitExceeded, match="дневной"):
+            self.pool.charge("consent-1", 1)
+
+    def test_refund_restores_limits(self):
+        """refund возвращает списание: число платежей и остатки лимитов восстанавливаются"""
+        self.pool.register("vbank", "consent-1", multi_use(max_uses=1, max_total_amount="1000.00"))
+        charged_at = time.time()
+        assert self.pool.charge("consent-1", 100000, self.creditor)
+        with pytest.raises(ConsentLimitExceeded):
+            self.pool.charge("consent-1", 100000, self.creditor)
+        self.pool.refund("consent-1", 100000, charged_at)
+        assert self.pool.charge("consent-1", 100000, self.creditor)
+
+    def test_refund_of_previous_day_keeps_today(self):
+        """Возврат вчерашнего списания не уменьшает сегодняшний дневной расход"""
+        self.pool.register("vbank", "consent-1", vrp(vrp_daily_limit="600.00"))
+        assert self.pool.charge("consent-1", 50000)
+        self.pool.refund("consent-1", 50000, time.time() - 86400 * 40)
+        with pytest.raises(ConsentLimitExceeded, match="дневной"):
+            self.pool.charge("consent-1", 10001)
+
+    def test_revoked(self):
+        self.pool.register("vbank", "consent-1", multi_use())
+        self.pool.revoke("consent-1")
+        with pytest.raises(ConsentLimitExceeded, match="отозвано"):
+            self.pool.charge("consent-1", 100, self.creditor)
+
+    def test_concurrent_charges_respect_limit(self):
+        """Параллельные списания из разных потоков не превышают общий лимит"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.pool.register("vbank", "consent-1", multi_use(max_uses=100, max_total_amount="1000.00"))
+
+        def charge(_):
+            try:
+                return self.pool.charge("consent-1", 10000, self.creditor)
+            except ConsentLimitExceeded:
+                return False
+
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(charge, range(30)))
+        assert sum(results) == 10
@@ -0,0 +1,75 @@
+import asyncio
+import tempfile
+import time
+
+from services.profiler import Profiler, ProfileRequestMiddleware
+
+
+def busy_child(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def busy_task(seconds):
+    busy_child(seconds)
+
+
+def busy_thread(seconds):
+    busy_child(seconds)
+
+
+def busy_other_request(seconds):
+    busy_child(seconds)
+
+
+class TestProfileRequest:
+    def setup_method(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.profiler = Profiler("admin", self.tmp.name, 0.002, 10)
+
+    def teardown_method(self):
+        self.tmp.cleanup()
+
+    def profile(self, app, concurrent=None):
+        middleware = ProfileRequestMiddleware(app, self.profiler)
+        scope = {"type": "http", "headers": [(b"x-profile", b"1"), (b"x-admin-token", b"admin")]}
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        async def scenario():
+            other = asyncio.create_task(concurrent()) if concurrent else None
+            await middleware(scope, None, send)
+            if other:
+                await other
+
+        asyncio.run(scenario())
+        name = dict(messages[0]["headers"])[b"x-profile-file"].decode()
+        return (self.profiler.new_file("request").parent / name).read_text(encoding="utf-8")
+
+    def test_child_tasks_and_threads(self):
+        """В профиль запроса попадают gather, create_task и asyncio.to_thread"""
+        async def app(scope, receive, send):
+            await asyncio.gather(busy_task(0.1), busy_task(0.1))
+            await asyncio.create_task(busy_task(0.1))
+            await asyncio.to_thread(busy_thread, 0.1)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+
+        profile = self.profile(app)
+        assert "busy_task" in profile
+        assert "[thread asyncio_" in profile and "busy_thread" in profile
+
+    def test_other_tasks_excluded(self):
+        """Задачи, созданные вне запроса, в профиль запроса не попадают"""
+        async def app(scope, receive, send):
+            await asyncio.sleep(0.2)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+
+        async def concurrent():
+            await asyncio.sleep(0.01)
+            busy_other_request(0.1)
+
+        profile = self.profile(app, concurrent)
+        assert "busy_other_request" not in profile
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+from services.local_store import LocalStore
+from services.transaction_search import InvalidSearch, TransactionSearch, encode_cursor
+
+
+WORDS = ["такси", "Яндекс", "кафе", "аптека", "магазин", "магнит"]
+
+
+def transaction(i: int):
+    return {"transactionId": f"t{i}", "creditDebitIndicator": "Debit",
+            "amount": {"amount": f"{i + 1}.00", "currency": "RUB"},
+            # Повторяющиеся даты и описания дают одинаковые ключи сортировки на границах страниц.
+            "bookingDateTime": f"2026-10-{1 + i % 5:02d}T10:00:00Z",
+            "transactionInformation": f"{WORDS[i % len(WORDS)]} {WORDS[i % 4]} #{i % 3}"}
+
+
+class TestTransactionSearch:
+    def setup_method(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = LocalStore(os.path.join(self.tmp.name, "local.db"))
+        self.store.save_client_accounts("vbank", "client-1", [{
+            "accountId": "a1", "transactions": [transaction(i) for i in range(60)]}], 1000.0)
+        self.store.save_client_accounts("abank", "client-1", [{
+            "accountId": "b1", "transactions": [transaction(i) for i in range(60, 80)]}], 1000.0)
+        self.store.save_client_accounts("vbank", "client-2", [{
+            "accountId": "c1", "transactions": [transaction(i) for i in range(80, 100)]}], 1000.0)
+        self.search = TransactionSearch(self.store)
+
+    def teardown_method(self):
+        self.tmp.cleanup()
+
+    def pages(self, text, limit, **params):
+        """Все страницы выдачи по курсору: (id транзакций, число страниц)."""
+        ids, cursor, pages = [], None, 0
+        while True:
+            page = asyncio.run(self.search.search("client-1", text, limit=limit, cursor=cursor, **params))
+            ids += [item["transaction_id"] for item in page["items"]]
+            pages += 1
+            cursor = page["cursor"]
+            if cursor is None:
+                return ids, pages
+
+    @pytest.mark.parametrize("order", ["date", "relevance"])
+    def test_pages_cover_all(self, order):
+        """Страницы по курсору дают все совпадения без повторов в обоих порядках"""
+        full, _ = self.pages("такси", 100, order=order)
+        expected = {f"t{i}" for i in range(80) if "такси" in transaction(i)["transactionInformation"]}
+        assert set(full) == expected
+        for limit in (1, 3, 7):
+            ids, pages = self.pages("такси", limit, order=order)
+            assert ids == full
+            assert pages == -(-len(full) // limit)
+
+    def test_date_order(self):
+        """sort=date — от новых к старым"""
+        page = asyncio.run(self.search.search("client-1", "кафе", limit=100))
+        booked = [item["booked_at"] for item in page["items"]]
+        assert booked == sorted(booked, reverse=True)
+
+    def test_prefix_and_filters(self):
+        """слово* ищет по началу слова; фильтры сужают выдачу"""
+        ids, _ = self.pages("маг*", 5)
+        assert set(ids) == {f"t{i}" for i in range(80) if "маг" in transaction(i)["transactionInformation"]}
+        assert 0 < len(self.pages("магнит", 5)[0]) < len(ids)
+        ids, _ = self.pages("маг*", 5, bank_names=["abank"], amount_min=70_00)
+        assert set(ids) == {f"t{i}" for i in range(69, 80) if "маг" in transaction(i)["transactionInformation"]}
+
+    def test_snippet(self):
+        """Найденные слова подсвечиваются в описании"""
+        item = asyncio.run(self.search.search("client-1", "аптека", limit=1))["items"][0]
+        assert "[аптека]" in item["snippet"]
+
+    @pytest.mark.parametrize("cursor", ["not-a-cursor", "czE6WzFd", encode_cursor("relevance", 1.5, 3)])
+    def test_invalid_cursor(self, cursor):
+        """Некорректный курсор или курсор другого порядка — InvalidSearch"""
+        with pytest.raises(InvalidSearch):
+            asyncio.run(self.search.search("client-1", "такси", cursor=cursor))
+
+    def test_empty_query(self):
+        """Запрос без слов — InvalidSearch"""
+        with pytest.raises(InvalidSearch):
+            asyncio.run(self.search.search("client-1", '"" ()'))
+
+
+def test_openapi_schema_names():
+    """Модели поиска не конфликтуют по имени с моделями счетов в схеме OpenAPI"""
+    from main import app
+
+    schemas = app.openapi()["components"]["schemas"]
+    assert "SearchHitAmount" in schemas and "TransactionAmount" in schemas
+    assert not [name for name in schemas if "__" in name]
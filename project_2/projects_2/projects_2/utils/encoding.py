@@ -0,0 +1,62 @@
+import json
+from typing import Any, Dict, Optional, Union
+
+from fastapi import Response
+
+try:
+    import msgpack
+except ImportError:  # msgpack необязателен: без него все ответы отдаются в JSON
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него файлы состояния разбираются модулем json
+    orjson = None
+
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+
+class MsgPackResponse(Response):
+    """Ответ в MessagePack. content — данные в том же виде, что и для JSON (model_dump(mode="json"))."""
+
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, use_bin_type=True)
+
+
+def _accept_quality(accept: str) -> Dict[str, float]:
+    qualities = {}
+    for media_range in accept.split(","):
+        media_type, *params = (part.strip() for part in media_range.split(";"))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[media_type.lower()] = quality
+    return qualities
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    """
+    Выбирает MessagePack, если клиент явно перечислил его в Accept с q > 0 и не ниже,
+    чем application/json. */* и отсутствие заголовка означают JSON.
+    """
+    if not accept or msgpack is None:
+        return False
+    qualities = _accept_quality(accept)
+    msgpack_quality = max((qualities.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES), default=0.0)
+    return msgpack_quality > 0 and msgpack_quality >= qualities.get("application/json", 0.0)
+
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    """Разбирает JSON через orjson, если он установлен (в несколько раз быстрее json.loads)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,119 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Union
+
+
+# Число знаков дробной части валюты (ISO 4217); для остальных валют — 2.
+CURRENCY_EXPONENTS = {
+    "JPY": 0, "KRW": 0, "VND": 0, "CLP": 0, "ISK": 0,
+    "BHD": 3, "KWD": 3, "OMR": 3, "JOD": 3, "TND": 3,
+}
+DEFAULT_EXPONENT = 2
+
+# Какой баланс счёта считать его текущим балансом, в порядке предпочтения.
+PREFERRED_BALANCE_TYPES = ("InterimAvailable", "ClosingAvailable", "InterimBooked", "ClosingBooked", "Expected")
+
+
+class Money(NamedTuple):
+    """Сумма в минимальных единицах валюты (копейках, центах) и код валюты."""
+    minor: int
+    currency: str
+
+    def __str__(self) -> str:
+        return f"{format_minor(self.minor, self.currency)} {self.currency}"
+
+
+def exponent(currency: Optional[str]) -> int:
+    return CURRENCY_EXPONENTS.get((currency or "").upper(), DEFAULT_EXPONENT)
+
+
+def to_minor(amount: Union[str, int, float, Decimal, None], currency: Optional[str] = "RUB") -> Optional[int]:
+    """
+    Переводит сумму в целое число минимальных единиц валюты: "1234.56" RUB -> 123456.
+    Разбор через Decimal, без ошибок float; лишние знаки округляются банковским округлением.
+    None и пустая строка -> None, некорректная сумма -> ValueError.
+    """
+    if amount is None or amount == "":
+        return None
+    places = exponent(currency)
+    if isinstance(amount, str):
+        # Обычная запись банка ("1234.56", "-7", "0.5") разбирается без Decimal.
+        units, _, fraction = amount.partition(".")
+        negative = units.startswith("-")
+        if negative:
+            units = units[1:]
+        if units.isdecimal() and len(fraction) <= places and (not fraction or fraction.isdecimal()):
+            minor = int(units) * 10 ** places + (int(fraction) * 10 ** (places - len(fraction)) if fraction else 0)
+            return -minor if negative else minor
+    try:
+        value = Decimal(amount.strip().replace(",", ".") if isinstance(amount, str) else str(amount))
+    except InvalidOperation:
+        raise ValueError(f"Некорректная сумма: {amount!r}")
+    if not value.is_finite():
+        raise ValueError(f"Некорректная сумма: {amount!r}")
+    return int(value.scaleb(places).to_integral_value(rounding=ROUND_HALF_EVEN))
+
+
+def format_minor(minor: int, currency: Optional[str] = "RUB") -> str:
+    """Обратное преобразование для вывода: 123456 RUB -> "1234.56"."""
+    places = exponent(currency)
+    sign = "-" if minor < 0 else ""
+    units, fraction = divmod(abs(minor), 10 ** places)
+    return f"{sign}{units}.{fraction:0{places}d}" if places else f"{sign}{units}"
+
+
+def signed_minor(minor: int, credit_debit_indicator: Optional[str]) -> int:
+    """Сумма со знаком: Debit — списание (отрицательная), Credit — зачисление."""
+    return -minor if (credit_debit_indicator or "").lower() == "debit" else minor
+
+
+def _normalize_amount(item: Dict[str, Any]) -> Optional[Money]:
+    amount = item.get("amount")
+    if not isinstance(amount, dict):
+        return None
+    if "minor" not in amount:
+        try:
+            amount["minor"] = to_minor(amount.get("amount"), amount.get("currency"))
+        except ValueError:
+            amount["minor"] = None
+    if amount["minor"] is None:
+        return None
+    return Money(amount["minor"], amount.get("currency") or "RUB")
+
+
+def normalize_account(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Нормализует суммы записи счёта при получении от банка (один раз): в каждый
+    amount балансов и транзакций добавляется minor — сумма в минимальных единицах,
+    а в запись — balance_minor и balance_currency текущего баланса со знаком.
+    Дальнейшие итоги, сортировка и фильтры работают с целыми числами без повторного разбора строк.
+    Изменяет и возвращает record; уже нормализованная запись не разбирается повторно.
+    """
+    balances = {}
+    for balance in record.get("balances") or []:
+        money = _normalize_amount(balance)
+        if money is not None:
+            balances.setdefault(balance.get("type"),
+                                Money(signed_minor(money.minor, balance.get("creditDebitIndicator")), money.currency))
+    for transaction in record.get("transactions") or []:
+        _normalize_amount(transaction)
+    if "balance_minor" not in record:
+        current = next((balances[balance_type] for balance_type in PREFERRED_BALANCE_TYPES if balance_type in balances),
+                       next(iter(balances.values()), None))
+        record["balance_minor"] = current.minor if current else None
+        record["balance_currency"] = current.currency if current else None
+    return record
+
+
+def account_balance(record: Dict[str, Any]) -> Optional[Money]:
+    """Текущий баланс нормализованной записи счёта или None, если банк его не вернул."""
+    if record.get("balance_minor") is None:
+        return None
+    return Money(record["balance_minor"], record.get("balance_currency") or "RUB")
+
+
+def sum_by_currency(amounts: Iterable[Money]) -> Dict[str, int]:
+    """Точные итоги по валютам, в минимальных единицах."""
+    totals: Dict[str, int] = {}
+    for minor, currency in amounts:
+        totals[currency] = totals.get(currency, 0) + minor
+    return totals
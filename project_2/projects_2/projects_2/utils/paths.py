@@ -0,0 +1,15 @@
+from pathlib import Path
+
+from config import settings
+
+
+def data_path(path: str) -> Path:
+    """
+    Путь к файлу состояния приложения: относительные пути отсчитываются от settings.data_dir,
+    а не от текущего каталога процесса. Каталог создаётся при первом обращении.
+    """
+    resolved = Path(path)
+    if not resolved.is_absolute():
+        resolved = Path(settings.data_dir) / resolved
+    resolved.parent.mkdir(parents=True, exist_ok=True)
+    return resolved